@@ -0,0 +1,220 @@
+# Summarize every robot state log on a drive, headless, in a process pool. Reruns only process new or changed logs.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import csv
+import os
+import sys
+import time
+import numpy as np
+import tqdm
+from read_state_data import find_missing_packet_times
+from state_analysis import detect_touching, true_ranges, scale_to_limits, Q_MIN, Q_MAX, DQ_MIN, DQ_MAX
+from state_cache import load_state_columns, evict, STATE_CACHE_DIR
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog, STATE_RECORDING
+
+SUMMARY_NAME = "state_summary.csv"
+SUMMARY_FIELDS = ["time", "q_d", "dq_d", "control_command_success_rate", "halt_motion", "O_F_ext_hat_K", "O_T_EE"]
+CCSR_THRES = 0.95  # Control command success rates below this are counted as poor
+NEAR_LIMIT = 0.95  # Scaled joint position/velocity magnitudes above this are counted as near the limit
+SAMPLE_PERIOD = 0.001  # (s)
+
+COLUMNS = [
+    "path",
+    "size",
+    "mtime_ns",
+    "date",
+    "session",
+    "num_samples",
+    "duration_s",
+    "dropped_packets",
+    "dropped_fraction",
+    "ccsr_mean",
+    "ccsr_min",
+    "ccsr_poor_fraction",
+    "num_halts",
+    "halt_s",
+    "num_contacts",
+    "contact_s",
+    "q_max_scaled",
+    "q_near_limit_fraction",
+    "q_closest_joint",
+    "dq_max_scaled",
+    "dq_near_limit_fraction",
+    "process_s",
+]
+
+
+def summarize_columns(columns):
+    """Per-session metrics from the parsed columns of one log. Metrics for fields a log lacks are NaN."""
+    time_ms = np.asarray(columns["time"]).ravel()
+    timestamps = time_ms - time_ms[0]
+    num_samples = len(timestamps)
+    packet_loss_times = find_missing_packet_times(timestamps, 20)
+    metrics = {
+        "num_samples": num_samples,
+        "duration_s": timestamps[-1] / 1000,
+        "dropped_packets": len(packet_loss_times),
+        "dropped_fraction": len(packet_loss_times) / max(1, num_samples + len(packet_loss_times)),
+    }
+
+    # Success rate is 0 before the first command, so only nonzero values count (as in the plot)
+    metrics.update({"ccsr_mean": np.nan, "ccsr_min": np.nan, "ccsr_poor_fraction": np.nan})
+    if "control_command_success_rate" in columns:
+        ccsr = np.asarray(columns["control_command_success_rate"], dtype=float).ravel()
+        ccsr = ccsr[ccsr != 0]
+        if len(ccsr):
+            metrics.update(
+                {"ccsr_mean": ccsr.mean(), "ccsr_min": ccsr.min(), "ccsr_poor_fraction": (ccsr < CCSR_THRES).mean()}
+            )
+
+    metrics.update({"num_halts": np.nan, "halt_s": np.nan})
+    if "halt_motion" in columns:
+        starts, ends = true_ranges(np.asarray(columns["halt_motion"]).ravel())
+        metrics.update({"num_halts": len(starts), "halt_s": (ends - starts + 1).sum() * SAMPLE_PERIOD})
+
+    metrics.update({"num_contacts": np.nan, "contact_s": np.nan})
+    if "O_F_ext_hat_K" in columns and "O_T_EE" in columns:
+        touching = detect_touching(columns["O_F_ext_hat_K"][:, 0], columns["O_T_EE"][:, 12], timestamps)
+        starts, ends = true_ranges(touching)
+        metrics.update({"num_contacts": len(starts), "contact_s": (ends - starts + 1).sum() * SAMPLE_PERIOD})
+
+    metrics["q_closest_joint"] = np.nan
+    for name, field, min_values, max_values in [("q", "q_d", Q_MIN, Q_MAX), ("dq", "dq_d", DQ_MIN, DQ_MAX)]:
+        metrics.update({f"{name}_max_scaled": np.nan, f"{name}_near_limit_fraction": np.nan})
+        if field in columns:
+            scaled = np.abs(scale_to_limits(np.asarray(columns[field]), min_values, max_values))
+            metrics[f"{name}_max_scaled"] = scaled.max()
+            metrics[f"{name}_near_limit_fraction"] = (scaled.max(axis=1) > NEAR_LIMIT).mean()
+            if name == "q":
+                metrics["q_closest_joint"] = int(scaled.max(axis=0).argmax())
+    return metrics
+
+
+def summarize_log(txt_path, cache_dir):
+    """Runs in a worker process. Parses (or loads the cached columns of) one log and returns its summary row."""
+    start_time = time.perf_counter()
+    stat = txt_path.stat()
+    columns = load_state_columns(txt_path, fields=SUMMARY_FIELDS, cache_dir=cache_dir, max_bytes=None)
+    row = {
+        "path": str(txt_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "date": next((p for p in txt_path.parts if len(p) == 10 and p[4] == "-" and p[7] == "-"), ""),
+        "session": txt_path.name.split(".")[0],
+    }
+    row.update(summarize_columns(columns))
+    row["process_s"] = time.perf_counter() - start_time
+    return row
+
+
+def find_state_logs(root):
+    """Closed state logs from the catalog. If a log exists as both .txt and .txt.gz (mid-compression), uses the .txt."""
+    catalog = TrialCatalog(root)
+    catalog.refresh()
+    logs = {}
+    for r in catalog.query(kind="state_log"):
+        if r["state"] == STATE_RECORDING:
+            continue
+        path = Path(r["path"])
+        key = str(path)[: -len(".gz")] if path.name.endswith(".gz") else str(path)
+        if key not in logs or path.suffix == ".txt":
+            logs[key] = path
+    catalog.close()
+    return sorted(logs.values())
+
+
+def read_summary(summary_path):
+    """Existing rows keyed by path, so unchanged logs are not processed again."""
+    if not summary_path.exists():
+        return {}
+    with open(summary_path, newline="") as f:
+        return {r["path"]: r for r in csv.DictReader(f)}
+
+
+def read_summary_partial(partial_path):
+    """Rows appended by earlier runs that were interrupted before writing the consolidated table."""
+    if not partial_path.exists():
+        return {}
+    with open(partial_path, newline="") as f:
+        return {r["path"]: r for r in csv.DictReader(f, fieldnames=COLUMNS)}
+
+
+def write_summary(summary_path, rows):
+    """Writes the consolidated table, sorted by path, replacing the previous file atomically."""
+    tmp_path = summary_path.with_name(summary_path.name + ".tmp")
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for path in sorted(rows):
+            writer.writerow(rows[path])
+    os.replace(tmp_path, summary_path)
+
+
+def summarize_all(root, summary_path, cache_dir=STATE_CACHE_DIR, max_workers=None, rerun=False):
+    state_logs = find_state_logs(root)
+    partial_path = summary_path.with_name(summary_path.name + ".partial")
+    rows = read_summary(summary_path)
+    rows.update(read_summary_partial(partial_path))
+
+    # Resume: skip logs whose size and mtime match an existing row
+    todo = []
+    for txt_path in state_logs:
+        row = rows.get(str(txt_path))
+        stat = txt_path.stat()
+        if rerun or row is None or int(row["size"]) != stat.st_size or int(row["mtime_ns"]) != stat.st_mtime_ns:
+            todo.append(txt_path)
+    print(f"{len(state_logs)} state logs, {len(state_logs) - len(todo)} already summarized, {len(todo)} to process")
+
+    # Rows are appended as soon as each log finishes, so an interrupted run keeps its progress
+    start_time = time.perf_counter()
+    total_MB = 0.0
+    total_samples = 0
+    with open(partial_path, "a", newline="") as partial, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        writer = csv.DictWriter(partial, fieldnames=COLUMNS)
+        futures = {executor.submit(summarize_log, txt_path, cache_dir): txt_path for txt_path in todo}
+        progress = tqdm.tqdm(as_completed(futures), total=len(futures), unit="log")
+        for future in progress:
+            try:
+                row = future.result()
+            except Exception as e:
+                print(f"Error processing {futures[future]}: {e}")
+                continue
+            writer.writerow(row)
+            partial.flush()
+            rows[row["path"]] = row
+
+            total_MB += row["size"] / 1e6
+            total_samples += row["num_samples"]
+            elapsed = time.perf_counter() - start_time
+            progress.set_postfix(MB_per_s=round(total_MB / elapsed, 1), samples_per_s=f"{total_samples / elapsed:.3g}")
+
+    # Drop logs that no longer exist (e.g. a .txt that is now a .txt.gz)
+    current = {str(p) for p in state_logs}
+    rows = {path: row for path, row in rows.items() if path in current}
+    write_summary(summary_path, rows)
+    partial_path.unlink()
+    evict(cache_dir)  # Once per run, since the workers do not evict
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Processed {len(todo)} logs ({round(total_MB, 1)} MB, {total_samples} samples) in {round(elapsed, 1)} s; "
+        f"summary of {len(rows)} logs in {summary_path}"
+    )
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Summarize all robot state logs under a save location.")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location containing <date>/robot_state_data")
+    parser.add_argument("--summary", help=f"Output table (default <root>/{SUMMARY_NAME})")
+    parser.add_argument("--cache-dir", default=str(STATE_CACHE_DIR), help="Where per-session columnar caches go")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--rerun", action="store_true", help="Process every log, even if already summarized")
+    args = parser.parse_args()
+
+    summary_path = Path(args.summary) if args.summary else Path(args.root, SUMMARY_NAME)
+    summarize_all(Path(args.root), summary_path, Path(args.cache_dir), args.workers, args.rerun)
@@ -0,0 +1,90 @@
+# Time one refresh of the shared-memory viewer against the old display.py, which searched the disk on every refresh
+from multiprocessing import Process, Event
+from pathlib import Path
+import glob
+import os
+import shutil
+import sys
+import time
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np
+from PIL import Image
+from display import LatestFrameViewer
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from latest_frames import LatestFrames
+
+CAMERAS = ["camTL", "camTo", "camTR", "camBL", "camBo", "camBR"]
+SHAPE = (960, 960)
+TEST_NAME = "flir_latest_frames_benchmark"
+
+
+def find_newest_image_reference(base_path, cam):
+    """The old display.py search, run for each camera on every refresh."""
+    newest_date_dir = max(glob.glob(f"{base_path}/*"), key=os.path.getctime)
+    list_of_files = list(Path(newest_date_dir).rglob(f"{cam}/*.bmp"))
+    if not list_of_files:
+        return None
+    return max(list_of_files, key=os.path.getctime)
+
+
+def publish(stop_event, ready_event):
+    """Stand-in recorder: every camera's frame is filled with its frame index."""
+    latest = LatestFrames.create(CAMERAS, SHAPE, name=TEST_NAME)
+    ready_event.set()
+    frame = np.zeros(SHAPE, dtype=np.uint8)
+    frame_idx = 0
+    while not stop_event.is_set():
+        frame[:] = frame_idx % 256
+        for cam in CAMERAS:
+            latest.publish(cam, frame, frame_idx)
+        frame_idx += 1
+        time.sleep(0.01)
+    latest.close(unlink=True)
+
+
+if __name__ == "__main__":
+    num_files = int(sys.argv[1]) if len(sys.argv) >= 2 else 2000
+
+    # The old viewer on a trial directory with num_files small BMPs per camera
+    base_path = Path("/tmp/benchmark_display/cameras")
+    trial_dir = Path(base_path, "2024-01-01_00-00-00_000000")
+    for cam in CAMERAS:
+        Path(trial_dir, cam).mkdir(parents=True, exist_ok=True)
+        for i in range(num_files):
+            Path(trial_dir, cam, f"{cam}-{i:06d}.bmp").touch()
+        Image.fromarray(np.zeros((96, 96), dtype=np.uint8)).save(Path(trial_dir, cam, f"{cam}-{num_files:06d}.bmp"))
+    start = time.perf_counter()
+    for _ in range(3):
+        for cam in CAMERAS:
+            np.array(Image.open(find_newest_image_reference(base_path, cam)))
+    t_old = (time.perf_counter() - start) / 3
+    shutil.rmtree(base_path.parent)
+
+    # The new viewer, attached to a stand-in recorder in another process
+    stop_event, ready_event = Event(), Event()
+    publisher = Process(target=publish, args=(stop_event, ready_event))
+    publisher.start()
+    ready_event.wait()
+    latest = LatestFrames.attach(TEST_NAME)
+    viewer = LatestFrameViewer(latest)
+
+    times = []
+    for _ in range(50):
+        time.sleep(0.04)
+        start = time.perf_counter()
+        viewer.refresh()
+        times.append(time.perf_counter() - start)
+
+    # Every tile holds a whole frame (never half of one frame and half of the next)
+    for tile in viewer.tiles:
+        assert (tile == tile.flat[0]).all()
+    latest.close()
+    stop_event.set()
+    publisher.join()
+    assert not Path("/dev/shm", TEST_NAME).exists()
+
+    print(f"Old display.py search and load, {num_files} files per camera: {round(t_old * 1000, 1)} ms per refresh")
+    print(f"Shared memory viewer: {round(np.median(times) * 1000, 2)} ms per refresh (median of {len(times)})")
@@ -0,0 +1,120 @@
+# Count copies, conversions and memory per frame for the old ImagePtr handoff and the shared array handoff,
+# with a simulated camera feeding one saving queue and one display queue as in record_multi_cam
+from pathlib import Path
+from queue import Queue, Empty
+import sys
+import threading
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from camera_frames import SimulatedCamera, frame_from_image
+
+
+class Counts:
+    def __init__(self):
+        self.copies = 0
+        self.get_nd_array = 0
+        self.conversions = 0
+        self.handoff_s = 0.0
+
+
+class ImageCopyReference:
+    """What PySpin.Image.Create(image_result) gave the queues: a separate native copy, converted by each consumer."""
+
+    def __init__(self, image_result, counts):
+        self.data = image_result.GetNDArray().copy()
+        self.counts = counts
+
+    def GetNDArray(self):
+        self.counts.get_nd_array += 1
+        return self.data
+
+
+def acquire(camera, queues, num_frames, counts, shared):
+    camera.BeginAcquisition()
+    for frame_idx in range(num_frames):
+        image_result = camera.GetNextImage()
+        start = time.perf_counter()
+        if shared:
+            counts.get_nd_array += 1
+            frame = frame_from_image(image_result)
+        else:
+            frame = ImageCopyReference(image_result, counts)
+            image_result.Release()
+        counts.copies += 1
+        for q in queues:
+            q.put((frame, frame_idx, "batch"))
+        counts.handoff_s += time.perf_counter() - start
+    for q in queues:
+        q.put((None, None, None))
+    camera.EndAcquisition()
+
+
+def save(q, counts, shared):
+    while True:
+        frame, frame_idx, _ = q.get()
+        if frame is None:
+            return
+        frame = frame if shared else frame.GetNDArray()
+        assert frame[0, 0] == frame_idx % 256
+
+
+def display(q, counts, shared, refresh_s=0.05):
+    """The display loop: drain the queue every refresh; the old loop converted every frame it drained."""
+    while True:
+        time.sleep(refresh_s)
+        latest = None
+        done = False
+        while True:
+            try:
+                frame = q.get_nowait()[0]
+            except Empty:
+                break
+            if frame is None:
+                done = True
+                break
+            if shared:
+                latest = frame
+            else:
+                latest = cv2.cvtColor(frame.GetNDArray(), cv2.COLOR_BayerRG2BGR)
+                counts.conversions += 1
+        if shared and latest is not None:
+            cv2.cvtColor(latest, cv2.COLOR_BayerRG2BGR)
+            counts.conversions += 1
+        if done:
+            return
+
+
+def run(shared, num_frames, fps):
+    camera = SimulatedCamera(fps=fps, shape=(960, 960))
+    counts = Counts()
+    queues = [Queue(), Queue()]
+    threads = [
+        threading.Thread(target=acquire, args=(camera, queues, num_frames, counts, shared)),
+        threading.Thread(target=save, args=(queues[0], counts, shared)),
+        threading.Thread(target=display, args=(queues[1], counts, shared)),
+    ]
+    tracemalloc.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return counts, peak, camera.frames_dropped
+
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) >= 2 else 500
+    fps = 100.0
+    print(f"{num_frames} frames of 960x960 at {fps} fps, one saving and one display queue. Per frame:")
+    for shared, name in [(False, "ImagePtr copies (before)"), (True, "Shared array (after)")]:
+        counts, peak, dropped = run(shared, num_frames, fps)
+        print(
+            f"  {name:<26} copies {counts.copies / num_frames:.2f}, GetNDArray {counts.get_nd_array / num_frames:.2f}, "
+            f"conversions {counts.conversions / num_frames:.2f}, handoff {counts.handoff_s / num_frames * 1e6:.0f} us, "
+            f"peak traced memory {peak / 1e6:.1f} MB, dropped {dropped}"
+        )
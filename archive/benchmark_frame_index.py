@@ -0,0 +1,91 @@
+# Check frame_index random access against a sequential decode, then time it against decoding from the start
+from pathlib import Path
+import sys
+import time
+import cv2
+import numpy as np
+import frame_index
+from frame_index import get_video_frames, build_index, FRAME_CACHE
+
+
+def write_synthetic_video(mp4_path, num_frames, size=960):
+    """Frames that differ from each other everywhere (a moving gradient plus the frame number), as cv2 writes them."""
+    x = np.arange(size, dtype=np.float32)
+    out = cv2.VideoWriter(str(mp4_path), cv2.VideoWriter_fourcc(*"mp4v"), 100, (size, size), isColor=False)
+    for i in range(num_frames):
+        frame = np.broadcast_to((127 + 127 * np.sin((x + 8 * i) / 40)).astype(np.uint8), (size, size)).copy()
+        cv2.putText(frame, str(i), (40, 160), cv2.FONT_HERSHEY_SIMPLEX, 5, 0, 10)
+        out.write(frame)
+    out.release()
+
+
+def decode_from_start(mp4_path, frame_idx):
+    """What every tool did before: open the file and read frames until the one wanted."""
+    cap = cv2.VideoCapture(str(mp4_path))
+    for _ in range(frame_idx + 1):
+        ok, frame = cap.read()
+    cap.release()
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) >= 2 else 2000
+    mp4_path = Path("/tmp/benchmark_frame_index", f"synthetic_{num_frames}.mp4")
+    mp4_path.parent.mkdir(parents=True, exist_ok=True)
+    if not mp4_path.exists():
+        write_synthetic_video(mp4_path, num_frames)
+
+    start = time.perf_counter()
+    index = build_index(mp4_path)
+    print(f"Indexed {num_frames} frames, {len(index['keyframes'])} keyframes, in {round((time.perf_counter() - start) * 1000, 1)} ms")
+
+    # Reference: every frame from one sequential decode
+    cap = cv2.VideoCapture(str(mp4_path))
+    reference = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        reference.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    assert len(reference) == num_frames == int(index["num_frames"])
+
+    rng = np.random.default_rng(0)
+    indices = rng.integers(0, num_frames, 50)
+
+    # Correctness: random order, batches with repeats, and frames right at and after keyframes
+    FRAME_CACHE.clear()
+    checks = list(indices) + list(index["keyframes"][:20]) + list(index["keyframes"][:20] + 1) + [num_frames - 1, 0]
+    for i in checks:
+        assert np.array_equal(get_video_frames(mp4_path, [min(i, num_frames - 1)])[0], reference[min(i, num_frames - 1)])
+    batch = [5, 900, 5, 17, num_frames - 2]
+    assert all(np.array_equal(f, reference[i]) for f, i in zip(get_video_frames(mp4_path, batch), batch))
+    print(f"{len(checks) + len(batch)} frames match the sequential decode")
+
+    start = time.perf_counter()
+    for i in indices[:10]:
+        decode_from_start(mp4_path, i)
+    t_start = (time.perf_counter() - start) / 10
+
+    FRAME_CACHE.clear()
+    frame_index._readers.clear()
+    start = time.perf_counter()
+    for i in indices:
+        get_video_frames(mp4_path, [i])
+    t_random = (time.perf_counter() - start) / len(indices)
+
+    start = time.perf_counter()
+    for i in indices:
+        get_video_frames(mp4_path, [i])
+    t_cached = (time.perf_counter() - start) / len(indices)
+
+    FRAME_CACHE.clear()
+    start = time.perf_counter()
+    get_video_frames(mp4_path, range(num_frames // 2, num_frames // 2 + 100))
+    t_run = (time.perf_counter() - start) / 100
+
+    print(f"Per frame, random indices of a {num_frames} frame video:")
+    print(f"  decode from start     {round(t_start * 1000, 1)} ms")
+    print(f"  keyframe seek         {round(t_random * 1000, 1)} ms")
+    print(f"  cached                {round(t_cached * 1000, 3)} ms")
+    print(f"  100 consecutive       {round(t_run * 1000, 1)} ms")
@@ -0,0 +1,121 @@
+# Record segments from a simulated overhead camera, then check the joiner: compatible segments pass, a segment with
+# different codec parameters is refused before anything is written, and the segments index maps every joined frame
+# back to its segment, local frame and host time. The stream copy itself is run if ffmpeg is installed.
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import threading
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from camera_frames import SimulatedCamera
+from overhead_recorder import OverheadRecorder
+from trial_catalog import frame_times_path
+from video_writers import make_writer
+from join_segments import (
+    find_segments,
+    check_segments,
+    join_segments,
+    write_segments_index,
+    load_segments_index,
+    locate_frame,
+)
+
+FPS = 30.0
+SHAPE = (240, 320)
+
+
+def record(save_location, duration, segment_seconds):
+    camera = SimulatedCamera(fps=FPS, shape=SHAPE, name="overhead")
+    recorder = OverheadRecorder(
+        camera,
+        "overhead",
+        FPS,
+        save_location,
+        width=SHAPE[1],
+        height=SHAPE[0],
+        bayer=False,
+        color=False,
+        segment_seconds=segment_seconds,
+        grab_errors=(TimeoutError,),
+    )
+    stop_event = threading.Event()
+    threading.Timer(duration, stop_event.set).start()
+    recorder.run(stop_event)
+    return recorder
+
+
+def read_frame(mp4_path, frame_idx):
+    cap = cv2.VideoCapture(str(mp4_path))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    ok, frame = cap.read()
+    cap.release()
+    assert ok, (mp4_path, frame_idx)
+    return frame[:, :, 0]
+
+
+if __name__ == "__main__":
+    save_location = Path(tempfile.mkdtemp(prefix="benchmark_join_"))
+    recorder = record(save_location, duration=6.0, segment_seconds=1.5)
+    date = recorder.segments[0][0].parts[-4]
+    mp4_paths = find_segments(save_location, date, "overhead")
+    assert mp4_paths == [p for p, _ in recorder.segments]
+
+    # Compatible segments pass, and their frame times line up with their frames
+    all_frame_times = check_segments(mp4_paths)
+    assert [len(t) for t in all_frame_times] == [n for _, n in recorder.segments]
+
+    # A segment of a different size is refused up front
+    odd_path = Path(save_location, date, "overhead", "9999-odd", "overhead.mp4")
+    odd_path.parent.mkdir(parents=True)
+    writer = make_writer("opencv", odd_path, FPS, 640, 480)
+    for _ in range(5):
+        writer.write(np.zeros((480, 640), dtype=np.uint8))
+    writer.release()
+    np.savetxt(frame_times_path(odd_path), np.arange(5.0), fmt="%.6f")
+    try:
+        check_segments(find_segments(save_location, date, "overhead"))
+        raise AssertionError("Incompatible segment was not detected")
+    except ValueError as ex:
+        assert "9999-odd" in str(ex)
+    shutil.rmtree(odd_path.parent)
+
+    # The index maps every joined frame number to its segment, local frame and host time
+    index_file = Path(save_location, "index.npz")
+    write_segments_index(index_file, mp4_paths, all_frame_times)
+    with np.load(index_file) as data:
+        index = {key: data[key] for key in data.files}
+    frame_idx = 0
+    for mp4_path, frame_times in zip(mp4_paths, all_frame_times):
+        for local_idx, t in enumerate(frame_times):
+            assert locate_frame(index, frame_idx) == (mp4_path, local_idx, t)
+            frame_idx += 1
+    num_frames = frame_idx
+    for outside_idx in (-1, num_frames):
+        try:
+            locate_frame(index, outside_idx)
+            raise AssertionError(f"Frame {outside_idx} is outside the video but was located")
+        except IndexError:
+            pass
+    print(f"Checked {len(mp4_paths)} segments and the index of all {num_frames} frames")
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg is not installed: checked the segments but skipped the stream copy")
+    else:
+        out_path = join_segments(save_location, date, "overhead")
+        index = load_segments_index(out_path)
+        num_frames = int(index["first_frame"][-1])
+        assert num_frames == sum(n for _, n in recorder.segments)
+        assert np.allclose(np.loadtxt(frame_times_path(out_path)), index["host_time"])
+
+        # Frames of the joined video are the frames of the segments the index points to
+        rng = np.random.default_rng(0)
+        for frame_idx in sorted(rng.choice(num_frames, size=10, replace=False)):
+            segment_path, local_idx, host_time = locate_frame(index, int(frame_idx))
+            assert host_time == np.loadtxt(frame_times_path(segment_path), ndmin=1)[local_idx]
+            assert np.array_equal(read_frame(out_path, frame_idx), read_frame(segment_path, local_idx))
+        print(f"Joined and checked {num_frames} frames from {len(recorder.segments)} segments")
+
+    shutil.rmtree(save_location)
@@ -0,0 +1,63 @@
+# Check the vectorized find_missing_packet_times against the original groupby version, then time all three
+from itertools import groupby
+import sys
+import time
+import numpy as np
+from read_state_data import find_missing_packet_times, find_missing_packet_times_dense
+
+
+def find_missing_packet_times_reference(packet_timestamps, THRESHOLD):
+    """The original implementation: groupby over a dense boolean array."""
+    timestamps_bool = np.zeros(packet_timestamps[-1] + 1, dtype="bool")
+    timestamps_bool[packet_timestamps] = 1
+    neighbor_counts = np.zeros(packet_timestamps[-1] + 1, dtype="int")
+
+    idx = 0
+    for _, group in groupby(timestamps_bool):
+        count = len(list(group))
+        neighbor_counts[idx : idx + count] = count
+        idx += count
+
+    missing_packets = np.zeros(packet_timestamps[-1] + 1, dtype="bool")
+    missing_packets[neighbor_counts < THRESHOLD] = 1
+    missing_packets[timestamps_bool] = 0
+
+    missing_packet_times = np.where(missing_packets)[0]
+    assert set(packet_timestamps) - set(missing_packet_times) == set(packet_timestamps)
+    return missing_packet_times
+
+
+def random_timestamps(rng, num_packets):
+    """Sorted timestamps with single drops, short bursts, long pauses, repeats and sometimes a late first packet."""
+    steps = rng.choice([0, 1, 2, 3, 10, 19, 20, 21, 500], size=num_packets, p=[0.01, 0.9, 0.04, 0.01, 0.01, 0.01, 0.01, 0.005, 0.005])
+    start = rng.choice([0, 0, 1, 5, 19, 20, 40])
+    timestamps = start + np.cumsum(steps) - steps[0]
+    return timestamps.astype(np.int64)
+
+
+def check_equivalence(num_cases=2000, seed=0):
+    """Property test: all implementations return identical arrays for random logs and thresholds."""
+    rng = np.random.default_rng(seed)
+    for _ in range(num_cases):
+        timestamps = random_timestamps(rng, int(rng.integers(1, 300)))
+        threshold = int(rng.choice([1, 2, 5, 20, 21, 100]))
+        expected = find_missing_packet_times_reference(timestamps, threshold)
+        for fn in (find_missing_packet_times, find_missing_packet_times_dense):
+            result = fn(timestamps, threshold)
+            assert np.array_equal(result, expected), (fn.__name__, timestamps, threshold)
+            assert result.dtype == expected.dtype
+    print(f"{num_cases} random cases match")
+
+
+if __name__ == "__main__":
+    check_equivalence()
+
+    # One hour of 1 kHz packets by default (the log spans longer because of the gaps)
+    num_packets = int(sys.argv[1]) if len(sys.argv) >= 2 else 3_600_000
+    timestamps = random_timestamps(np.random.default_rng(1), num_packets)
+    print(f"{num_packets} packets spanning {round(timestamps[-1] / 1000 / 60, 1)} minutes")
+
+    for fn in (find_missing_packet_times_reference, find_missing_packet_times_dense, find_missing_packet_times):
+        start = time.perf_counter()
+        missing = fn(timestamps, 20)
+        print(f"{fn.__name__}: {round(time.perf_counter() - start, 3)} s ({len(missing)} missing)")
@@ -0,0 +1,77 @@
+# Time mosaic.py against the BMP pipeline of process_trial.py (read BMPs, write BMP grids, encode once per fps)
+from pathlib import Path
+import shutil
+import sys
+import time
+import cv2
+import numpy as np
+from mosaic import make_mosaic, MOSAIC_ORDER, TILE_SIZE
+from verify import probe_mp4
+
+
+def write_synthetic_trial(trial_dir, num_frames, with_bmps=True):
+    """One mp4 (and optionally one directory of BMPs) per camera of moving gradients, with a frame counter."""
+    width, height = TILE_SIZE
+    x = np.arange(width, dtype=np.float32)
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    for cam_idx, cam in enumerate(c for row in MOSAIC_ORDER for c in row):
+        out = cv2.VideoWriter(str(Path(trial_dir, f"{cam}-orig.mp4")), cv2.VideoWriter_fourcc(*"mp4v"), 100, (width, height), isColor=False)
+        if with_bmps:
+            Path(trial_dir, cam).mkdir(exist_ok=True)
+        for i in range(num_frames):
+            row = (127 + 127 * np.sin((x + 8 * i) / (40 + 10 * cam_idx))).astype(np.uint8)
+            frame = np.broadcast_to(row, (height, width)).copy()
+            cv2.putText(frame, str(i), (40, 120), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 6)
+            out.write(frame)
+            if with_bmps:
+                cv2.imwrite(str(Path(trial_dir, cam, f"{cam}-{i:06d}.bmp")), frame)
+        out.release()
+
+
+def bmp_pipeline(trial_dir, fps_list):
+    """process_trial.py without debayering, with cv2.VideoWriter standing in for the ffmpeg encode of each fps."""
+    image_groups = [sorted(Path(trial_dir, cam).glob("*.bmp")) for row in MOSAIC_ORDER for cam in row]
+    concat_dir = Path(trial_dir, "concat")
+    concat_dir.mkdir(exist_ok=True)
+    for img_group in zip(*image_groups):
+        img_list = [cv2.imread(str(p)) for p in img_group]
+        rows = [cv2.hconcat(img_list[i : i + 3]) for i in range(0, len(img_list), 3)]
+        img_num = img_group[0].stem.split("-")[-1]
+        cv2.imwrite(str(Path(concat_dir, f"concat-{img_num}.bmp")), cv2.vconcat(rows))
+
+    for fps in fps_list:
+        concat_paths = sorted(concat_dir.glob("*.bmp"))
+        first = cv2.imread(str(concat_paths[0]))
+        out = cv2.VideoWriter(str(Path(trial_dir, f"concat_{fps}fps.mp4")), cv2.VideoWriter_fourcc(*"mp4v"), fps, first.shape[1::-1])
+        for p in concat_paths:
+            out.write(cv2.imread(str(p)))
+        out.release()
+
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) >= 2 else 100
+    trial_dir = Path("/tmp/benchmark_mosaic", "2024-01-01_00-00-00_000000")
+    shutil.rmtree(trial_dir.parent, ignore_errors=True)
+    write_synthetic_trial(trial_dir, num_frames)
+    fps_list = [20, 100]
+
+    start = time.perf_counter()
+    bmp_pipeline(trial_dir, fps_list)
+    t_bmp = time.perf_counter() - start
+
+    timings = {}
+    for scale in (1.0, 0.5):
+        start = time.perf_counter()
+        out_paths = make_mosaic(trial_dir, Path(trial_dir, f"videos_{scale}"), fps_list, scale, backend="opencv")
+        timings[scale] = time.perf_counter() - start
+
+        # Every fps has all the frames, retimed or not, and plays for num_frames / fps
+        for fps, out_path in zip(fps_list, out_paths):
+            info = probe_mp4(out_path)
+            assert info.num_frames == num_frames, (out_path, info.num_frames)
+            assert abs(info.duration - num_frames / fps) <= 1 / fps, (out_path, info.duration)
+
+    print(f"{num_frames} frames x {len(fps_list)} fps: BMP pipeline {round(t_bmp, 1)} s")
+    for scale, t in timings.items():
+        print(f"mosaic.py at scale {scale}: {round(t, 1)} s ({round(t_bmp / t, 1)}x)")
+    shutil.rmtree(trial_dir.parent, ignore_errors=True)
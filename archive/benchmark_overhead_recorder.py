@@ -0,0 +1,69 @@
+# Run the overhead recorder on a simulated 30 fps camera and check its segments: one per segment_seconds, every
+# frame in exactly one segment, frame counts matching the sidecars and the catalog, and segments that can be joined
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from camera_frames import SimulatedCamera
+from overhead_recorder import OverheadRecorder
+from trial_catalog import TrialCatalog, STATE_CLOSED, frame_times_path
+from verify import read_mp4_info
+
+FPS = 30.0
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) >= 2 else 10.0
+    segment_seconds = float(sys.argv[2]) if len(sys.argv) >= 3 else 3.0
+    backend = sys.argv[3] if len(sys.argv) >= 4 else "opencv"
+
+    save_location = Path(tempfile.mkdtemp(prefix="benchmark_overhead_"))
+    camera = SimulatedCamera(fps=FPS, shape=(1200, 1920), name="overhead")
+    recorder = OverheadRecorder(
+        camera, "overhead", FPS, save_location, backend=backend, segment_seconds=segment_seconds, grab_errors=(TimeoutError,)
+    )
+    stop_event = threading.Event()
+    threading.Timer(duration, stop_event.set).start()
+    start = time.perf_counter()
+    recorder.run(stop_event)
+    elapsed = time.perf_counter() - start
+
+    # Every captured frame is in exactly one segment, and each sidecar has one time per frame in the mp4
+    assert sum(n for _, n in recorder.segments) == recorder.frames_captured == camera.frames_produced
+    assert len(recorder.segments) == int(np.ceil(recorder.frames_captured / FPS / segment_seconds))
+    infos = []
+    all_times = []
+    for mp4_path, num_frames in recorder.segments:
+        frame_times = np.loadtxt(frame_times_path(mp4_path), ndmin=1)
+        info = read_mp4_info(mp4_path)
+        assert info.num_frames == len(frame_times) == num_frames, (mp4_path, info.num_frames, len(frame_times))
+        assert frame_times[-1] - frame_times[0] < segment_seconds
+        infos.append(info)
+        all_times.append(frame_times)
+    all_times = np.concatenate(all_times)
+    assert np.all(np.diff(all_times) > 0)
+
+    # Segments written with the same settings have the same timescale, as the concat demuxer needs for -c copy
+    assert len({info.timescale for info in infos}) == 1
+
+    catalog = TrialCatalog(save_location)
+    rows = catalog.query(camera="overhead", kind="video", state=STATE_CLOSED)
+    assert [Path(r["path"]) for r in rows] == [p for p, _ in recorder.segments]
+    assert [r["num_frames"] for r in rows] == [n for _, n in recorder.segments]
+    catalog.close()
+
+    intervals = np.diff(all_times)
+    print(
+        f"{recorder.frames_captured} frames in {round(elapsed, 1)} s ({round(recorder.frames_captured / elapsed, 1)} fps), "
+        f"{len(recorder.segments)} segments of {segment_seconds} s, {camera.frames_dropped} dropped by the camera, "
+        f"max interval {round(intervals.max() * 1000, 1)} ms"
+    )
+    for mp4_path, num_frames in recorder.segments:
+        print(f"  {mp4_path.relative_to(save_location)}: {num_frames} frames")
+    shutil.rmtree(save_location)
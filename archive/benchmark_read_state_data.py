@@ -0,0 +1,96 @@
+# Compare the streaming columnar loader with the original dict/DataFrame loader on a synthetic log
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import json
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+from synthetic_state_data import write_synthetic_state_log
+import read_state_data
+
+
+def read_data_from_txt_file_reference(txt_path):
+    """The original loader: list of dicts -> DataFrame -> row-by-row fixups -> per-column explode."""
+    with open(txt_path) as f:
+        text = f.read()
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines = lines[:-1]
+    state_dict_list = [json.loads(l) for l in lines]
+    df = pd.DataFrame.from_dict(state_dict_list)
+    for i, v in enumerate(df["current_errors"]):
+        df.loc[i, "current_errors"] = "" if len(v) == 0 else "/".join(v)
+    frames = []
+    for k in df.columns:
+        col_type = type(df[k].iloc[0])
+        num_sub_cols = len(df[k].iloc[0]) if (col_type == list and k != "current_errors") else 1
+        multiindex = pd.MultiIndex.from_product([[k], [str(i) for i in range(num_sub_cols)]])
+        frames.append(pd.DataFrame(df[k].to_list(), columns=multiindex))
+    df2 = pd.concat(frames, axis=1)
+    timestamps = (df2["time"] - df2["time"].iloc[0]).to_numpy().ravel()
+    packet_loss_times = read_state_data.find_missing_packet_times(timestamps, 20)
+    return df2, timestamps, packet_loss_times, state_dict_list
+
+
+def read_data_from_txt_file_new(txt_path):
+    return read_state_data.read_data_from_txt_file(txt_path)
+
+
+def run_loader(loader_name, txt_path):
+    """Runs in a fresh process so that peak RSS belongs to this loader alone."""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df2, timestamps, packet_loss_times, _ = globals()[loader_name](txt_path)
+    elapsed = time.perf_counter() - start
+    peak_rss_MB = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    return elapsed, peak_rss_MB, rss_before / 1e3, df2.shape
+
+
+def compare_outputs(txt_path):
+    """Checks that both loaders produce the same df2, timestamps and packet losses."""
+    ref = read_data_from_txt_file_reference(txt_path)
+    new = read_data_from_txt_file_new(txt_path)
+    assert list(ref[0].columns) == list(new[0].columns)
+    for col in ref[0].columns:
+        a = ref[0][col].to_numpy()
+        b = new[0][col].to_numpy()
+        assert (a == b).all(), col
+    assert np.array_equal(ref[1], new[1])
+    assert np.array_equal(ref[2], new[2])
+
+
+if __name__ == "__main__":
+    # Number of lines can be given on the command line; 1M lines is about 17 minutes of 1 kHz data
+    num_lines = int(sys.argv[1]) if len(sys.argv) >= 2 else 1_000_000
+    skip_reference = "--skip-reference" in sys.argv
+
+    out_dir = Path("/tmp/benchmark_state_data")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Check equivalence on a small log first
+    small_path = write_synthetic_state_log(Path(out_dir, "small_state.txt"), 20_000)
+    compare_outputs(small_path)
+    print("Outputs match on 20k-line log")
+
+    txt_path = Path(out_dir, f"synthetic_{num_lines}_state.txt")
+    if not txt_path.exists():
+        print(f"Writing {num_lines} line synthetic log...")
+        write_synthetic_state_log(txt_path, num_lines)
+    print(f"Log size: {round(txt_path.stat().st_size / 1e6, 1)} MB")
+
+    loaders = ["read_data_from_txt_file_new"]
+    if not skip_reference:
+        loaders.insert(0, "read_data_from_txt_file_reference")
+
+    results = {}
+    for loader_name in loaders:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            elapsed, peak_rss_MB, base_rss_MB, shape = executor.submit(run_loader, loader_name, txt_path).result()
+        results[loader_name] = (elapsed, peak_rss_MB - base_rss_MB)
+        print(f"{loader_name}: {round(elapsed, 2)} s, peak RSS +{round(peak_rss_MB - base_rss_MB, 1)} MB, df2 {shape}")
+
+    if not skip_reference:
+        (t_ref, m_ref), (t_new, m_new) = results.values()
+        print(f"Speedup: {round(t_ref / t_new, 1)}x, memory reduction: {round(m_ref / m_new, 1)}x")
@@ -0,0 +1,162 @@
+# Spread simulated batches over several directories standing in for drives (e.g. tmpfs or loopback mounts), then
+# check each placement policy, the location recorded in the catalog, and that readers find every camera's file from
+# the primary location's paths.
+from collections import Counter
+from pathlib import Path
+import datetime
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from save_targets import SaveTargets
+from trial_catalog import (
+    TrialCatalog,
+    CATALOG_NAME,
+    STATE_RECORDING,
+    STATE_CLOSED,
+    BATCH_TIME_FORMAT,
+    frame_times_path,
+    resolve_path,
+    save_locations,
+)
+from video_writers import make_writer
+from frame_index import find_camera_videos
+from frame_state_join import trial_cameras
+from make_proxies import find_trial_videos
+
+CAMERAS = ["camTL", "camTo", "camTR", "camBL", "camBo", "camBR"]
+NUM_BATCHES = 4
+NUM_FRAMES = 10
+SHAPE = (64, 64)
+
+
+def record_batches(targets, catalog, locations):
+    """Writes NUM_BATCHES batches as save_mp4 does. Returns the batch names and {(batch, cam): location}."""
+    start = datetime.datetime(2024, 9, 5, 15, 0, 0)
+    batches = [(start + datetime.timedelta(minutes=i)).strftime(BATCH_TIME_FORMAT) for i in range(NUM_BATCHES)]
+    placed = {}
+    for batch in batches:
+        # Every camera's file is open at once, as during a recording
+        for cam in CAMERAS:
+            location = targets.location_for(cam, batch)
+            assert targets.location_for(cam, batch) == location  # Stable while open
+            savename = Path(location, batch[:10], "cameras", batch, f"{cam}.mp4")
+            savename.parent.mkdir(parents=True, exist_ok=True)
+            catalog.record_file(savename, STATE_RECORDING)
+            placed[(batch, cam)] = location
+        for cam in CAMERAS:
+            savename = Path(placed[(batch, cam)], batch[:10], "cameras", batch, f"{cam}.mp4")
+            writer = make_writer("opencv", savename, 100.0, SHAPE[1], SHAPE[0])
+            for i in range(NUM_FRAMES):
+                writer.write(np.full(SHAPE, i * 20, dtype=np.uint8))
+            writer.release()
+            np.savetxt(frame_times_path(savename), time.time() + np.arange(NUM_FRAMES) / 100.0, fmt="%.6f")
+            catalog.record_file(savename, STATE_CLOSED, num_frames=NUM_FRAMES)
+            targets.release(cam, batch)
+        assert all(n == 0 for n in targets.open_writers.values())
+    return batches, placed
+
+
+def check_policies(locations):
+    # round_robin: each batch puts an equal share of the cameras on each location, and rotates every camera
+    targets = SaveTargets(locations, "round_robin", cameras=CAMERAS, min_free_GB=0)
+    plans = []
+    for batch in ["b0", "b1", "b2"]:
+        plan = Counter(targets.location_for(cam, batch) for cam in CAMERAS)
+        assert sorted(plan.values()) == [len(CAMERAS) // len(locations)] * len(locations), plan
+        plans.append({cam: targets.assigned[(batch, cam)] for cam in CAMERAS})
+        for cam in CAMERAS:
+            targets.release(cam, batch)
+    assert all(plans[0][cam] != plans[1][cam] for cam in CAMERAS)
+
+    # pin: pinned cameras always go to their location, by path or by index
+    pins = {"camTL": locations[2], "camTo": 1}
+    targets = SaveTargets(locations, "pin", cameras=CAMERAS, pins=pins, min_free_GB=0)
+    for batch in ["b0", "b1"]:
+        assert targets.location_for("camTL", batch) == locations[2]
+        assert targets.location_for("camTo", batch) == locations[1]
+    assert targets.plan(["camTL", "camTo"])[locations[2]] == ["camTL"]
+
+    # least_loaded: the location with three times the bandwidth takes the most writers
+    bandwidths = {locations[0]: 300.0, locations[1]: 100.0, locations[2]: 100.0}
+    targets = SaveTargets(locations, "least_loaded", bandwidths=bandwidths, min_free_GB=0)
+    counts = Counter(targets.location_for(cam, "b0") for cam in CAMERAS)
+    assert counts[locations[0]] > counts[locations[1]] and counts[locations[0]] > counts[locations[2]], counts
+    assert sum(counts.values()) == len(CAMERAS)
+
+    try:
+        SaveTargets(locations, "fastest")
+        raise AssertionError("Unknown policy was accepted")
+    except ValueError:
+        pass
+
+    # Locations below min_free_GB are skipped while another has room; all are used if none has
+    targets = SaveTargets(locations, "round_robin", cameras=CAMERAS, min_free_GB=1e12)
+    assert set(targets.plan(CAMERAS)) == set(locations)
+    print(f"Checked the round_robin, pin and least_loaded placements over {len(locations)} locations")
+
+
+if __name__ == "__main__":
+    tmp_dir = Path(tempfile.mkdtemp(prefix="benchmark_save_targets_"))
+    locations = [Path(tmp_dir, f"drive{i}") for i in range(3)]
+    primary = locations[0]
+    for location in locations:
+        location.mkdir()
+    check_policies(locations)
+
+    catalog = TrialCatalog(primary, extra_locations=locations)
+    assert catalog.locations() == locations
+    targets = SaveTargets(locations, "round_robin", cameras=CAMERAS, min_free_GB=0)
+    batches, placed = record_batches(targets, catalog, locations)
+    date = batches[0][:10]
+
+    # The catalog records the location of every file
+    for location in locations:
+        rows = catalog.query(kind="video", location=location)
+        assert len(rows) == sum(loc == location for loc in placed.values()) > 0
+        assert all(Path(r["path"]).parts[: len(location.parts)] == location.parts for r in rows)
+    under = catalog.query(kind="video", under=Path(primary, date, "cameras", batches[0]))
+    assert len(under) == len(CAMERAS)
+
+    # Extra locations point back at the primary, so paths on any drive resolve
+    for location in locations:
+        assert save_locations(Path(location, date))[0] == locations
+    for (batch, cam), location in placed.items():
+        primary_mp4 = Path(primary, date, "cameras", batch, f"{cam}.mp4")
+        assert resolve_path(primary_mp4) == Path(location, date, "cameras", batch, f"{cam}.mp4")
+        assert catalog.primary_path(resolve_path(primary_mp4)) == primary_mp4
+
+    # Readers see every camera of every batch, grouped under the primary location's trial directory
+    for batch in batches:
+        videos = find_camera_videos(Path(primary, date, "cameras", batch), CAMERAS)
+        assert {cam: p.parts[: len(primary.parts)] for cam, p in videos.items()} == {
+            cam: placed[(batch, cam)].parts for cam in CAMERAS
+        }
+    for trials in (trial_cameras(catalog, date), find_trial_videos(catalog, date)):
+        assert set(trials) == {Path(primary, date, "cameras", batch) for batch in batches}
+        assert all(set(cameras) == set(CAMERAS) for cameras in trials.values())
+    catalog.close()
+
+    # A catalog rebuilt from scratch finds every file by scanning all locations, and remembers the locations
+    for path in primary.glob(CATALOG_NAME + "*"):
+        path.unlink()
+    catalog = TrialCatalog(primary, extra_locations=locations)
+    start = time.perf_counter()
+    catalog.refresh()
+    elapsed = time.perf_counter() - start
+    found = Counter(r["location"] for r in catalog.query(kind="video"))
+    assert found == Counter(str(loc) for loc in placed.values()), found
+    reopened = TrialCatalog(primary)
+    assert reopened.locations() == locations
+    reopened.close()
+    catalog.close()
+    print(
+        f"Placed {len(placed)} files from {NUM_BATCHES} batches over {len(locations)} locations "
+        f"({dict(Counter(p.name for p in placed.values()))}); rescanned all locations in {round(elapsed * 1000, 1)} ms"
+    )
+
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,88 @@
+# Check the segment extraction in state_analysis against the original iterrows/np.where code, then time both
+from pathlib import Path
+import sys
+import time
+import numpy as np
+from synthetic_state_data import write_synthetic_state_log
+from read_state_data import read_state_columns, columns_to_df2
+from state_analysis import find_true_ranges, label_extents, label_runs
+
+
+def halt_motion_ranges_reference(df2):
+    """The original halt_motion range loop from plot_state_data."""
+    halt_motion_ranges = []
+    start_index = None
+    for i, row in df2.iterrows():
+        if row["halt_motion"].iloc[0] == True:  # [0] in the original; newer pandas has no positional fallback
+            if start_index is None:
+                start_index = i
+        else:
+            if start_index is not None:
+                halt_motion_ranges.append((start_index, i - 1))
+                start_index = None
+    if start_index is not None:
+        halt_motion_ranges.append((start_index, i))
+    return halt_motion_ranges
+
+
+def stage_ranges_reference(df2):
+    """The original per-stage np.where calls from plot_state_data."""
+    x_range_dict = {}
+    for stage in np.unique(df2["stage"]):
+        minx = np.where(df2["stage"] == stage)[0][0]
+        maxx = np.where(df2["stage"] == stage)[0][-1]
+        x_range_dict[stage] = (minx, maxx)
+    return x_range_dict
+
+
+def check_random_arrays(num_cases=1000, seed=0):
+    """Property test on short random arrays, including empty, all-True and repeated labels."""
+    rng = np.random.default_rng(seed)
+    for _ in range(num_cases):
+        n = int(rng.integers(0, 50))
+        halt = rng.random(n) < rng.random()
+        expected = []
+        start_index = None
+        for i, value in enumerate(halt):
+            if value and start_index is None:
+                start_index = i
+            elif not value and start_index is not None:
+                expected.append((start_index, i - 1))
+                start_index = None
+        if start_index is not None:
+            expected.append((start_index, n - 1))
+        assert find_true_ranges(halt) == expected
+
+        labels = rng.choice(np.array(["approach", "grasp", "lift"], dtype=object), size=n)
+        starts, ends, run_labels = label_runs(labels)
+        assert np.array_equal(np.repeat(run_labels, ends - starts + 1), labels)
+        for stage, (first, last) in label_extents(labels).items():
+            idx = np.flatnonzero(labels == stage)
+            assert (first, last) == (idx[0], idx[-1])
+    print(f"{num_cases} random arrays match")
+
+
+if __name__ == "__main__":
+    num_lines = int(sys.argv[1]) if len(sys.argv) >= 2 else 50_000
+    check_random_arrays()
+
+    txt_path = Path("/tmp/benchmark_state_data", f"synthetic_{num_lines}_state.txt")
+    txt_path.parent.mkdir(parents=True, exist_ok=True)
+    if not txt_path.exists():
+        write_synthetic_state_log(txt_path, num_lines)
+    df2 = columns_to_df2(read_state_columns(txt_path, fields=["time", "halt_motion", "stage"]))
+
+    start = time.perf_counter()
+    halt_ref = halt_motion_ranges_reference(df2)
+    stage_ref = stage_ranges_reference(df2)
+    t_ref = time.perf_counter() - start
+
+    start = time.perf_counter()
+    halt_new = find_true_ranges(df2["halt_motion", "0"].to_numpy())
+    stage_new = label_extents(df2["stage", "0"].to_numpy())
+    t_new = time.perf_counter() - start
+
+    assert halt_new == halt_ref
+    assert list(stage_new.items()) == list(stage_ref.items())
+    print(f"Outputs match on {num_lines} lines ({len(halt_new)} halt ranges, {len(stage_new)} stages)")
+    print(f"iterrows/np.where: {round(t_ref, 3)} s, vectorized: {round(t_new, 4)} s")
@@ -0,0 +1,113 @@
+# Check the vectorized contact detector and dx/ddx smoothing against the original per-sample loops, then time them
+import sys
+import time
+import numpy as np
+from state_analysis import detect_touching, smoothed_dx_ddx
+
+
+def detect_touching_reference(K_x_arr, x_arr, timestamps):
+    """The original loop from plot_state_data, with the DataFrame column lookups replaced by arrays."""
+    K_THRES_BIG = 5.0
+    K_THRES_SMALL = -4.0
+    DX_THRES = 0
+    DX_PERSIST_LENGTH = 200
+    WINDOW = 100
+
+    x_list = np.zeros(WINDOW)
+    touching = np.zeros(len(timestamps), dtype="bool")
+    calls_since_dx_true = 0
+    for i in range(len(timestamps)):
+        x = x_arr[i]
+        if i == 0:
+            x_list[:] = x
+        else:
+            x_list[:-1] = x_list[1:]
+            x_list[-1] = x
+        dx = (x_list[-1] - x_list[-2]) / (timestamps[i] - timestamps[i - 1]) / 0.001
+        K_x = K_x_arr[i]
+        if abs(K_x) > K_THRES_BIG:
+            touching[i] = True
+            calls_since_dx_true = DX_PERSIST_LENGTH
+        elif K_x < K_THRES_SMALL and abs(K_x) < K_THRES_BIG and dx > DX_THRES:
+            touching[i] = True
+            calls_since_dx_true = DX_PERSIST_LENGTH
+        elif calls_since_dx_true > 0:
+            touching[i] = True
+        else:
+            touching[i] = False
+        calls_since_dx_true -= 1
+    touching[:500] = False
+    touching[-200:] = False
+    return touching
+
+
+def smoothed_dx_ddx_reference(x, timestamps, WINDOW=50):
+    """The original shifting-window dx/ddx estimator from plot_state_data."""
+    preceding_x = np.zeros(WINDOW)
+    preceding_dx = np.zeros(WINDOW)
+    preceding_dx_smooth = np.zeros(WINDOW)
+    preceding_ddx = np.zeros(WINDOW)
+    dx_from_smoothing = np.zeros(len(x))
+    ddx_from_smoothing = np.zeros(len(x))
+    for i in range(len(x)):
+        if i == 0:
+            preceding_x[:] = x[i]
+        else:
+            preceding_x[:-1] = preceding_x[1:]
+            preceding_x[-1] = x[i]
+            preceding_dx[:-1] = preceding_dx[1:]
+            dt = timestamps[i] - timestamps[i - 1]
+            preceding_dx[-1] = (preceding_x[-1] - preceding_x[-2]) / dt / dt / 0.001
+            dx_smooth = np.mean(preceding_dx)
+            preceding_dx_smooth[:-1] = preceding_dx_smooth[1:]
+            preceding_dx_smooth[-1] = dx_smooth
+            preceding_ddx[:-1] = preceding_ddx[1:]
+            preceding_ddx[-1] = (preceding_dx_smooth[-1] - preceding_dx_smooth[-2]) / dt / 0.001
+            dx_from_smoothing[i] = dx_smooth
+            ddx_from_smoothing[i] = np.mean(preceding_ddx)
+    return dx_from_smoothing, ddx_from_smoothing
+
+
+def synthetic_inputs(num_samples, seed=0):
+    """(K_x, x, timestamps) like the synthetic state logs, with contact periods and occasional dropped packets."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(1 + (rng.random(num_samples) < 0.001)) - 1
+    phase = timestamps / 1000.0
+    x = 0.4 + 0.05 * np.sin(phase) + 1e-5 * rng.standard_normal(num_samples)
+    K_x = 5.0 * np.sin(phase * 0.3) + rng.standard_normal(num_samples)
+    return K_x, x, timestamps
+
+
+def check_equivalence(K_x, x, timestamps):
+    touching = detect_touching(K_x, x, timestamps)
+    assert np.array_equal(touching, detect_touching_reference(K_x, x, timestamps))
+
+    dx, ddx = smoothed_dx_ddx(x, timestamps)
+    dx_ref, ddx_ref = smoothed_dx_ddx_reference(x, timestamps)
+    # Window sums are accumulated in a different order than np.mean, so allow rounding differences
+    assert np.allclose(dx, dx_ref, rtol=1e-9, atol=1e-9 * np.abs(dx_ref).max())
+    assert np.allclose(ddx, ddx_ref, rtol=1e-9, atol=1e-9 * np.abs(ddx_ref).max())
+    print(f"Outputs match on {len(x)} samples ({touching.sum()} touching)")
+
+
+def time_function(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    num_samples = int(sys.argv[1]) if len(sys.argv) >= 2 else 1_000_000
+    num_reference_samples = min(num_samples, 100_000)  # The loops take over a second per 100k samples
+
+    K_x, x, timestamps = synthetic_inputs(num_samples)
+    check_equivalence(K_x[:num_reference_samples], x[:num_reference_samples], timestamps[:num_reference_samples])
+
+    n = num_reference_samples
+    t_ref = time_function(detect_touching_reference, K_x[:n], x[:n], timestamps[:n])
+    t_ref += time_function(smoothed_dx_ddx_reference, x[:n], timestamps[:n])
+    print(f"Loops, {n} samples: {round(t_ref, 3)} s")
+
+    t_new = time_function(detect_touching, K_x, x, timestamps)
+    t_new += time_function(smoothed_dx_ddx, x, timestamps)
+    print(f"Vectorized, {num_samples} samples: {round(t_new, 3)} s")
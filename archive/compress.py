@@ -9,6 +9,9 @@ import select
 import sys
 import datetime
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog
+
 COMPRESSION_LEVEL = 34
 
 
@@ -157,28 +160,23 @@ def compress_and_delete(input_dir, FPS, input_format, output_prefix, overwrite_e
 
 def find_uncompressed_directories(base_dir, input_format):
 
-    # Get nested directories
-    subdirs = [p for p in base_dir.rglob("*") if p.is_dir()]
-    subdirs.append(base_dir)  # Add base_dir
-    subdirs.sort()
-
-    # Find lengths of dirs containing input_format
-    uncompressed_dirs_lengths = {}
-    for subdir in subdirs:
-        file_list = list(subdir.glob(f"*{input_format}"))
-        num_files = len(file_list)
-        uncompressed_dirs_lengths[subdir] = num_files
+    # Find lengths of dirs containing images (the catalog only relists directories whose mtime changed)
+    catalog = TrialCatalog(base_dir)
+    catalog.refresh()
+    uncompressed_dirs_lengths = {r["path"]: r["num_frames"] for r in catalog.query(kind="image_dir")}
 
     # Pause to allow more files to be written
     time.sleep(0.5)
 
     # Check again, store unchanged dirs
+    catalog.refresh()
     uncompressed_dirs = []
-    for subdir in subdirs:
-        file_list = list(subdir.glob(f"*{input_format}"))
-        num_files = len(file_list)
-        if (num_files == uncompressed_dirs_lengths[subdir]) & (num_files > 0):
-            uncompressed_dirs.append(subdir)
+    for r in catalog.query(kind="image_dir"):
+        num_files = r["num_frames"]
+        if (num_files == uncompressed_dirs_lengths.get(r["path"])) & (num_files > 0):
+            subdir = Path(r["path"])
+            if next(subdir.glob(f"*{input_format}"), None) is not None:
+                uncompressed_dirs.append(subdir)
 
     return uncompressed_dirs
 
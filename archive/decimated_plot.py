@@ -0,0 +1,161 @@
+# Min/max decimated line plots that re-decimate on zoom/pan, and a blitted crosshair, for long state logs
+import numpy as np
+import matplotlib.pyplot as plt
+
+POINTS_PER_PIXEL = 2  # One min and one max per pixel column keeps every peak visible
+
+
+def _bucket_extrema(buckets):
+    """Indices of the min and max in each row, ignoring NaNs unless the whole row is NaN."""
+    if np.issubdtype(buckets.dtype, np.floating):
+        nan = np.isnan(buckets)
+        return np.where(nan, np.inf, buckets).argmin(axis=1), np.where(nan, -np.inf, buckets).argmax(axis=1)
+    return buckets.argmin(axis=1), buckets.argmax(axis=1)
+
+
+def minmax_decimate(x, y, max_points):
+    """
+    Returns (x, y) reduced to at most about max_points samples, keeping the min and max of each bucket in order.
+
+    NaNs are only kept if a whole bucket is NaN, so gaps in the data still show as gaps.
+    """
+    n = len(x)
+    if n <= max_points:
+        return x, y
+
+    bucket = int(np.ceil(n / max(1, max_points // 2)))
+    num_buckets = n // bucket
+    i_min, i_max = _bucket_extrema(y[: num_buckets * bucket].reshape(num_buckets, bucket))
+    offsets = np.arange(num_buckets) * bucket
+
+    # The last partial bucket
+    if num_buckets * bucket < n:
+        tail_min, tail_max = _bucket_extrema(y[num_buckets * bucket :].reshape(1, -1))
+        i_min = np.append(i_min, tail_min)
+        i_max = np.append(i_max, tail_max)
+        offsets = np.append(offsets, num_buckets * bucket)
+
+    idx = np.sort(np.stack((i_min + offsets, i_max + offsets), axis=1), axis=1).ravel()
+    return x[idx], y[idx]
+
+
+class DecimatedFigure:
+    """
+    Keeps the full-resolution data of each line and shows a min/max decimated copy of the visible x range.
+
+    Lines are re-decimated whenever an axis' x limits change (zoom, pan, home) or the figure is resized.
+    """
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.lines = {}  # Axes -> list of (Line2D, x, y)
+        self.fig.canvas.mpl_connect("resize_event", lambda event: [self._update_ax(ax) for ax in self.lines])
+
+        # Crosshair state
+        self.vlines = []
+        self.use_blit = False
+        self.background = None
+        self.crosshair_x = None
+
+    def plot(self, ax, x, y, *args, label=None, **kwargs):
+        """Drop-in for ax.plot(x, y, ...). 2-D y (array or DataFrame) gives one line per column, as with ax.plot."""
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=float)
+        if y.ndim == 1:
+            y = y.reshape(-1, 1)
+        if label is None or isinstance(label, str):
+            labels = [label] * y.shape[1]
+        else:
+            labels = list(label)
+
+        if ax not in self.lines:
+            self.lines[ax] = []
+            ax.callbacks.connect("xlim_changed", self._update_ax)
+
+        lines = []
+        max_points = self._max_points(ax)
+        for col, col_label in zip(range(y.shape[1]), labels):
+            y_col = np.ascontiguousarray(y[:, col])
+            x_dec, y_dec = minmax_decimate(x, y_col, max_points)
+            line_kwargs = dict(kwargs)
+            if col_label is not None:
+                line_kwargs["label"] = col_label
+            (line,) = ax.plot(x_dec, y_dec, *args, **line_kwargs)
+            self.lines[ax].append((line, x, y_col))
+            lines.append(line)
+        return lines
+
+    def _max_points(self, ax):
+        return max(100, int(ax.bbox.width * POINTS_PER_PIXEL))
+
+    def _update_ax(self, ax):
+        """Re-decimates the lines of one axis for its current x limits."""
+        x_min, x_max = sorted(ax.get_xlim())
+        max_points = self._max_points(ax)
+        for line, x, y in self.lines.get(ax, []):
+            # Include one sample beyond each edge so lines run off the sides of the axis
+            start = max(0, np.searchsorted(x, x_min, side="left") - 1)
+            stop = min(len(x), np.searchsorted(x, x_max, side="right") + 1)
+            line.set_data(*minmax_decimate(x[start:stop], y[start:stop], max_points))
+
+    def add_crosshair(self, axs):
+        """
+        Adds a vertical line to each axis that follows the mouse.
+
+        Only the lines are redrawn on mouse moves, over a saved copy of the figure, instead of redrawing every axis.
+        """
+        canvas = self.fig.canvas
+        self.use_blit = getattr(canvas, "supports_blit", False)  # Otherwise fall back to a full redraw per move
+        self.vlines = [ax.axvline(x=0, color="red", lw=1, visible=False, animated=self.use_blit) for ax in axs]
+        canvas.mpl_connect("draw_event", self._on_draw)
+        canvas.mpl_connect("motion_notify_event", self._on_move)
+
+    def _on_draw(self, event):
+        # Save the figure without the crosshair after every full draw (zoom, pan, resize)
+        if self.use_blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+            self._draw_crosshair()
+
+    def _on_move(self, event):
+        if not event.inaxes:
+            return
+        self.crosshair_x = event.xdata
+        if not self.use_blit:
+            self._set_crosshair()
+            self.fig.canvas.draw_idle()
+        elif self.background is not None:
+            self.fig.canvas.restore_region(self.background)
+            self._draw_crosshair()
+
+    def _set_crosshair(self):
+        for line in self.vlines:
+            line.set_xdata([self.crosshair_x, self.crosshair_x])
+            line.set_visible(True)
+
+    def _draw_crosshair(self):
+        if self.crosshair_x is None or self.background is None:
+            return
+        self._set_crosshair()
+        for line in self.vlines:
+            line.axes.draw_artist(line)
+        self.fig.canvas.blit(self.fig.bbox)
+
+
+if __name__ == "__main__":
+    # Compare drawing a long log at full resolution with the decimated version
+    import time
+
+    num_samples = 3_600_000  # One hour at 1 kHz
+    t = np.arange(num_samples)
+    y = np.sin(t / 1000).reshape(-1, 1) + 0.1 * np.random.default_rng(0).standard_normal((num_samples, 7))
+
+    for decimate in (False, True):
+        fig, ax = plt.subplots()
+        start = time.perf_counter()
+        if decimate:
+            DecimatedFigure(fig).plot(ax, t, y)
+        else:
+            ax.plot(t, y)
+        fig.canvas.draw()
+        print(f"{'Decimated' if decimate else 'Full resolution'}: {round(time.perf_counter() - start, 2)} s")
+        plt.close(fig)
@@ -1,60 +1,95 @@
-import os
-import glob
-import matplotlib.pyplot as plt
-from PIL import Image
+# Live view of the latest frame of every camera, read from the recorder's shared memory instead of the disk
 from pathlib import Path
+import argparse
+import sys
+import time
 import numpy as np
-from matplotlib.animation import FuncAnimation
+import matplotlib.pyplot as plt
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from latest_frames import LatestFrames, SHM_NAME
 
-def find_newest_image(base_path, cam):
-    """
-    Find the newest image in the specified camera directory.
-    """
-    newest_date_dir = max(glob.glob(f"{base_path}/*"), key=os.path.getctime)
-    list_of_files = list(Path(newest_date_dir).rglob(f"{cam}/*.bmp"))
-    if not list_of_files:  # directory might be empty
-        return None
-    latest_file = max(list_of_files, key=os.path.getctime)
-    return latest_file
+MAX_COLS = 3
+REFRESH_MS = 100
+STEP = 2  # Frames are subsampled by this for display
 
 
-def update_images(frame, ax, base_path, cameras):
-    """
-    Update the images in the existing plot.
-    """
-    images = []
-    for cam in cameras:
-        newest_image_path = find_newest_image(base_path, cam)
-        if newest_image_path:
-            img = Image.open(newest_image_path)
-            img = np.array(img)  # Convert to numpy array
-            images.append(img)
+def wait_for_recorder(name, timeout=None):
+    """Attaches to the recorder's latest frames, waiting for it to start."""
+    start_time = time.time()
+    while True:
+        try:
+            return LatestFrames.attach(name)
+        except FileNotFoundError:
+            if timeout is not None and time.time() - start_time > timeout:
+                raise
+            print("Waiting for the recorder to start...", end="\r")
+            time.sleep(1)
 
-    if len(images) == 6:  # Ensure all 6 images are present
-        # Combine images into 2x3 grid
-        rows = [np.hstack(images[i : i + 3]) for i in range(0, len(images), 3)]
-        im_grid = np.vstack(rows)
 
-        ax.clear()
-        ax.imshow(im_grid)
-        ax.axis("off")
+class LatestFrameViewer:
+    """
+    One persistent image of all cameras, tiled. Each refresh copies only the slots whose sequence number changed into
+    the tiled array and calls set_data, so its cost does not depend on how much has been recorded.
+    """
 
+    def __init__(self, latest, step=STEP):
+        self.latest = latest
+        self.step = step
+        height, width = -(-latest.shape[0] // step), -(-latest.shape[1] // step)  # As frames[::step]
+        num = len(latest.cams)
+        num_cols = min(num, MAX_COLS)
+        num_rows = int(np.ceil(num / MAX_COLS))
+        self.canvas = np.zeros((num_rows * height, num_cols * width), dtype=np.uint8)
+        self.tiles = [
+            self.canvas[(i // MAX_COLS) * height : (i // MAX_COLS + 1) * height, (i % MAX_COLS) * width : (i % MAX_COLS + 1) * width]
+            for i in range(num)
+        ]
+        self.sequences = [-1] * num
 
-def main():
-    base_path = "/home/oconnorlab/Data/2023-12-13/cameras"
-    cameras = ["camTL", "camTo", "camTR", "camBL", "camBo", "camBR"]
+        self.fig, self.ax = plt.subplots(figsize=(10, 6))
+        self.image = self.ax.imshow(self.canvas, cmap="gray", vmin=0, vmax=255, interpolation="nearest")
+        self.ax.axis("off")
+        self.title = self.ax.set_title("")
+        for i, cam in enumerate(latest.cams):
+            self.ax.text(
+                (i % MAX_COLS) * width + 5, (i // MAX_COLS) * height + 20, cam, color="yellow", fontsize=9
+            )
 
-    # Initialize plot
-    fig, ax = plt.subplots(figsize=(10, 6))
+    def refresh(self):
+        """Returns True if any camera had a new frame."""
+        changed = False
+        newest = 0.0
+        for slot, tile in enumerate(self.tiles):
+            if self.latest.sequence(slot) == self.sequences[slot]:
+                continue
+            result = self.latest.read(slot, tile, self.step)
+            if result is not None:
+                self.sequences[slot], _, host_time = result
+                newest = max(newest, host_time)
+                changed = True
+        if changed:
+            self.image.set_data(self.canvas)
+            self.title.set_text(f"Latency {round((time.time() - newest) * 1000)} ms")
+        return changed
 
-    # find_newest_image(base_path, cameras[0])
+    def run(self, refresh_ms=REFRESH_MS):
+        timer = self.fig.canvas.new_timer(interval=refresh_ms)
+        timer.add_callback(lambda: self.refresh() and self.fig.canvas.draw_idle())
+        timer.start()
+        plt.show()
 
-    # Create animation
-    anim = FuncAnimation(fig, update_images, fargs=(ax, base_path, cameras), interval=250)
 
-    plt.show()
+if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Show the latest frame of every camera while recording.")
+    parser.add_argument("--name", default=SHM_NAME, help="Shared memory name used by the recorder")
+    parser.add_argument("--step", type=int, default=STEP, help="Subsample frames by this for display")
+    parser.add_argument("--refresh-ms", type=int, default=REFRESH_MS)
+    args = parser.parse_args()
 
-if __name__ == "__main__":
-    main()
+    latest = wait_for_recorder(args.name)
+    try:
+        LatestFrameViewer(latest, args.step).run(args.refresh_ms)
+    finally:
+        latest.close()
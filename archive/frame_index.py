@@ -0,0 +1,245 @@
+# Random access to frames of the recorded mp4s, using a keyframe/PTS index sidecar next to each file
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import os
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from trial_catalog import TrialCatalog, STATE_RECORDING, resolve_path
+from verify import read_mp4_info
+
+INDEX_SUFFIX = ".idx.npz"  # <cam>.mp4.idx.npz
+CACHE_BYTES = 1024**3  # Decoded frames kept in memory across all files
+MAX_OPEN_READERS = 12  # One open decoder per file; the least recently used is closed beyond this
+
+
+def index_path(mp4_path):
+    return Path(str(mp4_path) + INDEX_SUFFIX)
+
+
+def find_camera_videos(trial_dir, cameras):
+    """
+    {camera: mp4 path}, preferring the compressed <cam>.mp4 over <cam>-orig.mp4. Each file may be on any save location.
+    Missing cameras are left out.
+    """
+    videos = {}
+    for cam in cameras:
+        for name in (f"{cam}.mp4", f"{cam}-orig.mp4"):
+            mp4_path = resolve_path(Path(trial_dir, name))
+            if mp4_path.exists():
+                videos[cam] = mp4_path
+                break
+    return videos
+
+
+def build_index(mp4_path):
+    """
+    Reads keyframes and per-frame PTS from the container index of a closed mp4 and writes <mp4>.idx.npz.
+
+    Only the moov box is read, not the video data. Returns the index, or None if the file has no index yet.
+    """
+    mp4_path = Path(mp4_path)
+    stat = mp4_path.stat()
+    info = read_mp4_info(mp4_path, with_pts=True)
+    if info is None:
+        return None
+    keyframes = np.arange(info.num_frames) if info.keyframes is None else np.array(info.keyframes)
+    index = {
+        "keyframes": keyframes.astype(np.int64),
+        "pts": np.array(info.pts if info.pts is not None else [], dtype=np.float64),
+        "num_frames": info.num_frames,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    tmp_path = Path(str(index_path(mp4_path)) + ".tmp.npz")
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, index_path(mp4_path))
+    return index
+
+
+def load_index(mp4_path, build=True):
+    """Returns the index of an mp4, (re)building it if it is missing or the mp4 changed since it was written."""
+    idx_path = index_path(mp4_path)
+    if idx_path.exists():
+        index = dict(np.load(idx_path))
+        stat = Path(mp4_path).stat()
+        if int(index["size"]) == stat.st_size and int(index["mtime_ns"]) == stat.st_mtime_ns:
+            return index
+    return build_index(mp4_path) if build else None
+
+
+class FrameCache:
+    """Decoded frames keyed by (path, frame index), evicting the least recently used beyond max_bytes."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        with self.lock:
+            if key in self.frames:
+                return
+            self.frames[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes and self.frames:
+                _, evicted = self.frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+
+class FrameReader:
+    """
+    An open decoder for one mp4 that remembers its position.
+
+    A requested frame is decoded forward from the current position when that is cheaper, and otherwise from the
+    nearest keyframe at or before it, which is seeked to directly.
+    """
+
+    def __init__(self, mp4_path):
+        self.mp4_path = Path(mp4_path)
+        self.index = load_index(mp4_path)
+        if self.index is None:
+            raise ValueError(f"{mp4_path} has no index yet (still recording?)")
+        self.keyframes = self.index["keyframes"]
+        self.num_frames = int(self.index["num_frames"])
+        self.cap = cv2.VideoCapture(str(mp4_path))
+        self.position = 0  # Index of the frame the next read() returns
+        self.lock = threading.Lock()
+
+    def _keyframe_before(self, frame_idx):
+        return int(self.keyframes[max(0, np.searchsorted(self.keyframes, frame_idx, side="right") - 1)])
+
+    def _move_to(self, frame_idx):
+        # Seeking restarts decoding at a keyframe, so it only saves work if that keyframe is past the current position
+        keyframe = self._keyframe_before(frame_idx)
+        if frame_idx < self.position or keyframe > self.position:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self.position = keyframe
+        while self.position < frame_idx:
+            self.cap.grab()
+            self.position += 1
+
+    def read(self, frame_idx, gray=True):
+        if not 0 <= frame_idx < self.num_frames:
+            raise IndexError(f"Frame {frame_idx} out of range for {self.mp4_path} ({self.num_frames} frames)")
+        self._move_to(frame_idx)
+        ok, frame = self.cap.read()
+        self.position += 1
+        if not ok:
+            raise IOError(f"Could not decode frame {frame_idx} of {self.mp4_path}")
+        if gray and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def close(self):
+        self.cap.release()
+
+
+_readers = OrderedDict()
+_readers_lock = threading.Lock()
+FRAME_CACHE = FrameCache()
+
+
+def _get_reader(mp4_path):
+    mp4_path = Path(mp4_path)
+    with _readers_lock:
+        reader = _readers.get(mp4_path)
+        if reader is not None and reader.index["mtime_ns"] != mp4_path.stat().st_mtime_ns:
+            reader.close()
+            reader = None
+        if reader is None:
+            reader = FrameReader(mp4_path)
+            _readers[mp4_path] = reader
+            while len(_readers) > MAX_OPEN_READERS:
+                _, old = _readers.popitem(last=False)
+                old.close()
+        _readers.move_to_end(mp4_path)
+    return reader
+
+
+def get_video_frames(mp4_path, indices, gray=True, cache=FRAME_CACHE):
+    """
+    Returns a list of frames (numpy arrays) of one mp4, in the order of indices.
+
+    Cached frames are returned directly. The rest are decoded in ascending order, so runs of nearby indices share one
+    seek, and added to the cache. Cached frames are shared between callers and must not be modified.
+    """
+    mp4_path = Path(mp4_path)
+    frames = {}
+    missing = []
+    for i in sorted(set(int(i) for i in indices)):
+        frame = cache.get((mp4_path, i, gray)) if cache is not None else None
+        if frame is None:
+            missing.append(i)
+        else:
+            frames[i] = frame
+
+    if missing:
+        reader = _get_reader(mp4_path)
+        with reader.lock:
+            for i in missing:
+                frame = reader.read(i, gray)
+                frame.flags.writeable = False
+                frames[i] = frame
+                if cache is not None:
+                    cache.put((mp4_path, i, gray), frame)
+    return [frames[int(i)] for i in indices]
+
+
+def get_frames(batch_dir, cam, indices, gray=True):
+    """Frames of camera cam (e.g. "camTL") in a trial directory, from the compressed mp4 if there is one."""
+    videos = find_camera_videos(batch_dir, [cam])
+    if cam not in videos:
+        raise FileNotFoundError(f"No video of {cam} in {batch_dir}")
+    return get_video_frames(videos[cam], indices, gray)
+
+
+def get_frame_times(batch_dir, cam):
+    """Presentation time (s from the start of the video) of every frame of a camera."""
+    return load_index(find_camera_videos(batch_dir, [cam])[cam])["pts"]
+
+
+def index_all(root, max_workers=4):
+    """Builds missing or out-of-date indexes for every closed video in the catalog."""
+    catalog = TrialCatalog(root)
+    catalog.refresh()
+    todo = [
+        Path(r["path"])
+        for r in catalog.query(kind="video")
+        if r["state"] != STATE_RECORDING and Path(r["path"]).exists() and load_index(r["path"], build=False) is None
+    ]
+    catalog.close()
+    print(f"Indexing {len(todo)} videos")
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        num_built = sum(index is not None for index in executor.map(build_index, todo))
+    print(f"Indexed {num_built} videos in {round(time.time() - start_time, 1)} s")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build frame indexes for all closed videos under a save location.")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    index_all(Path(args.root), args.workers)
@@ -0,0 +1,198 @@
+# Robot state at each camera frame, by a vectorized join of frame times with the state log times
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import numpy as np
+from state_cache import load_state_columns, evict
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from trial_catalog import TrialCatalog, BATCH_TIME_FORMAT, frame_times_path, STATE_RECORDING
+from verify import get_num_frames
+
+STATE_LOG_TIME_FORMAT = "%Y-%m-%d_%H-%M-%S"  # Start of the name of each state log, e.g. 2024-09-05_15-22-45_state.txt
+DEFAULT_FIELDS = ["O_T_EE", "tau_ext_hat_filtered", "stage"]
+MAX_GAP = 0.05  # (s) Frames further than this from any state record are marked invalid
+JOIN_NAME = "frame_state_join.npz"
+
+
+def _host_time(name, time_format):
+    """Seconds since the epoch for a name that starts with a local time, as written by the recorder."""
+    length = len(datetime.datetime(2000, 1, 1).strftime(time_format))
+    return datetime.datetime.strptime(name[:length], time_format).timestamp()
+
+
+def load_frame_times(mp4_path, num_frames=None):
+    """
+    Host time (s) of each frame of a camera mp4.
+
+    Uses the recorder's per-frame sidecar when present. Older trials fall back to the batch start time (from the trial
+    directory name) plus frame_idx / VIDEO_FPS, which needs PySpin to import the recorder's params.
+    """
+    mp4_path = Path(mp4_path)
+    sidecar = frame_times_path(mp4_path)
+    if sidecar.exists():
+        return np.atleast_1d(np.loadtxt(sidecar, dtype=np.float64))
+    from record_multi_cam_params import VIDEO_FPS
+
+    if num_frames is None:
+        num_frames = get_num_frames(mp4_path)
+    return _host_time(mp4_path.parent.name, BATCH_TIME_FORMAT) + np.arange(num_frames) / VIDEO_FPS
+
+
+def unique_state_logs(state_logs):
+    """One path per state log, preferring <x>.txt.gz over <x>.txt when compression left both."""
+    by_name = {}
+    for path in map(Path, state_logs):
+        name = path.name.removesuffix(".gz")
+        if name not in by_name or path.suffix == ".gz":
+            by_name[name] = path
+    return [by_name[name] for name in sorted(by_name)]
+
+
+class StateTimeline:
+    """
+    The state logs of a day, concatenated and sorted by host time, for joining many trials against.
+
+    The robot's own time column (ms) is mapped to host time from the log's start time in its file name.
+    """
+
+    def __init__(self, state_logs, fields=DEFAULT_FIELDS):
+        self.fields = list(fields)
+        self.sources = []
+        host_times = []
+        parts = {k: [] for k in self.fields}
+        for txt_path in unique_state_logs(state_logs):
+            columns = load_state_columns(txt_path, fields=["time"] + self.fields, max_bytes=None)
+            if len(columns.get("time", [])) == 0:
+                continue
+            robot_ms = np.asarray(columns["time"], dtype=np.float64).ravel()
+            host_times.append(_host_time(Path(txt_path).name, STATE_LOG_TIME_FORMAT) + (robot_ms - robot_ms[0]) / 1000)
+            for k in self.fields:
+                parts[k].append(np.asarray(columns[k]))
+            stat = Path(txt_path).stat()
+            self.sources.append([str(txt_path), stat.st_size, stat.st_mtime_ns])
+
+        self.t = np.concatenate(host_times) if host_times else np.zeros(0)
+        order = np.argsort(self.t, kind="stable")
+        self.t = self.t[order]
+        self.columns = {k: np.concatenate(v)[order] for k, v in parts.items() if v}
+        evict()  # Once for all the logs, rather than on every cache miss
+
+    def join(self, frame_t, method="nearest", max_gap=MAX_GAP):
+        """
+        Returns {field: array with one row per frame} plus "state_index", "state_dt" (s) and "valid".
+
+        method "nearest" takes the closest record. "linear" interpolates numeric fields between the records on either
+        side of each frame, and takes the closest record for the rest (e.g. stage).
+        """
+        frame_t = np.asarray(frame_t, dtype=np.float64)
+        n = len(self.t)
+        if n == 0:
+            return {"valid": np.zeros(len(frame_t), dtype=bool)}
+
+        right = np.clip(np.searchsorted(self.t, frame_t), 1, n - 1) if n > 1 else np.zeros(len(frame_t), dtype=int)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(np.abs(self.t[right] - frame_t) < np.abs(frame_t - self.t[left]), right, left)
+        state_dt = self.t[nearest] - frame_t
+
+        joined = {"state_index": nearest, "state_dt": state_dt, "valid": np.abs(state_dt) <= max_gap}
+        if method == "linear":
+            span = self.t[right] - self.t[left]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                w = np.clip(np.where(span > 0, (frame_t - self.t[left]) / span, 0.0), 0.0, 1.0)
+        for k, column in self.columns.items():
+            if method == "linear" and column.dtype.kind in "fiu":
+                w_k = w.reshape((-1,) + (1,) * (column.ndim - 1))
+                joined[k] = column[left] * (1 - w_k) + column[right] * w_k
+            else:
+                joined[k] = column[nearest]
+        return joined
+
+
+def _signature(paths):
+    signature = []
+    for p in paths:
+        p = Path(p)
+        stat = p.stat() if p.exists() else None
+        signature.append([str(p), stat.st_size if stat else 0, stat.st_mtime_ns if stat else 0])
+    return signature
+
+
+def join_trial(trial_dir, timeline, cameras, method="nearest", use_cache=True):
+    """
+    Joins every camera of one trial directory. Returns {camera: {field: array}}.
+
+    Results are cached in <trial_dir>/frame_state_join.npz, keyed by the frame time sources, the state logs, the fields
+    and the method, so only trials whose inputs changed are recomputed.
+    """
+    cache_path = Path(trial_dir, JOIN_NAME)
+    inputs = [p for mp4 in cameras.values() for p in (mp4, frame_times_path(mp4))]
+    key = json.dumps([_signature(inputs), timeline.sources, timeline.fields, method])
+    if use_cache and cache_path.exists():
+        with np.load(cache_path) as cached:
+            if str(cached["key"]) == key:
+                result = {}
+                for name in cached.files:
+                    if name != "key":
+                        camera, field = name.split("/", 1)
+                        result.setdefault(camera, {})[field] = cached[name]
+                return result
+
+    result = {}
+    for camera, mp4_path in cameras.items():
+        frame_t = load_frame_times(mp4_path)
+        result[camera] = {"frame_time": frame_t}
+        result[camera].update(timeline.join(frame_t, method))
+
+    arrays = {f"{camera}/{k}": (v.astype(str) if v.dtype == object else v) for camera, d in result.items() for k, v in d.items()}
+    Path(trial_dir).mkdir(parents=True, exist_ok=True)  # On the primary location, which may hold none of the cameras
+    tmp_path = Path(trial_dir, JOIN_NAME + ".tmp.npz")
+    np.savez(tmp_path, key=key, **arrays)
+    os.replace(tmp_path, cache_path)
+    return result
+
+
+def trial_cameras(catalog, date):
+    """
+    {trial_dir: {camera: mp4 path}} for a date, preferring the compressed <cam>.mp4 over <cam>-orig.mp4. Each trial_dir
+    is on the primary save location, and its cameras may be on any location.
+    """
+    trials = {}
+    for r in catalog.query(date=date, kind="video"):
+        path = Path(r["path"])
+        if path.parent.parent.name != "cameras" or r["state"] == STATE_RECORDING:
+            continue
+        cameras = trials.setdefault(catalog.primary_path(path.parent), {})
+        if r["camera"] not in cameras or not path.stem.endswith("-orig"):
+            cameras[r["camera"]] = path
+    return trials
+
+
+def join_day(save_location, date, fields=DEFAULT_FIELDS, method="nearest"):
+    """Joins all trials of a date. Loads the state logs of that date once and reuses them for every trial."""
+    catalog = TrialCatalog(save_location)
+    catalog.refresh(Path(save_location, date))
+    state_logs = [Path(r["path"]) for r in catalog.query(date=date, kind="state_log") if r["state"] != STATE_RECORDING]
+    timeline = StateTimeline(state_logs, fields)
+    return {trial_dir: join_trial(trial_dir, timeline, cameras, method) for trial_dir, cameras in trial_cameras(catalog, date).items()}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Join robot state to every camera frame of a day's trials.")
+    parser.add_argument("date", help="e.g. 2024-09-05")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location")
+    parser.add_argument("--fields", nargs="+", default=DEFAULT_FIELDS)
+    parser.add_argument("--method", choices=["nearest", "linear"], default="nearest")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    results = join_day(Path(args.root), args.date, args.fields, args.method)
+    num_frames = sum(len(d["frame_time"]) for cams in results.values() for d in cams.values())
+    num_valid = sum(int(d["valid"].sum()) for cams in results.values() for d in cams.values())
+    print(f"Joined {num_frames} frames ({num_valid} with state) in {len(results)} trials in {round(time.time() - start_time, 2)} s")
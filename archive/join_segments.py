@@ -0,0 +1,151 @@
+# Join a day's overhead camera segments into one mp4 by stream copy, with an index of where every frame came from
+from pathlib import Path
+import argparse
+import os
+import shutil
+import sys
+import time
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from trial_catalog import TrialCatalog, STATE_CLOSED, frame_times_path
+from verify import read_mp4_info, run_ffmpeg_with_progress, get_num_frames
+
+SEGMENTS_SUFFIX = ".segments.npz"  # <date>_<cam>.mp4.segments.npz
+
+
+def segments_index_path(mp4_path):
+    return Path(str(mp4_path) + SEGMENTS_SUFFIX)
+
+
+def find_segments(save_location, date, cam_name):
+    """Closed segments of a camera on a date, in recording order (segment directories are named by start time)."""
+    segments = []
+    for mp4_path in sorted(Path(save_location, date, cam_name).glob(f"*/{cam_name}.mp4")):
+        if read_mp4_info(mp4_path) is None:
+            print(f"Skipping {mp4_path}: still being written")
+            continue
+        segments.append(mp4_path)
+    return segments
+
+
+def check_segments(mp4_paths):
+    """
+    Reads the container index and frame times of every segment and checks that they can be joined by stream copy:
+    the same codec, size, decoder configuration and timescale as the first segment, and one frame time per frame.
+
+    Raises ValueError listing every problem, before anything is written. Returns the frame times of each segment.
+    """
+    problems = []
+    first = None
+    all_frame_times = []
+    for mp4_path in mp4_paths:
+        info = read_mp4_info(mp4_path)
+        if first is None:
+            first = info
+        if info.sample_entry != first.sample_entry:
+            problems.append(f"{mp4_path}: {info.sample_entry} differs from {first.sample_entry} of {mp4_paths[0]}")
+        if info.timescale != first.timescale:
+            problems.append(f"{mp4_path}: timescale {info.timescale} differs from {first.timescale}")
+
+        times_path = frame_times_path(mp4_path)
+        frame_times = np.loadtxt(times_path, ndmin=1) if times_path.exists() else np.array([])
+        if len(frame_times) != info.num_frames:
+            problems.append(f"{mp4_path}: {info.num_frames} frames but {len(frame_times)} frame times")
+        all_frame_times.append(frame_times)
+
+    if problems:
+        raise ValueError("Segments cannot be joined by stream copy:\n" + "\n".join(problems))
+    return all_frame_times
+
+
+def write_segments_index(index_file, mp4_paths, all_frame_times):
+    """
+    Writes the index of a joined video: the segment paths, the joined frame number at which each segment starts
+    (with the total as the last entry), and the host time of every frame.
+    """
+    first_frame = np.concatenate([[0], np.cumsum([len(t) for t in all_frame_times])]).astype(np.int64)
+    tmp_path = Path(str(index_file) + ".tmp.npz")
+    np.savez(
+        tmp_path,
+        segment_paths=np.array([str(p) for p in mp4_paths]),
+        first_frame=first_frame,
+        host_time=np.concatenate(all_frame_times).astype(np.float64),
+    )
+    os.replace(tmp_path, index_file)
+
+
+def load_segments_index(mp4_path):
+    with np.load(segments_index_path(mp4_path)) as data:
+        return {key: data[key] for key in data.files}
+
+
+def locate_frame(index, frame_idx):
+    """Returns (segment path, frame number within the segment, host time) of a frame of the joined video."""
+    segment_idx = int(np.searchsorted(index["first_frame"], frame_idx, side="right")) - 1
+    if frame_idx < 0 or segment_idx >= len(index["segment_paths"]):
+        raise IndexError(f"Frame {frame_idx} is outside the joined video ({index['first_frame'][-1]} frames)")
+    local_idx = frame_idx - int(index["first_frame"][segment_idx])
+    return Path(index["segment_paths"][segment_idx]), local_idx, float(index["host_time"][frame_idx])
+
+
+def join_segments(save_location, date, cam_name, delete_segments=False):
+    """
+    Joins the segments with ffmpeg's concat demuxer and -c copy, so the video data is copied rather than decoded and
+    re-encoded. Writes <date>/<cam>/<date>_<cam>.mp4, its frame times sidecar and its segments index.
+
+    The output is only moved into place once its frame count matches the segments. Returns the output path.
+    """
+    mp4_paths = find_segments(save_location, date, cam_name)
+    if not mp4_paths:
+        print(f"No segments found for {cam_name} on {date}")
+        return None
+    all_frame_times = check_segments(mp4_paths)
+    num_frames = sum(len(t) for t in all_frame_times)
+
+    out_dir = Path(save_location, date, cam_name)
+    out_path = Path(out_dir, f"{date}_{cam_name}.mp4")
+    tmp_path = Path(out_dir, f"{date}_{cam_name}.tmp.mp4")
+    file_list = Path(out_dir, "file_list.txt")
+    file_list.write_text("".join("file '{}'\n".format(str(p).replace("'", "'\\''")) for p in mp4_paths))
+
+    start = time.time()
+    cmd_list = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", file_list]
+    cmd_list += ["-map", "0:v", "-c", "copy", tmp_path]
+    returncode, _, _, stderr = run_ffmpeg_with_progress(cmd_list)
+    file_list.unlink()
+    if returncode != 0 or get_num_frames(tmp_path) != num_frames:
+        raise RuntimeError(
+            f"Joining {len(mp4_paths)} segments failed ({get_num_frames(tmp_path) if tmp_path.exists() else 0} of "
+            f"{num_frames} frames): {stderr[-500:]}"
+        )
+    os.replace(tmp_path, out_path)
+
+    with open(frame_times_path(out_path), "w") as f:
+        for frame_times in all_frame_times:
+            np.savetxt(f, frame_times, fmt="%.6f")
+    write_segments_index(segments_index_path(out_path), mp4_paths, all_frame_times)
+
+    catalog = TrialCatalog(save_location)
+    catalog.record_file(out_path, STATE_CLOSED, num_frames=num_frames)
+    if delete_segments:
+        for mp4_path in mp4_paths:
+            shutil.rmtree(mp4_path.parent)
+            catalog.remove(mp4_path)
+    catalog.close()
+
+    print(f"Joined {len(mp4_paths)} segments ({num_frames} frames) into {out_path} in {round(time.time() - start, 1)} s")
+    return out_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Join the overhead camera segments of a day by stream copy.")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location")
+    parser.add_argument("--date", default=time.strftime("%Y-%m-%d"))
+    parser.add_argument("--camera", default="overhead")
+    parser.add_argument("--delete-segments", action="store_true", help="Delete the segments once the join is verified")
+    args = parser.parse_args()
+
+    join_segments(args.root, args.date, args.camera, args.delete_segments)
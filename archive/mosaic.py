@@ -0,0 +1,178 @@
+# Tile the camera videos of a trial into one mosaic video, decoding each camera once and encoding the frames once, with
+# the other fps made by retiming that encode
+from pathlib import Path
+import argparse
+import queue
+import shutil
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from frame_index import find_camera_videos
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from video_writers import make_writer
+from verify import run_ffmpeg_with_progress, get_num_frames
+
+MOSAIC_ORDER = [
+    ["camTL", "camTo", "camTR"],
+    ["camBL", "camBo", "camBR"],
+]
+TILE_SIZE = (960, 960)  # (width, height) of each camera, as recorded
+SCALE = 0.5  # Tiles are downscaled by this before tiling
+OUTPUT_FPS = [20, 100]  # Each fps is a separate output of the same frames (20 fps plays back 5x slower)
+PREFETCH = 16  # Decoded frames buffered per camera
+VIDEO_DIR_NAME = "videos"
+
+
+def _even(n):
+    return n - n % 2
+
+
+class TileReader:
+    """
+    Decodes one camera on its own thread into a bounded queue of tiles (grayscale, resized and labelled).
+
+    cv2 releases the GIL while decoding and resizing, so the readers of all cameras run in parallel.
+    """
+
+    def __init__(self, mp4_path, tile_shape, label=None, prefetch=PREFETCH):
+        self.mp4_path = mp4_path
+        self.tile_shape = tile_shape  # (height, width)
+        self.label = label
+        self.frames = queue.Queue(maxsize=prefetch)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        cap = cv2.VideoCapture(str(self.mp4_path))
+        height, width = self.tile_shape
+        while not self.stop_event.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if frame.shape != (height, width):
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            if self.label:
+                cv2.putText(frame, self.label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2, cv2.LINE_AA)
+            self._put(frame)
+        cap.release()
+        self._put(None)
+
+    def _put(self, item):
+        # Blocks while the queue is full, but gives up if the mosaic is stopped early
+        while not self.stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self):
+        return self.frames.get()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def retime_copy(src_path, out_path, src_fps, fps):
+    """
+    Copies src_path to out_path at another fps by scaling its timestamps, without re-encoding.
+
+    Retiming down from the highest fps keeps every timestamp representable in the source's time base.
+    """
+    cmd_list = ["ffmpeg", "-y", "-loglevel", "error", "-itsscale", src_fps / fps, "-i", src_path]
+    cmd_list += ["-map", "0:v", "-c", "copy", out_path]
+    returncode, _, _, stderr = run_ffmpeg_with_progress(cmd_list)
+    if returncode != 0 or get_num_frames(out_path) != get_num_frames(src_path):
+        raise RuntimeError(f"Retiming {src_path} to {fps} fps failed: {stderr[-500:]}")
+
+
+def make_mosaic(
+    trial_dir,
+    out_dir=None,
+    fps_list=OUTPUT_FPS,
+    scale=SCALE,
+    order=MOSAIC_ORDER,
+    labels=False,
+    backend="ffmpeg",
+    prefetch=PREFETCH,
+):
+    """
+    Writes <trial_dir>/videos/mosaic_<fps>fps.mp4 for each fps from a single decode of each camera.
+
+    Tiles are copied into one preallocated canvas, which is encoded once at the highest fps; nothing is written to disk
+    in between. The other fps are stream copies of that encode with scaled timestamps, or separate encodes of the same
+    canvas if ffmpeg is not installed. Missing cameras are left black. Stops at the end of the shortest video, so frames stay aligned by index.
+    Returns the list of outputs, or [] if the trial has no camera videos.
+    """
+    cameras = [cam for row in order for cam in row]
+    videos = find_camera_videos(trial_dir, cameras)
+    if not videos:
+        print(f"No camera videos in {trial_dir}")
+        return []
+
+    tile_h, tile_w = _even(int(TILE_SIZE[1] * scale)), _even(int(TILE_SIZE[0] * scale))
+    num_rows, num_cols = len(order), max(len(row) for row in order)
+    canvas = np.zeros((num_rows * tile_h, num_cols * tile_w), dtype=np.uint8)
+    tile_views = {}
+    for r, row in enumerate(order):
+        for c, cam in enumerate(row):
+            tile_views[cam] = canvas[r * tile_h : (r + 1) * tile_h, c * tile_w : (c + 1) * tile_w]
+
+    out_dir = Path(out_dir) if out_dir is not None else Path(trial_dir, VIDEO_DIR_NAME)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_paths = {fps: Path(out_dir, f"mosaic_{fps}fps.mp4") for fps in fps_list}
+    encode_fps = [max(fps_list)] if shutil.which("ffmpeg") else list(out_paths)
+    writers = [make_writer(backend, out_paths[fps], fps, canvas.shape[1], canvas.shape[0]) for fps in encode_fps]
+    readers = {
+        cam: TileReader(path, (tile_h, tile_w), label=cam if labels else None, prefetch=prefetch)
+        for cam, path in videos.items()
+    }
+
+    start_time = time.perf_counter()
+    num_frames = 0
+    try:
+        while True:
+            tiles = {cam: reader.get() for cam, reader in readers.items()}
+            if any(tile is None for tile in tiles.values()):
+                break
+            for cam, tile in tiles.items():
+                tile_views[cam][:] = tile
+            for writer in writers:
+                writer.write(canvas)
+            num_frames += 1
+    finally:
+        for reader in readers.values():
+            reader.stop()
+        ok = all([writer.release() for writer in writers])
+    for fps in out_paths.keys() - encode_fps:
+        retime_copy(out_paths[encode_fps[0]], out_paths[fps], encode_fps[0], fps)
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"{Path(trial_dir).name}: {num_frames} frames of {len(videos)} cameras to {len(out_paths)} outputs ({len(writers)} encoded) in "
+        f"{round(elapsed, 1)} s ({round(num_frames / max(elapsed, 1e-9), 1)} frames/s){'' if ok else ', WRITER ERROR'}"
+    )
+    return list(out_paths.values())
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Make mosaic videos of the camera mp4s of one or more trials.")
+    parser.add_argument("trial_dirs", nargs="+", help="Trial directories, e.g. <date>/cameras/<batch>")
+    parser.add_argument("--fps", type=int, nargs="+", default=OUTPUT_FPS, help="One output per fps")
+    parser.add_argument("--scale", type=float, default=SCALE, help="Tile scale")
+    parser.add_argument("--labels", action="store_true", help="Write the camera name on each tile")
+    parser.add_argument("--backend", default="ffmpeg", choices=["ffmpeg", "opencv"], help="Video writer")
+    parser.add_argument("--out-dir", help="Default <trial_dir>/videos")
+    args = parser.parse_args()
+
+    for trial_dir in args.trial_dirs:
+        make_mosaic(trial_dir, args.out_dir, args.fps, args.scale, labels=args.labels, backend=args.backend)
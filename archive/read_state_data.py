@@ -1,163 +1,264 @@
 try:
     import json
+    import gzip
     from pathlib import Path
     import pandas as pd
     from scipy.spatial.transform import Rotation as R
     import numpy as np
     import matplotlib.pyplot as plt
     import sys
-    from itertools import groupby
+    from state_analysis import detect_touching, smoothed_dx_ddx, find_true_ranges, label_extents
+    from state_analysis import scale_to_limits, Q_MIN, Q_MAX, DQ_MIN, DQ_MAX
+    from decimated_plot import DecimatedFigure
 except ModuleNotFoundError as e:
     raise Exception("You probably need to run: conda activate robot_venv")
 
+# orjson parses each line several times faster than json, but is optional
+try:
+    import orjson
 
-def find_missing_packet_times(packet_timestamps, THRESHOLD):
-    """Returns the time of missing packets. Many missing packets in a row (>THRESHOLD) (e.g. due to a pause in the robot motion) are not counted since these are not "lost" but are just the ones not being recorded."""
+    loads = orjson.loads
+except ModuleNotFoundError:
+    loads = json.loads
+
+BLOCK_SIZE = 8192  # Number of lines parsed into dicts at a time; only one block of dicts is held in memory
+STRING_LIST_COLUMNS = ["current_errors"]  # List columns that hold strings; stored joined by "/"
+
+
+def find_missing_packet_times_dense(packet_timestamps, THRESHOLD):
+    """Same as find_missing_packet_times, but via a boolean array with one element per millisecond of the log."""
     timestamps_bool = np.zeros(packet_timestamps[-1] + 1, dtype="bool")
     timestamps_bool[packet_timestamps] = 1
-    neighbor_counts = np.zeros(packet_timestamps[-1] + 1, dtype="int")
 
-    idx = 0
-    for _, group in groupby(timestamps_bool):
-        count = len(list(group))
-        neighbor_counts[idx : idx + count] = count
-        idx += count
+    # Run lengths from the positions where the value changes; every element gets the length of its run
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(timestamps_bool)) + 1))
+    run_lengths = np.diff(np.append(run_starts, len(timestamps_bool)))
+    neighbor_counts = np.repeat(run_lengths, run_lengths)
 
-    missing_packets = np.zeros(packet_timestamps[-1] + 1, dtype="bool")
-    missing_packets[neighbor_counts < THRESHOLD] = 1
-    missing_packets[timestamps_bool] = 0
+    missing_packets = (neighbor_counts < THRESHOLD) & ~timestamps_bool
+    return np.flatnonzero(missing_packets)
 
-    missing_packet_times = np.where(missing_packets)[0]
-    assert set(packet_timestamps) - set(missing_packet_times) == set(packet_timestamps)
+
+def find_missing_packet_times(packet_timestamps, THRESHOLD):
+    """Returns the time of missing packets. Many missing packets in a row (>THRESHOLD) (e.g. due to a pause in the robot motion) are not counted since these are not "lost" but are just the ones not being recorded.
+
+    Works on the gaps between the sorted timestamps, so memory is proportional to the number of packets, not the
+    length of the log in milliseconds.
+    """
+    packet_timestamps = np.asarray(packet_timestamps, dtype=np.int64)
+
+    # Each gap between consecutive packets is a run of missing times; the run before the first packet starts at 0
+    gap_starts = np.concatenate(([0], packet_timestamps[:-1] + 1))
+    gap_lengths = packet_timestamps - gap_starts  # Negative for repeated timestamps, which are not gaps
+    keep = (gap_lengths > 0) & (gap_lengths < THRESHOLD)
+    gap_starts = gap_starts[keep]
+    gap_lengths = gap_lengths[keep]
+
+    # Expand each kept gap into its times: start + 0, 1, ..., length - 1
+    offsets = np.cumsum(gap_lengths) - gap_lengths
+    missing_packet_times = np.repeat(gap_starts - offsets, gap_lengths) + np.arange(gap_lengths.sum())
     return missing_packet_times
 
 
 def parse_state(state_string):
     # JSON 10x faster than eval to convert to dict
-    state_dict = json.loads(state_string)
+    state_dict = loads(state_string)
     return state_dict
 
 
-def read_data_from_txt_file(txt_path):
-    with open(txt_path) as f:
-        text = f.read()
-        text_decompressed = text
-
-    # # Make directory if needed
-    # if zlb_path.parent.exists() is False:
-    #     zlb_path.parent.mkdir(parents=True)
-
-    # # Compress with zlib
-    # text_compressed = zlib.compress(text.encode())
-    # with open(zlb_path, "wb") as f:
-    #     f.write(text_compressed)
-
-    # # Decompress with zlib
-    # with open(zlb_path, "rb") as f:
-    #     text_decompressed = zlib.decompress(f.read()).decode()
-
-    # Split based on "\n" character
-    lines = text_decompressed.split("\n")
-    if lines[-1] == "":
-        lines = lines[:-1]  # Remove last line, which is empty
-
-    state_dict_list = []
-    for l in lines:
-        state_dict_list.append(parse_state(l))
-
-    df = pd.DataFrame.from_dict(state_dict_list)
-
-    # Represent dropped timesteps as empty rows
-
-    # Adjust current_errors column so that DataFrame converted correctly
-    for i, v in enumerate(df["current_errors"]):
-        if len(v) == 0:
-            val = ""
+def open_state_log(txt_path):
+    """Opens a state log for binary line iteration, whether plain (.txt) or compressed by compress_all_txt (.txt.gz)."""
+    txt_path = Path(txt_path)
+    if txt_path.suffix == ".gz":
+        return gzip.open(txt_path, "rb")
+    return open(txt_path, "rb", buffering=16 * 1024 * 1024)
+
+
+def count_lines(txt_path):
+    """Counts lines of an uncompressed file by scanning bytes, so that arrays can be allocated once."""
+    num_lines = 0
+    last_byte = b"\n"
+    with open(txt_path, "rb") as f:
+        while True:
+            chunk = f.read(16 * 1024 * 1024)
+            if not chunk:
+                break
+            num_lines += chunk.count(b"\n")
+            last_byte = chunk[-1:]
+    if last_byte != b"\n":
+        num_lines += 1  # Last line has no newline
+    return num_lines
+
+
+def infer_schema(state_dict, fields=None):
+    """
+    Maps each field of the first record to (kind, width).
+
+    kind is "bool", "num" (scalar), "vec" (fixed-length numeric list stored as a 2-D array), "strlist" (list of
+    strings stored joined by "/") or "object" (anything else, e.g. the stage name).
+    """
+    schema = {}
+    for k, v in state_dict.items():
+        if fields is not None and k not in fields:
+            continue
+        if isinstance(v, bool):
+            schema[k] = ("bool", 1)
+        elif isinstance(v, (int, float)):
+            schema[k] = ("num", 1)
+        elif isinstance(v, list) and (k in STRING_LIST_COLUMNS or (len(v) > 0 and isinstance(v[0], str))):
+            schema[k] = ("strlist", 1)
+        elif isinstance(v, list):
+            schema[k] = ("vec", len(v))
         else:
-            val = "/".join(v)
-        df.loc[i, "current_errors"] = val
-
+            schema[k] = ("object", 1)
+    return schema
+
+
+def _block_to_array(kind, values):
+    if kind == "strlist":
+        return np.array(["/".join(v) for v in values], dtype=object)
+    elif kind == "object":
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+    elif kind == "bool":
+        return np.asarray(values, dtype=bool)
+    return np.asarray(values)
+
+
+def _append_block(lines, schema, columns, num_rows):
+    """Parses a block of lines and copies each field into its preallocated column, growing columns if needed."""
+    records = [loads(l) for l in lines]
+    for k, (kind, width) in schema.items():
+        values = _block_to_array(kind, [r[k] for r in records])
+        end = num_rows + len(values)
+
+        column = columns.get(k)
+        if column is None:
+            shape = (max(end, BLOCK_SIZE),) if kind != "vec" else (max(end, BLOCK_SIZE), width)
+            column = np.empty(shape, dtype=values.dtype)
+        elif end > len(column):
+            grown = np.empty((max(end, 2 * len(column)),) + column.shape[1:], dtype=column.dtype)
+            grown[:num_rows] = column[:num_rows]
+            column = grown
+
+        # Integers that later turn out to be floats (e.g. 0 then 0.95) are promoted, as pandas would
+        if column.dtype != values.dtype and values.dtype.kind == "f" and column.dtype.kind in "iub":
+            column = column.astype(np.float64)
+
+        column[num_rows:end] = values
+        columns[k] = column
+    return num_rows + len(lines)
+
+
+def parse_state_lines(lines, fields=None, expected_rows=None):
+    """
+    Parses an iterable of JSON lines (bytes or str) into one NumPy array per field, BLOCK_SIZE lines at a time.
+
+    Blank lines are skipped. If expected_rows is given, columns are allocated at that length up front.
+    """
+    columns = {}
+    schema = None
+    num_rows = 0
+
+    block = []
+    for line in lines:
+        if not line.strip():
+            continue
+        if schema is None:
+            first = loads(line)
+            schema = infer_schema(first, fields)
+            if expected_rows is not None:
+                for k, (kind, width) in schema.items():
+                    values = _block_to_array(kind, [first[k]])
+                    shape = (expected_rows,) if kind != "vec" else (expected_rows, width)
+                    columns[k] = np.empty(shape, dtype=values.dtype)
+        block.append(line)
+        if len(block) == BLOCK_SIZE:
+            num_rows = _append_block(block, schema, columns, num_rows)
+            block = []
+    if block:
+        num_rows = _append_block(block, schema, columns, num_rows)
+
+    # Trim unused capacity
+    for k, column in columns.items():
+        if len(column) != num_rows:
+            columns[k] = column[:num_rows].copy()
+    return columns
+
+
+def read_state_columns(txt_path, fields=None):
+    """
+    Streams a state log into one NumPy array per field (2-D for fixed-length vectors such as q_d or O_T_EE).
+
+    The schema is inferred from the first record. Only BLOCK_SIZE parsed dicts exist at any time, so peak memory is
+    roughly the size of the arrays themselves. If fields is given, only those fields are kept.
+    """
+    txt_path = Path(txt_path)
+
+    # For uncompressed logs, allocate full-length columns up front so they never need to be grown
+    expected_rows = count_lines(txt_path) if txt_path.suffix != ".gz" else None
+
+    with open_state_log(txt_path) as f:
+        return parse_state_lines(f, fields, expected_rows)
+
+
+def columns_to_df2(columns):
+    """Builds the MultiIndex DataFrame layout used for plotting: (field, "0".."n-1") for vectors, (field, "0") otherwise."""
     frames = []
-    for k in df.columns:
-        col_type = type(df[k].iloc[0])
-        if col_type == list and k != "current_errors":
-            num_sub_cols = len(df[k].iloc[0])
+    for k, column in columns.items():
+        if column.ndim == 2:
+            sub_cols = [str(i) for i in range(column.shape[1])]
         else:
-            num_sub_cols = 1
-        multiindex = pd.MultiIndex.from_product([[k], [str(i) for i in range(num_sub_cols)]])
-
-        frames.append(
-            pd.DataFrame(
-                df[k].to_list(),
-                columns=multiindex,
-            )
-        )
+            column = column.reshape(-1, 1)
+            sub_cols = ["0"]
+        multiindex = pd.MultiIndex.from_product([[k], sub_cols])
+        frames.append(pd.DataFrame(column, columns=multiindex, copy=False))
     df2 = pd.concat(frames, axis=1)
+    return df2
 
-    timestamps = df2["time"] - df2["time"].iloc[0]  # Packet losses are the missing times
-    timestamps = timestamps.to_numpy().ravel()
-
-    packet_loss_times = find_missing_packet_times(timestamps, 20)
-
-    return df2, timestamps, packet_loss_times, state_dict_list
-
-
-def find_true_ranges(bool_arr):
-    """Finds the ranges of True values in a boolean array."""
 
-    # Ensure the array is a numpy array
-    bool_arr = np.asarray(bool_arr)
+def read_data_from_txt_file(txt_path, return_state_dicts=False):
+    """
+    Loads a state log (.txt or .txt.gz) into the df2 layout.
 
-    # Append False at the start and end to ensure all ranges are closed
-    padded_arr = np.pad(bool_arr, (1, 1), mode="constant", constant_values=False)
+    The list of per-line dicts is only built if return_state_dicts is True, since it is by far the largest object.
+    """
+    columns = read_state_columns(txt_path)
+    df2 = columns_to_df2(columns)
 
-    # Find the differences; true starts have 1, ends have -1
-    diff = np.diff(padded_arr.astype(int))
+    timestamps = columns["time"].ravel() - columns["time"].ravel()[0]  # Packet losses are the missing times
 
-    # Start indices are where diff is 1, end indices are where diff is -1 shifted by 1
-    start_indices = np.where(diff == 1)[0]
-    end_indices = np.where(diff == -1)[0] - 1
+    packet_loss_times = find_missing_packet_times(timestamps, 20)
 
-    # Form the ranges
-    true_ranges = list(zip(start_indices, end_indices))
+    state_dict_list = None
+    if return_state_dicts:
+        with open_state_log(txt_path) as f:
+            state_dict_list = [parse_state(l) for l in f if l.strip()]
 
-    return true_ranges
+    return df2, timestamps, packet_loss_times, state_dict_list
 
 
 def plot_state_data(df2, timestamps, packet_loss_times):
-    # Calculate minimum index where stage == "slowdown"
-    x_range_dict = {}
-    for stage in np.unique(df2["stage"]):
-        minx = np.where(df2["stage"] == stage)[0][0]
-        maxx = np.where(df2["stage"] == stage)[0][-1]
-        x_range_dict[stage] = (minx, maxx)
+    # Calculate the first and last index of each stage
+    x_range_dict = label_extents(df2["stage", "0"].to_numpy())
 
     # Calculate ranges of halt_motion
-    halt_motion_ranges = []
-    start_index = None
-    for i, row in df2.iterrows():
-        if row["halt_motion"][0] == True:
-            if start_index is None:
-                start_index = i
-        else:
-            if start_index is not None:
-                halt_motion_ranges.append((start_index, i - 1))
-                start_index = None
-    if start_index is not None:
-        halt_motion_ranges.append((start_index, i))
+    halt_motion_ranges = find_true_ranges(df2["halt_motion", "0"].to_numpy())
 
     # Create plots
     fig, axs = plt.subplots(4, 5)
     plt.subplots_adjust(left=0.05, right=0.995, top=0.975, bottom=0.05)
     axs = axs.ravel()
 
+    # Lines show at most ~2 points per pixel of the visible range, and are re-decimated on zoom
+    decimated = DecimatedFigure(fig)
+
     ax = axs[0]
     ax.set_title("q_d scaled")
-    q_max = np.array([2.8973, 1.7628, 2.8973, -0.0698, 2.8973, 3.7525, 2.8973])
-    q_min = np.array([-2.8973, -1.7628, -2.8973, -3.0718, -2.8973, -0.0175, -2.8973])
     q_d = df2["q_d"]
-    q_scaled = (q_d - q_min) / (q_max - q_min) * 2 - 1
-    ax.plot(timestamps, q_scaled, label=["j" + str(i) for i in range(7)])
+    q_scaled = scale_to_limits(q_d, Q_MIN, Q_MAX)
+    decimated.plot(ax, timestamps, q_scaled, label=["j" + str(i) for i in range(7)])
     ax.set_ylabel("Scaled joint position")
     ax.set_ylim(-1.05, 1.05)
     ax.axhline(y=1.0, color="r", linestyle="--")
@@ -166,11 +267,9 @@ def plot_state_data(df2, timestamps, packet_loss_times):
 
     ax = axs[1]
     ax.set_title("dq_d scaled")
-    dq_max = np.array([2.1750, 2.1750, 2.1750, 2.1750, 2.6100, 2.6100, 2.6100])
-    dq_min = -dq_max
     dq_d = df2["dq_d"]
-    dq_scaled = (dq_d - dq_min) / (dq_max - dq_min) * 2 - 1
-    ax.plot(timestamps, dq_scaled, label=["joint_" + str(i) for i in range(7)])
+    dq_scaled = scale_to_limits(dq_d, DQ_MIN, DQ_MAX)
+    decimated.plot(ax, timestamps, dq_scaled, label=["joint_" + str(i) for i in range(7)])
     ax.set_ylabel("Scaled joint velocity")
     ax.set_ylim(-1.05, 1.05)
     ax.axhline(y=1.0, color="r", linestyle="--")
@@ -185,13 +284,13 @@ def plot_state_data(df2, timestamps, packet_loss_times):
         ddq_d = np.diff(dq_d, axis=0) / np.diff(timestamps).reshape(-1, 1) / 0.001
         ddq_d = np.vstack((ddq_d[0], ddq_d))
         ddq_scaled = (ddq_d - ddq_min) / (ddq_max - ddq_min) * 2 - 1
-        ax.plot(timestamps, ddq_scaled, label=["joint_" + str(i) for i in range(7)])
+        decimated.plot(ax, timestamps, ddq_scaled, label=["joint_" + str(i) for i in range(7)])
         ax.set_title("ddq_d estimated")
 
     else:
         ddq_d = df2["ddq_d"]
         ddq_scaled = (ddq_d - ddq_min) / (ddq_max - ddq_min) * 2 - 1
-        ax.plot(timestamps, ddq_scaled, label=["joint_" + str(i) for i in range(7)])
+        decimated.plot(ax, timestamps, ddq_scaled, label=["joint_" + str(i) for i in range(7)])
         ax.set_title("ddq_d scaled")
     ax.plot(packet_loss_times, np.zeros(len(packet_loss_times)), ".r")
     ax.set_ylabel("Scaled joint acceleration")
@@ -205,7 +304,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     dddq_min = -dddq_max
     dddq = np.diff(np.vstack((np.zeros(7), ddq_d)), 1, axis=0) / 0.001
     dddq_scaled = (dddq - dddq_min) / (dddq_max - dddq_min) * 2 - 1
-    ax.plot(timestamps, dddq_scaled, label=["joint_" + str(i) for i in range(7)])
+    decimated.plot(ax, timestamps, dddq_scaled, label=["joint_" + str(i) for i in range(7)])
     ax.set_ylabel("Scaled joint jerk")
     ax.set_ylim(-1.05, 1.05)
     ax.axhline(y=1.0, color="r", linestyle="--")
@@ -217,7 +316,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     tau_min = -tau_max
     tau_J = df2["tau_J"]
     tau_J_scaled = (tau_J - tau_min) / (tau_max - tau_min) * 2 - 1
-    ax.plot(timestamps, tau_J_scaled, label=["joint_" + str(i) for i in range(7)])
+    decimated.plot(ax, timestamps, tau_J_scaled, label=["joint_" + str(i) for i in range(7)])
     ax.set_ylabel("Scaled joint torque")
     ax.set_ylim(-1.05, 1.05)
     ax.axhline(y=1.0, color="r", linestyle="--")
@@ -237,7 +336,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     dtau_min = -dtau_max
     dtau_J = df2["dtau_J"]
     dtau_J_scaled = (dtau_J - dtau_min) / (dtau_max - dtau_min) * 2 - 1
-    ax.plot(timestamps, dtau_J_scaled, label=["joint_" + str(i) for i in range(7)])
+    decimated.plot(ax, timestamps, dtau_J_scaled, label=["joint_" + str(i) for i in range(7)])
     ax.set_ylabel("Scaled joint torque derivative")
     ax.set_ylim(-1.05, 1.05)
     ax.axhline(y=1.0, color="r", linestyle="--")
@@ -251,7 +350,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
         data = df2["O_T_EE", str(col)]
         data_changed = data - data[0]
         miny = min(miny, data_changed.min())
-        ax.plot(timestamps, data_changed, label=letter)
+        decimated.plot(ax, timestamps, data_changed, label=letter)
 
     # Plot stages with a new color for each stage
     colors = [
@@ -288,14 +387,14 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     ax = axs[7]
     ax.set_title("delbow_c")
     delbow_c = df2["delbow_c", "0"]
-    ax.plot(timestamps, delbow_c, label="delbow_c")
+    decimated.plot(ax, timestamps, delbow_c, label="delbow_c")
     ax.set_ylabel("d Elbow angle")
     ax.legend()
 
     ax = axs[8]
     ax.set_title("ddelbow_c")
     ddelbow_c = df2["ddelbow_c", "0"]
-    ax.plot(timestamps, ddelbow_c, label="ddelbow_c")
+    decimated.plot(ax, timestamps, ddelbow_c, label="ddelbow_c")
     ax.set_ylabel("dd Elbow angle")
     ax.legend()
 
@@ -392,7 +491,8 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     ax = axs[9]
     ax.set_title("tau_ext_hat")
     tau_ext_hat = df2["tau_ext_hat_filtered"]
-    ax.plot(
+    decimated.plot(
+        ax,
         timestamps,
         tau_ext_hat,
         label=["joint_" + str(i) for i in range(7)],
@@ -417,63 +517,15 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     col_dict = {"x": "0", "y": "1", "z": "2"}
     for label, col in col_dict.items():
         data = df2["O_F_ext_hat_K_est", col]
-        ax.plot(timestamps, data, "*-", label=label + "e")
+        decimated.plot(ax, timestamps, data, "*-", label=label + "e")
         data = df2["O_F_ext_hat_K", col]
-        ax.plot(timestamps, data, label=label)
+        decimated.plot(ax, timestamps, data, label=label)
     ax.set_ylabel("EE force")
     ax.legend()
 
     # Touch detection algorithm using O_F_ext_hat_K
-    K_THRES_BIG = 5.0
-    K_THRES_SMALL = -4.0
-    DX_THRES = 0
-    DX_PERSIST_LENGTH = 200
-    WINDOW = 100
-
-    x_list = np.zeros(WINDOW)
-    dx_list = []
-    touching = np.zeros(len(timestamps), dtype="bool")
-    calls_since_dx_true = 0
-    K_x_arr = df2["O_F_ext_hat_K"]["0"].to_numpy()
-
-    for i in range(len(timestamps)):
-
-        # Store the current position, smooth it with a window of 100
-        x = df2["O_T_EE"]["12"].to_numpy()[i]
-        if i == 0:
-            x_list[:] = x
-        else:
-            x_list[:-1] = x_list[1:]
-            x_list[-1] = x
-
-        # # Smooth and calculate derivative
-        # x_smooth = np.mean(x_list)
-        # dx = (x - x_smooth) / 0.001
-        # dx_list.append(dx)
-
-        # Calculate derivative
-        dx = (x_list[-1] - x_list[-2]) / (timestamps[i] - timestamps[i - 1]) / 0.001
-        dx_list.append(dx)
-
-        # Get current force
-        K_x = K_x_arr[i]
-
-        # Test if the force is above the threshold
-        if abs(K_x) > K_THRES_BIG:
-            touching[i] = True
-            calls_since_dx_true = DX_PERSIST_LENGTH
-        elif K_x < K_THRES_SMALL and abs(K_x) < K_THRES_BIG and dx > DX_THRES:
-            touching[i] = True
-            calls_since_dx_true = DX_PERSIST_LENGTH
-        elif calls_since_dx_true > 0:
-            touching[i] = True
-        else:
-            touching[i] = False
-
-        calls_since_dx_true -= 1
-
-    touching[:500] = False
-    touching[-200:] = False
+    x = df2["O_T_EE", "12"].to_numpy()
+    touching = detect_touching(df2["O_F_ext_hat_K", "0"].to_numpy(), x, timestamps)
 
     # Plot touching in green
     touching_ranges = find_true_ranges(touching)
@@ -496,49 +548,8 @@ def plot_state_data(df2, timestamps, packet_loss_times):
 
     ax = axs[11]
     ax.set_title("ddx")
-    dx_list_smoothed = np.zeros(len(dx_list))
-    WINDOW = 50
-
-    preceding_x = np.zeros(WINDOW)
-    preceding_dx = np.zeros(WINDOW)
-    preceding_dx_smooth = np.zeros(WINDOW)
-    preceding_ddx = np.zeros(WINDOW)
-
-    x = df2["O_T_EE"]["12"].to_numpy()
-    dx_from_smoothing = np.zeros(len(x))
-    ddx_from_smoothing = np.zeros(len(x))
-    for i in range(len(dx_list)):
-
-        if i == 0:
-            preceding_x[:] = x[i]
-            preceding_dx[:] = 0
-            preceding_dx_smooth[:] = 0
-            preceding_ddx[:] = 0
-        else:
-            preceding_x[:-1] = preceding_x[1:]
-            preceding_x[-1] = x[i]
-
-            preceding_dx[:-1] = preceding_dx[1:]
-            dx_now = (
-                (preceding_x[-1] - preceding_x[-2])
-                / (timestamps[i] - timestamps[i - 1])
-                / (timestamps[i] - timestamps[i - 1])
-                / 0.001
-            )
-            preceding_dx[-1] = dx_now
-            dx_smooth = np.mean(preceding_dx)
-
-            preceding_dx_smooth[:-1] = preceding_dx_smooth[1:]
-            preceding_dx_smooth[-1] = dx_smooth
-
-            preceding_ddx[:-1] = preceding_ddx[1:]
-            ddx_now = (preceding_dx_smooth[-1] - preceding_dx_smooth[-2]) / (timestamps[i] - timestamps[i - 1]) / 0.001
-            preceding_ddx[-1] = ddx_now
-            ddx_smooth = np.mean(preceding_ddx)
-
-            dx_from_smoothing[i] = dx_smooth
-            ddx_from_smoothing[i] = ddx_smooth
-    ax.plot(timestamps, ddx_from_smoothing, label="ddx")
+    dx_from_smoothing, ddx_from_smoothing = smoothed_dx_ddx(x, timestamps, window=50)
+    decimated.plot(ax, timestamps, ddx_from_smoothing, label="ddx")
     # ax.plot(timestamps, dx, label="dx")
 
     # for i in range(len(dx_list)):
@@ -563,7 +574,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     ax.axhline(y=95, color="r", linestyle="--")
     ccsr_nan = ccsr.to_numpy(dtype="float") * 100  # Convert to %
     ccsr_nan[ccsr_nan == 0] = np.nan
-    ax.plot(timestamps, ccsr_nan)
+    decimated.plot(ax, timestamps, ccsr_nan)
     ax.text(
         round(timestamps[-1] / 2),
         70,
@@ -577,7 +588,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     # Plot difference between O_T_EE_c and O_T_EE
     ax = axs[13]
     ax.set_title("dx ")
-    ax.plot(timestamps, dx_from_smoothing, label="dx")
+    decimated.plot(ax, timestamps, dx_from_smoothing, label="dx")
     # ax.plot(timestamps, dx_list_smoothed, label="dx_s")
     ax.hlines(0, 0, timestamps[-1], color="r", linestyle="--")
     for i, (minx, maxx) in enumerate(halt_motion_ranges):
@@ -599,7 +610,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
         O_T_EE = df2["O_T_EE", v].to_numpy()
         O_T_EE_c = df2["O_T_EE_c", v].to_numpy()
         diff = O_T_EE_c - O_T_EE
-        ax.plot(timestamps, diff, label=k)
+        decimated.plot(ax, timestamps, diff, label=k)
     ax.legend()
 
     # # Plot tau_ext_hat with mean subtracted
@@ -657,7 +668,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
         diff = df2["O_T_EE_c", str(col)] - df2["O_T_EE_c", str(col)][0]
         maxdiff = max(maxdiff, diff.max())
         mindiff = min(mindiff, diff.min())
-        ax.plot(timestamps, diff, label=letter)
+        decimated.plot(ax, timestamps, diff, label=letter)
     ax.set_ylabel("EE Position")
     for i, (minx, maxx) in enumerate(halt_motion_ranges):
         ax.axvspan(
@@ -691,9 +702,9 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     #     angZ = np.arctan2(-C[0, 1], C[0, 0])
     #     euler_angles[i] = np.array([angX, angY, angZ])
     #     # euler_angles[i] = r.as_euler("zyx", degrees=False)  # Change 'zyx' to your desired sequence
-    ax.plot(timestamps, euler_angles[:, 0], label="R")
-    ax.plot(timestamps, euler_angles[:, 1], label="P")
-    ax.plot(timestamps, euler_angles[:, 2], label="Y")
+    decimated.plot(ax, timestamps, euler_angles[:, 0], label="R")
+    decimated.plot(ax, timestamps, euler_angles[:, 1], label="P")
+    decimated.plot(ax, timestamps, euler_angles[:, 2], label="Y")
     ax.plot(packet_loss_times, np.zeros(len(packet_loss_times)), ".r")
     ax.legend()
     ax.set_ylabel("rad")
@@ -719,7 +730,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     O_dP_EE_c_min = -O_dP_EE_c_max
     for label, col in col_dict.items():
         data = df2["O_dP_EE_c"][col]
-        ax.plot(timestamps, data, label=label)
+        decimated.plot(ax, timestamps, data, label=label)
     ax.set_ylabel("EE Velocity (m/s)")
     ax.set_ylim(O_dP_EE_c_min + O_dP_EE_c_min * 0.05, O_dP_EE_c_max + O_dP_EE_c_max * 0.05)
     ax.axhline(y=O_dP_EE_c_max, color="r", linestyle="--")
@@ -735,7 +746,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     col_dict = {"x": "0", "y": "1", "z": "2", "R": "3", "P": "4", "Y": "5"}
     for label, col in col_dict.items():
         data = df2["O_ddP_EE_c"][col]
-        ax.plot(timestamps, data, label=label)
+        decimated.plot(ax, timestamps, data, label=label)
     ax.plot(packet_loss_times, np.zeros(len(packet_loss_times)), ".r")
     ax.set_ylabel("EE Acceleration (m/s^2)")
     ax.set_ylim(O_ddP_EE_c_min + O_ddP_EE_c_min * 0.05, O_ddP_EE_c_max + O_ddP_EE_c_max * 0.05)
@@ -750,7 +761,7 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     for label, col in col_dict.items():
         data = df2["O_ddP_EE_c"][col]
         diff = np.diff(np.hstack((np.zeros(1), data.to_numpy())), 1, axis=0) / 0.001
-        ax.plot(timestamps, diff, label=label)
+        decimated.plot(ax, timestamps, diff, label=label)
     ax.set_ylabel("EE Jerk (m/s^3)")
     ax.set_ylim(O_dddP_EE_min + O_dddP_EE_min * 0.05, O_dddP_EE_max + O_dddP_EE_max * 0.05)
     ax.axhline(y=O_dddP_EE_max, color="r", linestyle="--")
@@ -826,18 +837,8 @@ def plot_state_data(df2, timestamps, packet_loss_times):
     #         df5.loc[t - 5 :, [("O_T_EE_c", "12"), ("O_dP_EE_c", "0"), ("O_ddP_EE_c", "0")]]
     #     )
 
-    # Initialize vertical lines (invisible at start)
-    vlines = [ax.axvline(x=0, color="red", lw=1, visible=False) for ax in axs]
-
-    def on_move(event):
-        if event.inaxes:
-            for line in vlines:
-                line.set_xdata(event.xdata)
-                line.set_visible(True)
-            fig.canvas.draw_idle()
-
-    # Connect the event handler
-    fig.canvas.mpl_connect("motion_notify_event", on_move)
+    # Vertical line that follows the mouse on every axis; only the lines are redrawn when it moves
+    decimated.add_crosshair(axs)
 
     # plt.show()
 
@@ -894,8 +895,11 @@ if __name__ == "__main__":
 
     assert txt_path.exists()
 
-    assert txt_path.suffix == ".txt"
-    df2, timestamps, packet_loss_times, _ = read_data_from_txt_file(txt_path)
+    assert txt_path.name.endswith((".txt", ".txt.gz"))
+    # Parsed columns are cached, so only the first plot of a log parses the JSON
+    from state_cache import load_state_data
+
+    df2, timestamps, packet_loss_times, _ = load_state_data(txt_path)
 
     # # Print last 10 values of O_T_EE_c[14] at full resolution
     # pd.options.display.precision = 16
@@ -908,6 +912,3 @@ if __name__ == "__main__":
 
     # Plot data
     plot_state_data(df2, timestamps, packet_loss_times)
-
-    df2.to_hdf(txt_path.with_suffix(".h5"), key="df2",     complevel=9        # Set compression level to maximum (1-9)
-)
@@ -0,0 +1,122 @@
+# Vectorized contact detection and smoothed derivatives of robot state, without any plotting dependencies
+import numpy as np
+
+# Touch detection using O_F_ext_hat_K
+K_THRES_BIG = 5.0  # |force| above this is always contact
+K_THRES_SMALL = -4.0  # Force below this is contact if the EE is also moving in +x
+DX_THRES = 0
+DX_PERSIST_LENGTH = 200  # Samples that contact is held for after the last trigger
+IGNORE_START = 500  # Samples at the start and end of the log that are never contact
+IGNORE_END = 200
+
+SMOOTHING_WINDOW = 50
+
+# Joint position and velocity limits
+Q_MAX = np.array([2.8973, 1.7628, 2.8973, -0.0698, 2.8973, 3.7525, 2.8973])
+Q_MIN = np.array([-2.8973, -1.7628, -2.8973, -3.0718, -2.8973, -0.0175, -2.8973])
+DQ_MAX = np.array([2.1750, 2.1750, 2.1750, 2.1750, 2.6100, 2.6100, 2.6100])
+DQ_MIN = -DQ_MAX
+
+
+def scale_to_limits(values, min_values, max_values):
+    """Scales each column so that its limits are at -1 and 1."""
+    return (values - min_values) / (max_values - min_values) * 2 - 1
+
+
+def position_derivative(x, timestamps):
+    """Sample-to-sample derivative (x[i] - x[i-1]) / dt / 0.001, with 0 for the first sample."""
+    x = np.asarray(x, dtype=float)
+    dx = np.zeros(len(x))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx[1:] = np.diff(x) / np.diff(timestamps) / 0.001
+    return dx
+
+
+def trailing_mean(a, window):
+    """Mean of the last `window` samples up to and including each sample, treating samples before the start as 0."""
+    a = np.asarray(a, dtype=float)
+    return np.convolve(a, np.ones(window))[: len(a)] / window
+
+
+def hold_true(trigger, hold_length):
+    """
+    True wherever trigger was True within the last hold_length samples (including the current one).
+
+    Equivalent to a counter that is reset to hold_length on every trigger and decremented once per sample.
+    """
+    trigger = np.asarray(trigger, dtype=bool)
+    idx = np.arange(len(trigger))
+    last_trigger = np.maximum.accumulate(np.where(trigger, idx, -hold_length))
+    return idx - last_trigger < hold_length
+
+
+def detect_touching(K_x, x, timestamps):
+    """
+    Returns a boolean array that is True while the end effector is in contact.
+
+    Contact starts when |K_x| is large, or when K_x is moderately negative while x is increasing, and is held for
+    DX_PERSIST_LENGTH samples after the last such sample.
+    """
+    K_x = np.asarray(K_x, dtype=float)
+    dx = position_derivative(x, timestamps)
+    trigger = (np.abs(K_x) > K_THRES_BIG) | ((K_x < K_THRES_SMALL) & (np.abs(K_x) < K_THRES_BIG) & (dx > DX_THRES))
+    touching = hold_true(trigger, DX_PERSIST_LENGTH)
+    touching[:IGNORE_START] = False
+    touching[-IGNORE_END:] = False
+    return touching
+
+
+def smoothed_dx_ddx(x, timestamps, window=SMOOTHING_WINDOW):
+    """
+    Returns (dx, ddx): trailing-mean smoothed first and second derivatives of x, both 0 at the first sample.
+
+    The first derivative divides by dt twice, as the online estimator it reproduces does.
+    """
+    x = np.asarray(x, dtype=float)
+    dt = np.diff(timestamps)
+
+    dx_now = np.zeros(len(x))
+    ddx_now = np.zeros(len(x))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx_now[1:] = np.diff(x) / dt / dt / 0.001
+        dx_smooth = trailing_mean(dx_now, window)
+        ddx_now[1:] = np.diff(dx_smooth) / dt / 0.001
+    ddx_smooth = trailing_mean(ddx_now, window)
+    return dx_smooth, ddx_smooth
+
+
+def true_ranges(bool_arr):
+    """Returns (starts, ends) of the runs of True values, with inclusive ends."""
+    bool_arr = np.asarray(bool_arr, dtype=bool)
+
+    # Pad with False so every run has a rising and a falling edge
+    edges = np.diff(np.concatenate(([False], bool_arr, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return starts, ends
+
+
+def find_true_ranges(bool_arr):
+    """Finds the ranges of True values in a boolean array, as a list of inclusive (start, end) pairs."""
+    return list(zip(*true_ranges(bool_arr)))
+
+
+def label_runs(labels):
+    """Returns (starts, ends, run_labels) for each run of equal consecutive labels, with inclusive ends."""
+    labels = np.asarray(labels).ravel()
+    if len(labels) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), labels[:0]
+    starts = np.concatenate(([0], np.flatnonzero(labels[1:] != labels[:-1]) + 1))
+    ends = np.append(starts[1:] - 1, len(labels) - 1)
+    return starts, ends, labels[starts]
+
+
+def label_extents(labels):
+    """Returns {label: (first index, last index)} in sorted label order, spanning all runs of each label."""
+    starts, ends, run_labels = label_runs(labels)
+    unique_labels, inverse = np.unique(run_labels, return_inverse=True)
+    first = np.full(len(unique_labels), len(labels))
+    last = np.full(len(unique_labels), -1)
+    np.minimum.at(first, inverse, starts)
+    np.maximum.at(last, inverse, ends)
+    return {label: (first[i], last[i]) for i, label in enumerate(unique_labels)}
@@ -0,0 +1,117 @@
+# Block-compressed state logs with a time index, so a window of a few seconds can be read without decompressing the whole log
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import gzip
+import sys
+import time
+import numpy as np
+from read_state_data import parse_state_lines, read_state_columns, columns_to_df2
+from read_state_data import find_missing_packet_times
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from trial_catalog import TrialCatalog, STATE_RECORDING
+from compress_all_txt import compress_txt_file, load_index, index_path, BLOCK_LINES
+
+BLOCK_THREADS = 4  # Threads compressing blocks of one file (zlib releases the GIL)
+
+
+def convert_to_blocks(txt_path, block_lines=BLOCK_LINES, threads=BLOCK_THREADS):
+    """
+    Rewrites a state log (.txt or .txt.gz) as a .txt.gz made of independently compressed blocks, plus an index.
+
+    This is the format compress_all_txt writes (compress_txt_file with method "gzip"), so logs it already compressed
+    are indexed and never converted again. Returns the output path, or None on failure.
+    """
+    stats = compress_txt_file(txt_path, "gzip", threads, block_lines)
+    return Path(stats["output"]) if stats is not None else None
+
+
+def read_state_window(gz_path, t_start, t_end, fields=None, relative=True):
+    """
+    Returns {field: array} for the records with t_start <= time <= t_end (ms, from the start of the log if relative).
+
+    Only the blocks overlapping the window are read and decompressed. Logs without a valid index are parsed in full.
+    """
+    if fields is not None and "time" not in fields:
+        fields = ["time"] + list(fields)
+
+    index = load_index(gz_path)
+    if index is None:
+        print(f"No block index for {gz_path}, parsing the whole log (run state_blocks.py to convert it)")
+        columns = read_state_columns(gz_path, fields)
+        t0 = columns["time"][0] if relative else 0
+    else:
+        t0 = index["first_time"][0] if relative else 0
+        blocks = np.flatnonzero((index["last_time"] >= t_start + t0) & (index["first_time"] <= t_end + t0))
+        if len(blocks) == 0:
+            return {}
+
+        # Blocks are contiguous in the file, so the window is one read; gzip.decompress handles several members
+        start = index["offset"][blocks[0]]
+        stop = index["offset"][blocks[-1]] + index["length"][blocks[-1]]
+        with open(gz_path, "rb") as f:
+            f.seek(start)
+            data = gzip.decompress(f.read(stop - start))
+        columns = parse_state_lines(data.split(b"\n"), fields)
+
+    keep = (columns["time"] >= t_start + t0) & (columns["time"] <= t_end + t0)
+    return {k: v[keep] for k, v in columns.items()}
+
+
+def read_data_window(gz_path, t_start, t_end):
+    """Window version of read_data_from_txt_file: (df2, timestamps, packet_loss_times, None), times relative to the log start."""
+    index = load_index(gz_path)
+    columns = read_state_window(gz_path, t_start, t_end)
+    if not columns or len(columns["time"]) == 0:
+        return None
+    t0 = index["first_time"][0] if index is not None else columns["time"][0]
+    df2 = columns_to_df2(columns)
+    timestamps = columns["time"].ravel() - t0
+    packet_loss_times = find_missing_packet_times(timestamps - timestamps[0], 20) + timestamps[0]
+    return df2, timestamps, packet_loss_times, None
+
+
+def convert_all(root, max_files=2, threads=BLOCK_THREADS):
+    """Converts every closed state log in the catalog that does not have a valid index yet."""
+    catalog = TrialCatalog(root)
+    catalog.refresh()
+    todo = []
+    for r in catalog.query(kind="state_log"):
+        path = Path(r["path"])
+        if r["state"] == STATE_RECORDING or not path.exists():
+            continue
+        if path.suffix == ".gz" and load_index(path) is not None:
+            continue  # Already indexed, e.g. compressed by compress_all_txt
+        if path.suffix == ".txt" and Path(str(path) + ".gz").exists():
+            continue  # Being compressed by compress_all_txt
+        todo.append(path)
+    print(f"Converting {len(todo)} state logs")
+
+    start_time = time.time()
+    total_MB = 0.0
+    with ThreadPoolExecutor(max_workers=max_files) as executor:
+        for txt_path, gz_path in zip(todo, executor.map(lambda p: convert_to_blocks(p, threads=threads), todo)):
+            if gz_path is not None:
+                MB = int(np.load(index_path(gz_path))["uncompressed_size"]) / 1e6
+                total_MB += MB
+                print(f"{gz_path}: {round(MB, 1)} MB, {round(total_MB / (time.time() - start_time), 1)} MB/s overall")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Convert state logs to indexed blocks, or read a time window.")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Convert all state logs under this save location")
+    parser.add_argument("--files", type=int, default=2, help="Number of logs converted at once")
+    parser.add_argument("--threads", type=int, default=BLOCK_THREADS, help="Compression threads per log")
+    parser.add_argument("--window", nargs=3, metavar=("LOG", "START_MS", "END_MS"), help="Time a window query")
+    args = parser.parse_args()
+
+    if args.window:
+        gz_path, t_start, t_end = Path(args.window[0]), float(args.window[1]), float(args.window[2])
+        start = time.perf_counter()
+        columns = read_state_window(gz_path, t_start, t_end)
+        print(f"Window: {len(columns.get('time', []))} records in {round((time.perf_counter() - start) * 1000, 1)} ms")
+    else:
+        convert_all(Path(args.root), args.files, args.threads)
@@ -0,0 +1,205 @@
+# Columnar cache of parsed robot state logs, so that each log is only parsed from JSON once
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+import numpy as np
+from read_state_data import read_state_columns, columns_to_df2, find_missing_packet_times
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from compress_all_txt import load_index
+
+STATE_CACHE_DIR = Path(os.environ.get("STATE_CACHE_DIR", Path.home() / ".cache" / "robot_state_cache"))
+MAX_CACHE_BYTES = 50e9  # Least recently used logs are evicted once the cache is larger than this
+META_NAME = "meta.json"
+
+
+def _log_name(txt_path):
+    """Log identity shared by a .txt and the .txt.gz that compress_all_txt makes from it."""
+    txt_path = Path(txt_path).resolve()
+    if txt_path.suffix == ".gz":
+        txt_path = txt_path.with_suffix("")
+    return str(txt_path)
+
+
+def _entry_dir(txt_path, cache_dir):
+    key = hashlib.blake2b(_log_name(txt_path).encode(), digest_size=16).hexdigest()
+    return Path(cache_dir, key)
+
+
+def _gzip_uncompressed_size(gz_path):
+    """
+    Uncompressed size mod 2**32, from the block index written by compress_all_txt, else from the gzip trailer (ISIZE,
+    which only covers the last member of a multi-member file).
+    """
+    index = load_index(gz_path)
+    if index is not None:
+        return int(index["uncompressed_size"]) % 2**32
+    with open(gz_path, "rb") as f:
+        f.seek(-4, 2)
+        return struct.unpack("<I", f.read(4))[0]
+
+
+def _source_signature(txt_path):
+    stat = Path(txt_path).stat()
+    return {"source": str(Path(txt_path).resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_meta(entry_dir):
+    meta_path = Path(entry_dir, META_NAME)
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def _write_meta(entry_dir, meta):
+    tmp_path = Path(entry_dir, META_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, Path(entry_dir, META_NAME))
+
+
+def _is_valid(meta, txt_path):
+    """True if the cache entry was made from this exact file, or from the .txt that this .txt.gz was compressed from."""
+    if meta is None:
+        return False
+    signature = _source_signature(txt_path)
+    if all(meta[k] == signature[k] for k in ("source", "size", "mtime_ns")):
+        return True
+
+    # compress_all_txt replaced the .txt with a .txt.gz holding the same bytes; adopt the entry for the .gz
+    txt_path = Path(txt_path)
+    if txt_path.suffix == ".gz" and not Path(meta["source"]).exists() and meta["source"].endswith(".txt"):
+        if meta["uncompressed_size"] % 2**32 == _gzip_uncompressed_size(txt_path):
+            meta.update(signature)
+            return True
+    return False
+
+
+def write_cache_entry(txt_path, columns, cache_dir=STATE_CACHE_DIR):
+    """Writes one .npy file per field, plus meta.json describing the source file and dtypes."""
+    entry_dir = _entry_dir(txt_path, cache_dir)
+    if entry_dir.exists():
+        shutil.rmtree(entry_dir)
+    entry_dir.mkdir(parents=True)
+
+    fields = {}
+    nbytes = 0
+    for k, column in columns.items():
+        is_string = column.dtype == object
+        if is_string:
+            column = column.astype(str)  # Fixed-width unicode, so no pickling is needed to load
+        np.save(Path(entry_dir, f"{k}.npy"), column)
+        fields[k] = {"is_string": is_string}
+        nbytes += column.nbytes
+
+    meta = _source_signature(txt_path)
+    meta["fields"] = fields
+    meta["nbytes"] = nbytes
+    if Path(txt_path).suffix == ".gz":
+        meta["uncompressed_size"] = None
+    else:
+        meta["uncompressed_size"] = meta["size"]
+    _write_meta(entry_dir, meta)
+    return entry_dir
+
+
+def read_cache_entry(entry_dir, meta, fields=None):
+    """Loads the requested fields (all if None). Numeric fields are memory-mapped, so unused rows are never read."""
+    columns = {}
+    for k, info in meta["fields"].items():
+        if fields is not None and k not in fields:
+            continue
+        if info["is_string"]:
+            columns[k] = np.load(Path(entry_dir, f"{k}.npy")).astype(object)
+        else:
+            columns[k] = np.load(Path(entry_dir, f"{k}.npy"), mmap_mode="r")
+
+    # Mark as recently used for eviction
+    os.utime(Path(entry_dir, META_NAME))
+    return columns
+
+
+def evict(cache_dir=STATE_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Deletes least recently used entries until the cache is at most max_bytes."""
+    entries = []
+    for entry_dir in Path(cache_dir).glob("*"):
+        meta_path = Path(entry_dir, META_NAME)
+        if not meta_path.exists():
+            shutil.rmtree(entry_dir, ignore_errors=True)  # Incomplete entry
+            continue
+        with open(meta_path) as f:
+            nbytes = json.load(f)["nbytes"]
+        entries.append((meta_path.stat().st_mtime, nbytes, entry_dir))
+
+    entries.sort()
+    total_bytes = sum(e[1] for e in entries)
+    for _, nbytes, entry_dir in entries:
+        if total_bytes <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total_bytes -= nbytes
+    return total_bytes
+
+
+def load_state_columns(txt_path, fields=None, cache_dir=STATE_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Returns {field: array} for a state log (.txt or .txt.gz), from the cache if it is still valid.
+
+    On a miss the whole log is parsed and cached, so later calls with any fields are warm. Eviction reads every entry's
+    meta.json, so callers that load many logs pass max_bytes=None and call evict once at the end.
+    """
+    entry_dir = _entry_dir(txt_path, cache_dir)
+    meta = _read_meta(entry_dir)
+    source = meta["source"] if meta is not None else None
+    if _is_valid(meta, txt_path):
+        if meta["source"] != source:
+            _write_meta(entry_dir, meta)  # Adopted from the uncompressed log
+        return read_cache_entry(entry_dir, meta, fields)
+
+    columns = read_state_columns(txt_path)
+    write_cache_entry(txt_path, columns, cache_dir)
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes)
+    if fields is not None:
+        columns = {k: v for k, v in columns.items() if k in fields}
+    return columns
+
+
+def load_state_data(txt_path, fields=None, cache_dir=STATE_CACHE_DIR):
+    """Cached equivalent of read_data_from_txt_file: returns (df2, timestamps, packet_loss_times, None)."""
+    if fields is not None and "time" not in fields:
+        fields = ["time"] + list(fields)
+    columns = load_state_columns(txt_path, fields, cache_dir)
+    df2 = columns_to_df2(columns)
+    timestamps = np.asarray(columns["time"]).ravel() - columns["time"].ravel()[0]
+    packet_loss_times = find_missing_packet_times(timestamps, 20)
+    return df2, timestamps, packet_loss_times, None
+
+
+if __name__ == "__main__":
+    # Report cold vs. warm load times for a log
+    txt_path = Path(sys.argv[1])
+    cache_dir = Path("/tmp/robot_state_cache_timing")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    start = time.perf_counter()
+    load_state_columns(txt_path, cache_dir=cache_dir)
+    print(f"Cold (parse + write cache):  {round(time.perf_counter() - start, 3)} s")
+
+    start = time.perf_counter()
+    columns = {k: np.array(v) for k, v in load_state_columns(txt_path, cache_dir=cache_dir).items()}  # Read every page
+    print(f"Warm (all fields):           {round(time.perf_counter() - start, 3)} s")
+
+    start = time.perf_counter()
+    tau_J = np.array(load_state_columns(txt_path, fields=["tau_J"], cache_dir=cache_dir)["tau_J"])
+    print(f"Warm (tau_J only):           {round(time.perf_counter() - start, 3)} s")
+
+    start = time.perf_counter()
+    load_state_data(txt_path, cache_dir=cache_dir)
+    print(f"Warm load_state_data (df2):  {round(time.perf_counter() - start, 3)} s")
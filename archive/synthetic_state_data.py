@@ -0,0 +1,58 @@
+# Generate synthetic robot state logs with the same fields and layout as the real ones, for benchmarks
+import json
+import numpy as np
+
+STAGES = ["approach", "slowdown", "grasp", "lift", "release", "retract"]
+VECTOR_FIELDS = {
+    "q_d": 7,
+    "dq_d": 7,
+    "ddq_d": 7,
+    "tau_J": 7,
+    "dtau_J": 7,
+    "tau_ext_hat_filtered": 7,
+    "O_T_EE": 16,
+    "O_T_EE_c": 16,
+    "O_dP_EE_c": 6,
+    "O_ddP_EE_c": 6,
+    "O_F_ext_hat_K": 6,
+    "O_F_ext_hat_K_est": 6,
+    "elbow_c": 2,
+    "delbow_c": 2,
+    "ddelbow_c": 2,
+}
+
+
+def synthetic_state_records(num_lines, drop_fraction=0.001, pause_length=200, seed=0):
+    """
+    Yields state dicts at 1 kHz with occasional single dropped packets and one long pause (not counted as dropped).
+    """
+    rng = np.random.default_rng(seed)
+    time = 1000
+    stage_length = max(1, num_lines // len(STAGES))
+    for i in range(num_lines):
+        # Single dropped packets, plus a long pause in the middle of the log
+        time += 1
+        if rng.random() < drop_fraction:
+            time += 1
+        if i == num_lines // 2:
+            time += pause_length
+
+        phase = i / 1000.0
+        record = {"time": time}
+        for field, width in VECTOR_FIELDS.items():
+            record[field] = (np.sin(phase + np.arange(width)) + 0.01 * rng.standard_normal(width)).tolist()
+        record["O_T_EE"][12] = 0.4 + 0.05 * np.sin(phase)
+        record["O_F_ext_hat_K"][0] = 6.0 * np.sin(phase * 3) + rng.standard_normal()
+        record["control_command_success_rate"] = 0 if i < 100 else float(0.9 + 0.1 * rng.random())
+        record["halt_motion"] = bool((i // 5000) % 7 == 3)
+        record["stage"] = STAGES[min(i // stage_length, len(STAGES) - 1)]
+        record["current_errors"] = ["joint_velocity_violation"] if (i // 5000) % 11 == 5 else []
+        yield record
+
+
+def write_synthetic_state_log(txt_path, num_lines, **kwargs):
+    """Writes one JSON record per line, as the robot controller does."""
+    with open(txt_path, "w") as f:
+        for record in synthetic_state_records(num_lines, **kwargs):
+            f.write(json.dumps(record) + "\n")
+    return txt_path
@@ -0,0 +1,82 @@
+# Benchmark results as JSON, and comparison of a run against a stored baseline
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import cv2
+import numpy as np
+
+DEFAULT_TOLERANCE = 0.15  # A metric more than this fraction worse than the baseline is a regression
+
+
+def machine_info():
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "ffmpeg": shutil.which("ffmpeg") is not None,
+    }
+
+
+def make_results(scenario_results, quick, scratch_dir):
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "quick": quick,
+        "scratch_dir": str(scratch_dir),
+        "machine": machine_info(),
+        "scenarios": scenario_results,
+    }
+
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares every metric present in both runs. Scenarios run with different parameters are skipped, since their
+    numbers are not comparable. Returns (rows, notes), where each row is
+    (scenario, metric, baseline value, value, change, regressed) and change is positive when the metric improved.
+    """
+    rows = []
+    notes = []
+    if results["machine"]["hostname"] != baseline["machine"]["hostname"]:
+        notes.append(f"Baseline is from {baseline['machine']['hostname']}, not {results['machine']['hostname']}")
+    for scenario, result in results["scenarios"].items():
+        base = baseline["scenarios"].get(scenario)
+        if base is None:
+            notes.append(f"{scenario}: not in baseline")
+            continue
+        if base["params"] != result["params"]:
+            notes.append(f"{scenario}: parameters differ from baseline ({base['params']} vs {result['params']}), skipped")
+            continue
+        for name, m in result["metrics"].items():
+            if name not in base["metrics"]:
+                continue
+            old, new = base["metrics"][name]["value"], m["value"]
+            if old == 0:
+                change = 0.0 if new == 0 else (np.inf if m["higher_is_better"] == (new > 0) else -np.inf)
+            else:
+                change = (new - old) / abs(old) * (1 if m["higher_is_better"] else -1)
+            rows.append((scenario, name, old, new, change, change < -tolerance))
+    return rows, notes
+
+
+def print_comparison(rows, notes):
+    for note in notes:
+        print(f"Note: {note}")
+    print(f"{'scenario':<16} {'metric':<32} {'baseline':>12} {'now':>12} {'change':>8}")
+    for scenario, name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{scenario:<16} {name:<32} {old:>12.4g} {new:>12.4g} {change:>+8.0%}{flag}")
@@ -0,0 +1,57 @@
+# Run the benchmark scenarios, write the results as JSON and compare them with a baseline
+from pathlib import Path
+import argparse
+import sys
+import tempfile
+import time
+from scenarios import SCENARIOS
+from results import DEFAULT_TOLERANCE, make_results, save_results, load_results, compare, print_comparison
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def run_scenarios(names, scratch_dir, quick):
+    scenario_results = {}
+    for name in names:
+        print(f"Running {name}...")
+        start = time.perf_counter()
+        scenario_results[name] = SCENARIOS[name](scratch_dir, quick)
+        scenario_results[name]["elapsed_s"] = round(time.perf_counter() - start, 2)
+        for metric_name, m in scenario_results[name]["metrics"].items():
+            print(f"  {metric_name:<32} {m['value']:>12.4g} {m['unit']}")
+    return scenario_results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the recording and compression pipelines.")
+    parser.add_argument("scenarios", nargs="*", help=f"Any of {list(SCENARIOS)} (default: all)")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs, for a check in about a minute")
+    parser.add_argument("--scratch", help="Directory for generated files, e.g. on the recording drive (default: a temp dir)")
+    parser.add_argument("--out", help="Results file (default: results/<hostname>_<time>.json)")
+    parser.add_argument("--baseline", help="Compare with this results file; exits with 1 if any metric regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed fraction worse than baseline")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios {unknown}. Options: {list(SCENARIOS)}")
+    if args.scratch is not None:
+        Path(args.scratch).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="flir_benchmark_", dir=args.scratch) as scratch_dir:
+        results = make_results(run_scenarios(names, scratch_dir, args.quick), args.quick, args.scratch or tempfile.gettempdir())
+
+    if args.out is not None:
+        out_path = Path(args.out)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        out_path = Path(RESULTS_DIR, f"{results['machine']['hostname']}_{time.strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    save_results(out_path, results)
+    print(f"Results written to {out_path}")
+
+    if args.baseline is not None:
+        rows, notes = compare(results, load_results(args.baseline), args.tolerance)
+        print_comparison(rows, notes)
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
@@ -0,0 +1,252 @@
+# Benchmark scenarios. Each takes a scratch directory and the quick flag and returns {"params": ..., "metrics": ...}
+from pathlib import Path
+import importlib.util
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "archive"))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "compress"))
+from camera_frames import SimulatedCamera, frame_from_image, debayer
+from video_writers import make_writer
+from disk_preflight import measure_fsync_latency
+from synthetic import mono_frames, bayer_frames, write_synthetic_state_log
+
+# As VIDEO_FPS, VIDEO_WIDTH and VIDEO_HEIGHT in record_multi_cam_params.py (which needs PySpin to import)
+VIDEO_FPS = 100.0
+FRAME_SHAPE = (960, 960)
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def metric(value, unit, higher_is_better=True):
+    return {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def available_writer_backends():
+    return ["opencv", "ffmpeg"] if shutil.which("ffmpeg") else ["opencv"]
+
+
+def available_txt_methods():
+    methods = ["gzip"]
+    if importlib.util.find_spec("zstandard") is not None:
+        methods.append("zstd")
+    return methods
+
+
+def _state_log(scratch_dir, num_lines):
+    """Synthetic state log shared by the state scenarios; written once per scratch directory."""
+    txt_path = Path(scratch_dir, f"synthetic_{num_lines}_state.txt")
+    if not txt_path.exists():
+        write_synthetic_state_log(txt_path, num_lines)
+    return txt_path
+
+
+###########################
+### Acquisition -> save ###
+###########################
+
+
+def _acquire(camera, image_queue, stop_event):
+    """As acquire_images in record_multi_cam: one read-only copy per frame, handed to the saving queue."""
+    camera.BeginAcquisition()
+    while not stop_event.is_set():
+        try:
+            image_result = camera.GetNextImage(100)
+        except TimeoutError:
+            continue
+        image_queue.put(frame_from_image(image_result))
+    camera.EndAcquisition()
+    image_queue.put(None)
+
+
+def _save(image_queue, mp4_path, stats):
+    """As save_mp4 in record_multi_cam for a color camera: debayer to gray, then write."""
+    writer = make_writer("opencv", mp4_path, VIDEO_FPS, FRAME_SHAPE[1], FRAME_SHAPE[0])
+    while True:
+        stats["max_queue"] = max(stats["max_queue"], image_queue.qsize())
+        frame = image_queue.get()
+        if frame is None:
+            break
+        writer.write(debayer(frame, color=False))
+        stats["frames_saved"] += 1
+    writer.release()
+    stats["end_time"] = time.perf_counter()
+
+
+def acquire_save(scratch_dir, quick):
+    """
+    Simulated cameras at VIDEO_FPS, each with an acquisition thread and a saving thread as in the recorder. The
+    recorder keeps up if every camera saves VIDEO_FPS and the queues stay short.
+    """
+    num_cameras_list = [1, 2] if quick else [1, 2, 4, 6]
+    duration = 3.0 if quick else 10.0
+    frames = bayer_frames(16, FRAME_SHAPE)
+    metrics = {}
+    for num_cameras in num_cameras_list:
+        out_dir = Path(scratch_dir, f"acquire_save_{num_cameras}")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        cameras = [SimulatedCamera(fps=VIDEO_FPS, frames=frames, name=f"cam{i}") for i in range(num_cameras)]
+        queues = [queue.Queue() for _ in cameras]
+        stats = [{"max_queue": 0, "frames_saved": 0, "end_time": None} for _ in cameras]
+        stop_event = threading.Event()
+        threads = []
+        for i, camera in enumerate(cameras):
+            threads.append(threading.Thread(target=_acquire, args=(camera, queues[i], stop_event)))
+            threads.append(threading.Thread(target=_save, args=(queues[i], Path(out_dir, f"cam{i}.mp4"), stats[i])))
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop_event.set()
+        stop_time = time.perf_counter()
+        for t in threads:
+            t.join()
+        shutil.rmtree(out_dir)
+
+        frames_saved = sum(s["frames_saved"] for s in stats)
+        frames_dropped = sum(c.frames_dropped for c in cameras)
+        end_time = max(s["end_time"] for s in stats)
+        metrics[f"saved_fps_per_camera@{num_cameras}"] = metric(frames_saved / (end_time - start) / num_cameras, "fps")
+        metrics[f"dropped_fraction@{num_cameras}"] = metric(
+            frames_dropped / max(frames_saved + frames_dropped, 1), "fraction", higher_is_better=False
+        )
+        metrics[f"max_queue@{num_cameras}"] = metric(max(s["max_queue"] for s in stats), "frames", higher_is_better=False)
+        metrics[f"drain_time@{num_cameras}"] = metric(end_time - stop_time, "s", higher_is_better=False)
+    return {
+        "params": {"num_cameras": num_cameras_list, "duration_s": duration, "fps": VIDEO_FPS, "shape": list(FRAME_SHAPE)},
+        "metrics": metrics,
+    }
+
+
+######################
+### Video writers ###
+######################
+
+
+def writer_backends(scratch_dir, quick):
+    """Encoding speed and output size of each available writer backend on the same mono frames."""
+    num_frames = 100 if quick else 500
+    frames = mono_frames(16, FRAME_SHAPE)
+    metrics = {}
+    for backend in available_writer_backends():
+        mp4_path = Path(scratch_dir, f"writer_{backend}.mp4")
+        start = time.perf_counter()
+        writer = make_writer(backend, mp4_path, VIDEO_FPS, FRAME_SHAPE[1], FRAME_SHAPE[0])
+        for i in range(num_frames):
+            writer.write(frames[i % len(frames)])
+        writer.release()
+        elapsed = time.perf_counter() - start
+        metrics[f"{backend}.fps"] = metric(num_frames / elapsed, "fps")
+        metrics[f"{backend}.MB_per_1000_frames"] = metric(
+            mp4_path.stat().st_size / 1e6 / num_frames * 1000, "MB", higher_is_better=False
+        )
+        mp4_path.unlink()
+    return {"params": {"num_frames": num_frames, "shape": list(FRAME_SHAPE)}, "metrics": metrics}
+
+
+###################
+### Disk writes ###
+###################
+
+
+def _write_file(path, data, repeats=1):
+    """Writes data repeats times and fsyncs, so the page cache is not what is measured."""
+    with open(path, "wb") as f:
+        for _ in range(repeats):
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def disk_write(scratch_dir, quick):
+    """
+    The write patterns of the pipeline on the scratch drive: one large sequential file (mp4s), many 1 MB files
+    (frames saved as images) and many 4 kB files (sidecars).
+    """
+    large_MB = 64 if quick else 1024
+    num_medium = 50 if quick else 500
+    num_small = 500 if quick else 5000
+    out_dir = Path(scratch_dir, "disk_write")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    data = np.random.default_rng(0).integers(0, 256, CHUNK_SIZE, dtype=np.uint8).tobytes()  # Incompressible
+    metrics = {}
+
+    repeats = large_MB * 1024 * 1024 // CHUNK_SIZE
+    start = time.perf_counter()
+    _write_file(Path(out_dir, "large.bin"), data, repeats)
+    metrics["sequential_MB_per_s"] = metric(repeats * CHUNK_SIZE / 1e6 / (time.perf_counter() - start), "MB/s")
+
+    medium = data[: 1024 * 1024]
+    start = time.perf_counter()
+    for i in range(num_medium):
+        _write_file(Path(out_dir, f"medium_{i}.bin"), medium)
+    metrics["1MB_files_MB_per_s"] = metric(num_medium * len(medium) / 1e6 / (time.perf_counter() - start), "MB/s")
+
+    small = data[:4096]
+    start = time.perf_counter()
+    for i in range(num_small):
+        _write_file(Path(out_dir, f"small_{i}.bin"), small)
+    metrics["4kB_files_per_s"] = metric(num_small / (time.perf_counter() - start), "files/s")
+
+    fsync_ms = measure_fsync_latency(out_dir)
+    metrics["fsync_p50_ms"] = metric(fsync_ms["p50"], "ms", higher_is_better=False)
+    metrics["fsync_p99_ms"] = metric(fsync_ms["p99"], "ms", higher_is_better=False)
+
+    shutil.rmtree(out_dir)
+    return {"params": {"large_MB": large_MB, "num_1MB_files": num_medium, "num_4kB_files": num_small}, "metrics": metrics}
+
+
+##################
+### State logs ###
+##################
+
+
+def state_parse(scratch_dir, quick):
+    """Loading a state log into df2 with read_state_data, as process_trial does."""
+    import read_state_data  # Imports pandas, scipy and matplotlib, so only when this scenario runs
+
+    num_lines = 20_000 if quick else 200_000
+    txt_path = _state_log(scratch_dir, num_lines)
+    start = time.perf_counter()
+    read_state_data.read_data_from_txt_file(txt_path)
+    elapsed = time.perf_counter() - start
+    return {
+        "params": {"num_lines": num_lines},
+        "metrics": {
+            "lines_per_s": metric(num_lines / elapsed, "lines/s"),
+            "MB_per_s": metric(txt_path.stat().st_size / 1e6 / elapsed, "MB/s"),
+        },
+    }
+
+
+def txt_compress(scratch_dir, quick):
+    """compress_txt_file (compress, verify, replace) on a state log, for each available method."""
+    from compress_all_txt import compress_txt_file, index_path
+
+    num_lines = 20_000 if quick else 200_000
+    source = _state_log(scratch_dir, num_lines)
+    metrics = {}
+    for method in available_txt_methods():
+        txt_path = Path(scratch_dir, f"compress_{method}.txt")
+        shutil.copyfile(source, txt_path)
+        stats = compress_txt_file(txt_path, method)
+        Path(stats["output"]).unlink()
+        index_path(stats["output"]).unlink(missing_ok=True)
+        metrics[f"{method}.MB_per_s"] = metric(stats["MB_per_s"], "MB/s")
+        metrics[f"{method}.ratio"] = metric(stats["input_MB"] / stats["output_MB"], "x")
+    return {"params": {"num_lines": num_lines}, "metrics": metrics}
+
+
+SCENARIOS = {
+    "acquire_save": acquire_save,
+    "writer_backends": writer_backends,
+    "disk_write": disk_write,
+    "state_parse": state_parse,
+    "txt_compress": txt_compress,
+}
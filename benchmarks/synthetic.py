@@ -0,0 +1,54 @@
+# Reproducible synthetic inputs for the benchmarks: camera frames and robot state logs
+from pathlib import Path
+import sys
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "archive"))
+from synthetic_state_data import write_synthetic_state_log  # noqa: F401 (re-exported for the scenarios)
+
+
+def _scene(shape, seed):
+    """A smooth random scene with values in 20..220, so frames are neither flat nor pure noise to the encoders."""
+    rng = np.random.default_rng(seed)
+    scene = cv2.GaussianBlur(rng.uniform(0, 255, shape).astype(np.float32), (0, 0), 6)
+    scene = (scene - scene.min()) / max(float(np.ptp(scene)), 1e-6)
+    return 20 + 200 * scene
+
+
+def _frames_from_scenes(scenes, num_frames, shape, drift, noise, seed):
+    """Crops each scene at an offset that moves drift pixels per frame, and adds sensor noise."""
+    rng = np.random.default_rng(seed + 1)
+    height, width = shape
+    frames = np.empty((num_frames, height, width), dtype=np.uint8)
+    for i in range(num_frames):
+        dy, dx = i * drift // 2, i * drift
+        crops = [scene[dy : dy + height, dx : dx + width] for scene in scenes]
+        frame = crops[0] if len(crops) == 1 else _mosaic(crops)
+        frames[i] = np.clip(frame + noise * rng.standard_normal(shape), 0, 255)
+    return frames
+
+
+def _mosaic(crops):
+    """RGGB Bayer mosaic of R, G and B crops, as the color cameras deliver BayerRG8."""
+    red, green, blue = crops
+    bayer = np.empty_like(red)
+    bayer[0::2, 0::2] = red[0::2, 0::2]
+    bayer[0::2, 1::2] = green[0::2, 1::2]
+    bayer[1::2, 0::2] = green[1::2, 0::2]
+    bayer[1::2, 1::2] = blue[1::2, 1::2]
+    return bayer
+
+
+def mono_frames(num_frames=16, shape=(960, 960), drift=2, noise=2.0, seed=0):
+    """Mono8 frames of a textured scene that drifts by a few pixels per frame, as (num_frames, height, width)."""
+    margin = drift * num_frames
+    scene = _scene((shape[0] + margin, shape[1] + margin), seed)
+    return _frames_from_scenes([scene], num_frames, shape, drift, noise, seed)
+
+
+def bayer_frames(num_frames=16, shape=(960, 960), drift=2, noise=2.0, seed=0):
+    """BayerRG8 frames of a textured color scene, for the debayering path of the color cameras."""
+    margin = drift * num_frames
+    scenes = [_scene((shape[0] + margin, shape[1] + margin), seed + channel) for channel in range(3)]
+    return _frames_from_scenes(scenes, num_frames, shape, drift, noise, seed)
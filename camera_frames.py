@@ -0,0 +1,117 @@
+# Frames from PySpin images as shared read-only NumPy arrays, and a simulated camera with the same interface for tests
+import threading
+import time
+import cv2
+import numpy as np
+
+
+def frame_from_image(image_result):
+    """
+    Copies a grabbed image into a NumPy array and releases the image back to the camera straight away.
+
+    The returned array is read-only, so the same object can be put in every consumer's queue (saving, display,
+    analysis) without further copies; it is freed when the last consumer drops it. This is the only copy per frame.
+    """
+    frame = image_result.GetNDArray().copy()
+    image_result.Release()
+    frame.flags.writeable = False
+    return frame
+
+
+def debayer(frame, color=True):
+    """Converts a Bayer RG frame to BGR, or to gray through RGB as the high-speed recorder has always saved it."""
+    if color:
+        return cv2.cvtColor(frame, cv2.COLOR_BayerRG2BGR)
+    return cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BayerRG2RGB), cv2.COLOR_RGB2GRAY)
+
+
+class SimulatedImage:
+    """Stand-in for PySpin.ImagePtr. GetNDArray returns a view of the camera's buffer, valid until Release()."""
+
+    def __init__(self, camera, buffer_idx):
+        self.camera = camera
+        self.buffer_idx = buffer_idx
+        self.released = False
+
+    def IsIncomplete(self):
+        return False
+
+    def GetImageStatus(self):
+        return 0
+
+    def GetNDArray(self):
+        if self.released:
+            raise RuntimeError("Image used after Release()")
+        return self.camera.buffers[self.buffer_idx]
+
+    def Release(self):
+        if not self.released:
+            self.released = True
+            self.camera.release_buffer(self.buffer_idx)
+
+
+class SimulatedCamera:
+    """
+    Stand-in for a PySpin camera that produces frames at a fixed rate into a fixed pool of buffers.
+
+    As with the real driver, a buffer is only reused after its image is released, so holding images too long shows up
+    as frames_dropped. Each frame is filled with its frame number (mod 256), so consumers can check what they got,
+    unless frames (an array of images, e.g. from benchmarks/synthetic.py) is given, in which case they are cycled.
+    """
+
+    def __init__(self, fps=30.0, shape=(1200, 1920), num_buffers=10, name="simulated", frames=None):
+        self.fps = fps
+        self.shape = shape if frames is None else frames.shape[1:]
+        self.name = name
+        self.frames = frames
+        self.buffers = np.zeros((num_buffers,) + tuple(self.shape), dtype=np.uint8)
+        self.free_buffers = list(range(num_buffers))
+        self.lock = threading.Lock()
+        self.frames_produced = 0
+        self.frames_dropped = 0
+        self.start_time = None
+
+    # The parts of the PySpin camera interface used by the recorders
+    def Init(self):
+        pass
+
+    def DeInit(self):
+        pass
+
+    def BeginAcquisition(self):
+        self.start_time = time.perf_counter()
+
+    def EndAcquisition(self):
+        self.start_time = None
+
+    def DeviceUserID(self):
+        return self.name
+
+    def TransferQueueCurrentBlockCount(self):
+        return 0
+
+    def release_buffer(self, buffer_idx):
+        with self.lock:
+            self.free_buffers.append(buffer_idx)
+
+    def GetNextImage(self, timeout_ms=1000):
+        """Waits for the next frame time. Raises TimeoutError (PySpin raises SpinnakerException) if none is due."""
+        due = self.start_time + (self.frames_produced + self.frames_dropped) / self.fps
+        wait = due - time.perf_counter()
+        if wait > timeout_ms / 1000:
+            time.sleep(timeout_ms / 1000)
+            raise TimeoutError("No image within timeout")
+        if wait > 0:
+            time.sleep(wait)
+        with self.lock:
+            if not self.free_buffers:
+                self.frames_dropped += 1
+                raise TimeoutError("All buffers held; frame dropped")
+            buffer_idx = self.free_buffers.pop(0)
+        frame_number = self.frames_produced + self.frames_dropped
+        if self.frames is None:
+            self.buffers[buffer_idx] = frame_number % 256
+        else:
+            self.buffers[buffer_idx] = self.frames[frame_number % len(self.frames)]
+        self.frames_produced += 1
+        return SimulatedImage(self, buffer_idx)
@@ -0,0 +1,60 @@
+# Make proxies for a synthetic day of trials, check the manifest makes reruns incremental, and compare decode times
+from pathlib import Path
+import shutil
+import sys
+import time
+import cv2
+import numpy as np
+from make_proxies import make_day_proxies, proxy_dir, SHEET_NAME
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog, STATE_CLOSED
+
+CAMERAS = ["camTL", "camTo", "camTR", "camBL", "camBR"]
+
+
+def write_synthetic_trial(trial_dir, num_frames, size=960):
+    x = np.arange(size, dtype=np.float32)
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    for cam_idx, cam in enumerate(CAMERAS):
+        out = cv2.VideoWriter(str(Path(trial_dir, f"{cam}-orig.mp4")), cv2.VideoWriter_fourcc(*"mp4v"), 100, (size, size), isColor=False)
+        for i in range(num_frames):
+            frame = np.broadcast_to((127 + 127 * np.sin((x + 8 * i) / (40 + 10 * cam_idx))).astype(np.uint8), (size, size)).copy()
+            cv2.putText(frame, str(i), (40, 160), cv2.FONT_HERSHEY_SIMPLEX, 5, 0, 10)
+            out.write(frame)
+        out.release()
+
+
+def decode_time(mp4_path):
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(str(mp4_path))
+    num_frames = 0
+    while cap.read()[0]:
+        num_frames += 1
+    cap.release()
+    return time.perf_counter() - start, num_frames
+
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) >= 2 else 400
+    root = Path("/tmp/benchmark_proxies")
+    date = "2024-01-01"
+    shutil.rmtree(root, ignore_errors=True)
+    trial_dirs = [Path(root, date, "cameras", f"{date}_00-00-0{i}_000000") for i in range(2)]
+    catalog = TrialCatalog(root)
+    for trial_dir in trial_dirs:
+        write_synthetic_trial(trial_dir, num_frames)
+        for mp4_path in trial_dir.glob("*.mp4"):
+            catalog.record_file(mp4_path, STATE_CLOSED)  # As the recorder does when it releases each writer
+    catalog.close()
+
+    manifest = make_day_proxies(root, date, max_workers=2, backend="opencv")
+    assert set(manifest) == {t.name for t in trial_dirs}
+    assert Path(proxy_dir(trial_dirs[0]), SHEET_NAME).exists()
+    assert make_day_proxies(root, date, backend="opencv") == manifest  # Nothing changed, nothing remade
+
+    t_orig, n_orig = decode_time(Path(trial_dirs[0], "camTL-orig.mp4"))
+    t_proxy, n_proxy = decode_time(Path(proxy_dir(trial_dirs[0]), "camTL.mp4"))
+    print(f"Decode {n_orig} original frames: {round(t_orig, 2)} s, {n_proxy} proxy frames: {round(t_proxy, 3)} s")
+    print(f"Proxy decodes {round(t_orig / t_proxy, 1)}x faster for the same duration")
+    shutil.rmtree(root, ignore_errors=True)
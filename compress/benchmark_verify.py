@@ -0,0 +1,44 @@
+# Compare per-file cost of verifying frame counts with ffprobe vs. reading the mp4 index
+from pathlib import Path
+import sys
+import time
+from compress import get_num_frames as get_num_frames_ffprobe
+import verify
+
+
+def time_per_file(func, mp4_files, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for mp4_file in mp4_files:
+            func(mp4_file)
+    return (time.perf_counter() - start) / (repeats * len(mp4_files))
+
+
+if __name__ == "__main__":
+    # Use command line argument if given, otherwise use sample directory
+    if len(sys.argv) == 2:
+        mp4_dir = Path(sys.argv[1])
+    else:
+        mp4_dir = Path("/mnt/Data4TB")
+    mp4_files = sorted(mp4_dir.rglob("*.mp4"))[:100]
+    assert len(mp4_files) > 0, f"No mp4 files found in {mp4_dir}"
+
+    # Sanity check that both methods agree
+    for mp4_file in mp4_files:
+        assert get_num_frames_ffprobe(mp4_file) == verify.get_num_frames(mp4_file), mp4_file
+
+    # Before: compress_mp4 probed the input and output once per attempt, so at least 2 ffprobe calls per file
+    t_ffprobe = 2 * time_per_file(get_num_frames_ffprobe, mp4_files, repeats=1)
+
+    # After: one index read per file, then cached until the file changes
+    verify.clear_probe_cache()
+    t_index_cold = 2 * time_per_file(verify.read_mp4_info, mp4_files, repeats=1)
+    for mp4_file in mp4_files:
+        verify.probe_mp4(mp4_file)
+    t_index_warm = 2 * time_per_file(verify.get_num_frames, mp4_files, repeats=10)
+
+    print(f"Verified {len(mp4_files)} files in {mp4_dir}")
+    print(f"ffprobe (x2):          {round(t_ffprobe * 1e3, 3)} ms/file")
+    print(f"mp4 index (x2, cold):  {round(t_index_cold * 1e3, 3)} ms/file")
+    print(f"mp4 index (x2, warm):  {round(t_index_warm * 1e3, 3)} ms/file")
+    print(f"Speedup (cold): {round(t_ffprobe / t_index_cold, 1)}x")
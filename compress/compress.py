@@ -5,43 +5,45 @@ import time
 import datetime
 import cv2
 import os
+import sys
 from tqdm import tqdm
-import shutil
+from dedup_copy import copy_files
+from verify import run_ffmpeg_with_progress, verify_equivalent
+from make_proxies import make_day_proxies
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog, STATE_CLOSED, STATE_VERIFIED
 
-def find_unchanged_mp4s(trials_dir):
 
-    # Get list of all mp4 files in subdirectories
-    mp4_files = []
-    for subdir in trials_dir.glob("*"):
-        mp4_files += list(subdir.glob("*-orig.mp4"))
+def find_unchanged_mp4s(trials_dir, catalog=None):
 
-    # Get size of each mp4 file
-    size_dict = {}
-    for mp4_file in mp4_files:
-        size_dict[mp4_file] = mp4_file.stat().st_size
-
-    # Wait 1 second
-    time.sleep(1)
-    unchanged_files = []
-    for mp4_file in mp4_files:
-        if mp4_file.stat().st_size == size_dict[mp4_file]:
-            unchanged_files.append(mp4_file)
+    # Closed originals are known from the catalog, which the recorder updates when each mp4 is released
+    if catalog is None:
+        catalog = TrialCatalog(trials_dir.parent.parent)
+    catalog.refresh(trials_dir)
+    unchanged_files = catalog.paths(kind="video", state=STATE_CLOSED, under=trials_dir, name_suffix="-orig.mp4")
 
     return unchanged_files
 
 
-def copy_mp4(mp4_list):
+def copy_mp4(mp4_list, dry_run=False):
+    """Copies full resolution mp4s into cameras_full_res/. Returns number of bytes copied (or that would be)."""
 
+    # Group by full_res directory, since each has its own manifest of what has already been copied
+    pairs_dict = {}
     for mp4_filename in mp4_list:
+        full_res_dir = Path(mp4_filename.parents[2], "cameras_full_res")
         output_name = Path(
-            mp4_filename.parents[2],
-            "cameras_full_res",
+            full_res_dir,
             mp4_filename.parts[-2],
             mp4_filename.name.replace("-orig", "_full_res"),
         )
-        output_name.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(mp4_filename, output_name)
+        pairs_dict.setdefault(full_res_dir, []).append((mp4_filename, output_name))
+
+    num_bytes = 0
+    for full_res_dir, pairs in pairs_dict.items():
+        num_bytes += copy_files(pairs, full_res_dir, dry_run=dry_run)
+    return num_bytes
 
 
 def get_num_frames(mp4_filename):
@@ -59,67 +61,69 @@ def get_num_frames(mp4_filename):
     return num_frames_vid
 
 
-def compress_mp4(mp4_filename, cq=34, preset="slow"):
+def compress_mp4(mp4_filename, cq=34, preset="slow", catalog=None):
     # Compress mp4 file
     input_name = mp4_filename
     output_name = Path(mp4_filename.parent, mp4_filename.stem.replace("-orig", "") + mp4_filename.suffix)
-    # Get
-    cmd_string = (
-        f"nice -n -19 ffmpeg -y -hwaccel cuda -i {input_name} -c:v h264_nvenc -cq {cq} -preset {preset} {output_name}"
-    )
-
-    output = subprocess.run(
-        cmd_string,
-        shell=True,
-        cwd=mp4_filename.parent,
-        capture_output=True,
-    )
 
-    # Confirm input and output have same number of frames
-    attempt_count = 0
-    while attempt_count < 10:
-        try:
-            num_input = get_num_frames(mp4_filename)
-            num_output = get_num_frames(output_name)
-            if num_input == num_output > 0:
-                os.remove(input_name)
-                break
-        except:
-            attempt_count += 1
-            time.sleep(0.25)
-
-    # Test if successful deletion
-    if input_name.exists():
+    # Frame count and duration are read from ffmpeg's progress output, so no extra process is needed to verify
+    cmd_list = ["nice", "-n", "-19", "ffmpeg", "-y", "-hwaccel", "cuda", "-i", input_name]
+    cmd_list += ["-c:v", "h264_nvenc", "-cq", cq, "-preset", preset, output_name]
+    returncode, frames_encoded, _, stderr = run_ffmpeg_with_progress(cmd_list, cwd=mp4_filename.parent)
+    if returncode != 0:
+        print(f"ffmpeg failed for {input_name}: {stderr[-500:]}")
+        return False
+
+    # Confirm input, encoder and output agree on number of frames (read from the mp4 index, not ffprobe)
+    try:
+        frames_match = verify_equivalent(input_name, output_name, frames_encoded)
+    except OSError as e:
+        print(f"Could not read frame count for {input_name}: {e}")
+        frames_match = False
+
+    if frames_match:
+        os.remove(input_name)
+        if catalog is not None:
+            catalog.remove(input_name)
+            catalog.set_state(output_name, STATE_VERIFIED, num_frames=frames_encoded)
+    else:
         print(f"Failed to delete {input_name}")
-    # num_input = get_num_frames(mp4_filename)
-    # num_output = get_num_frames(output_name)
-
-    # if num_input == num_output > 0:
-    #     os.remove(input_name)
+    return frames_match
 
 
 import multiprocessing as mp
 from tqdm import tqdm
 
 
-def compress_dir(trial_dir, cq):
+def compress_dir(trial_dir, cq, dry_run=False):
     print("Compressing directory: ", trial_dir)
-    timestamp_list = [d for d in trial_dir.glob("*") if d.is_dir()]
-    timestamp_list.sort()
+    catalog = TrialCatalog(trial_dir.parent.parent)
+    # Trials are spread over every save location, so list them on each
+    timestamp_list = [d.name for loc_dir in catalog.equivalent_paths(trial_dir) for d in loc_dir.glob("*") if d.is_dir()]
+    timestamp_list = sorted(set(timestamp_list))
 
     # Copy subset of these trials
     gap = 50
+    mp4_files_to_copy = []
     for timestamp in timestamp_list[::gap]:
-        mp4_files_to_copy = list(timestamp.rglob("*-orig.mp4"))
-        copy_mp4(mp4_files_to_copy)
+        for timestamp_dir in catalog.equivalent_paths(Path(trial_dir, timestamp)):
+            mp4_files_to_copy += list(timestamp_dir.rglob("*-orig.mp4"))
+    num_bytes = copy_mp4(mp4_files_to_copy, dry_run=dry_run)
+    print(f"{'Would copy' if dry_run else 'Copied'} {round(num_bytes / 1e9, 2)} GB of full resolution samples")
+    if dry_run:
+        catalog.close()
+        return
 
     # Compress original mp4s in parallel
-    unchanged_files = find_unchanged_mp4s(trial_dir)
+    unchanged_files = find_unchanged_mp4s(trial_dir, catalog)
     unchanged_files.sort()
 
     # Create a pool of workers
     for mp4_filename in tqdm(unchanged_files):
-        compress_mp4(mp4_filename, cq=cq)
+        compress_mp4(mp4_filename, cq=cq, catalog=catalog)
+
+    # Low-res proxies of the compressed videos, for review tools; only trials that changed are processed
+    make_day_proxies(trial_dir.parent.parent, trial_dir.parent.name)
 
 
 # def worker(filename_queue):
@@ -136,6 +140,7 @@ if __name__ == "__main__":
 
     CQ = 30
     SAVE_LOCATION = Path("/mnt/Data4TB")
+    DRY_RUN = "--dry-run" in sys.argv  # Only report how much would be copied
 
     YYYY_MM_DD_list = [d for d in SAVE_LOCATION.glob("*-*-*")]
     YYYY_MM_DD_list.sort()
@@ -146,7 +151,7 @@ if __name__ == "__main__":
 
         TRIALS_DIR = Path(SAVE_LOCATION, YYYY_MM_DD, "cameras")
 
-        compress_dir(TRIALS_DIR, cq=CQ)
+        compress_dir(TRIALS_DIR, cq=CQ, dry_run=DRY_RUN)
 
     # TRIALS_DIR = Path(SAVE_LOCATION, YYYY_MM_DD, "cameras")
     # print(TRIALS_DIR)
@@ -1,77 +1,191 @@
 import cv2
 from pathlib import Path
-from compress import get_num_frames
+from verify import get_num_frames
 import tqdm
 import sys
+import os
 import select
+import collections
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog
+from video_writers import FFmpegPipeWriter
+
+CPU_BUDGET = os.cpu_count()  # Total cores shared by all encoders and readers
+ENCODER_THREADS = 4  # Threads per ffmpeg encoder; CPU_BUDGET // ENCODER_THREADS directories are converted at once
+READER_THREADS = 4  # BMP reader threads per directory
+PREFETCH = 64  # Maximum number of decoded frames waiting to be encoded, per directory
+
+
+def read_bmp_gray(bmp_file):
+    """
+    Reads a BMP as a 2-D uint8 array with a single read, without decoding through OpenCV.
+
+    8-bit uncompressed BMPs (which is what PySpin saves for Mono8 and Bayer images) are viewed directly from the file
+    bytes. Anything else falls back to cv2.imread with IMREAD_GRAYSCALE. Returns None for unreadable files.
+    """
+    data = np.fromfile(bmp_file, dtype=np.uint8)
+    if len(data) < 54 or data[0] != ord("B") or data[1] != ord("M"):
+        return None
+
+    offset = int(data[10:14].view("<u4")[0])
+    width = int(data[18:22].view("<i4")[0])
+    height = int(data[22:26].view("<i4")[0])
+    bit_count = int(data[28:30].view("<u2")[0])
+    compression = int(data[30:34].view("<u4")[0])
+
+    if bit_count != 8 or compression != 0:
+        return cv2.imread(str(bmp_file), cv2.IMREAD_GRAYSCALE)
+
+    # Rows are padded to multiples of 4 bytes and stored bottom-up unless height is negative
+    stride = (width + 3) & ~3
+    num_rows = abs(height)
+    if len(data) < offset + stride * num_rows:
+        return None  # Incomplete file
+    frame = data[offset : offset + stride * num_rows].reshape(num_rows, stride)[:, :width]
+    if height > 0:
+        frame = frame[::-1]
+    return frame
+
+
+def iter_frames_prefetched(bmp_files, executor, prefetch=PREFETCH):
+    """Yields (bmp_file, frame) in order while up to `prefetch` later frames are read in the background."""
+    pending = collections.deque()
+    bmp_iter = iter(bmp_files)
+
+    for bmp_file in bmp_iter:
+        pending.append((bmp_file, executor.submit(read_bmp_gray, bmp_file)))
+        if len(pending) >= prefetch:
+            break
 
+    while pending:
+        bmp_file, future = pending.popleft()
+        next_file = next(bmp_iter, None)
+        if next_file is not None:
+            pending.append((next_file, executor.submit(read_bmp_gray, next_file)))
+        yield bmp_file, future.result()
 
-def convert_bmp_to_mp4(bmp_dir, output_fname, FPS):
-    bmp_files = sorted(bmp_dir.glob("*.bmp"))
 
+def convert_bmp_to_mp4(bmp_files, output_fname, FPS, encoder_threads=ENCODER_THREADS):
+    """
+    Streams BMP frames through a reader pool into an ffmpeg encoder.
+
+    Returns the number of frames the pipeline wrote (and ffmpeg confirmed encoding), or 0 on failure. If reading or
+    writing raises, ffmpeg is stopped before the exception is re-raised.
+    """
     if not bmp_files:
         print("No BMP files found.")
-        return
-
-    # # Read all BMP frames into memory
-    # frames = []
-    # for bmp_file in bmp_files:
-    #     img = cv2.imread(str(bmp_file))
-    #     if img is None:
-    #         print(f"Skipping invalid frame: {bmp_file}")
-    #         continue
-    #     frames.append(img)
-
-    # Read first BMP frame to get dimensions
-    img = cv2.imread(str(bmp_files[0]))
-    height, width, _ = img.shape
-
-    # Create VideoWriter object
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    video = cv2.VideoWriter(str(output_fname), fourcc, FPS, (width, height))
-
-    # Write all frames to the video in one go
-    for bmp_file in bmp_files:
-        frame = cv2.imread(str(bmp_file))
-        if frame is None:
-            print(f"Skipping invalid frame: {bmp_file}")
-            continue
-        video.write(frame)
-
-    video.release()
-
-
-def delete_bmp_dir(mp4_fname, bmp_dir):
-    # Check if video has same number of frames as BMP files
+        return 0
+
+    video = None
+    try:
+        with ThreadPoolExecutor(max_workers=READER_THREADS) as executor:
+            for bmp_file, frame in iter_frames_prefetched(bmp_files, executor):
+                if frame is None:
+                    print(f"Skipping invalid frame: {bmp_file}")
+                    continue
+
+                # Create writer from the dimensions of the first frame
+                if video is None:
+                    height, width = frame.shape
+                    video = FFmpegPipeWriter(output_fname, FPS, width, height, threads=encoder_threads)
+                video.write(frame)
+    except BaseException:
+        if video is not None:
+            video.release()
+        raise
+
+    if video is None:
+        return 0
+    if not video.release():
+        return 0
+    return video.frames_written
+
+
+def delete_bmp_dir(mp4_fname, bmp_dir, bmp_files, num_frames_written):
+    # Check that the pipeline wrote every BMP, and that the mp4 index agrees
+    num_frames_bmp = len(bmp_files)
     num_frames_vid = get_num_frames(mp4_fname)
-    num_frames_bmp = len(list(bmp_dir.glob("*.bmp")))
-    if num_frames_vid == num_frames_bmp:
+    if num_frames_written == num_frames_bmp == num_frames_vid:
         # Delete BMP files
-        for bmp_file in bmp_dir.glob("*.bmp"):
+        for bmp_file in bmp_files:
             bmp_file.unlink()
         bmp_dir.rmdir()
-        pass
+        return True
     else:
-        print(f"Number of frames in video ({num_frames_vid}) does not match number of BMP files ({num_frames_bmp}).")
+        print(
+            f"Number of frames in video ({num_frames_vid}, {num_frames_written} written) does not match number of BMP files ({num_frames_bmp})."
+        )
         print("BMP files were not deleted.")
+        return False
 
 
-def convert_bmp_dir_to_mp4(bmp_dir):
+def convert_bmp_dir_to_mp4(bmp_dir, encoder_threads=ENCODER_THREADS):
     output_fname = Path(bmp_dir.parent, bmp_dir.name + "-orig.mp4")
+    tmp_fname = Path(bmp_dir.parent, bmp_dir.name + "-orig.tmp.mp4")
 
     # Define frames per second
     FPS = 100
 
-    # Assert mp4 does not already exist
+    # Skip if mp4 already exists
     if output_fname.exists():
         print(f"MP4 file already exists: {output_fname}")
-        exit(1)
+        return False
 
-    # Convert BMP files to MP4
-    convert_bmp_to_mp4(bmp_dir, output_fname, FPS)
+    # Convert BMP files to MP4 under a temporary name, so an interrupted conversion is redone on the next run
+    bmp_files = sorted(bmp_dir.glob("*.bmp"))
+    try:
+        num_frames_written = convert_bmp_to_mp4(bmp_files, tmp_fname, FPS, encoder_threads)
+        if num_frames_written == 0 or num_frames_written != get_num_frames(tmp_fname):
+            print(f"Conversion of {bmp_dir} failed ({num_frames_written} frames written). BMP files were not deleted.")
+            tmp_fname.unlink(missing_ok=True)
+            return False
+        os.replace(tmp_fname, output_fname)
+    except BaseException:
+        tmp_fname.unlink(missing_ok=True)
+        raise
 
     # Delete BMP files
-    delete_bmp_dir(output_fname, bmp_dir)
+    return delete_bmp_dir(output_fname, bmp_dir, bmp_files, num_frames_written)
+
+
+def convert_dirs_in_parallel(bmp_dir_list, cpu_budget=CPU_BUDGET, encoder_threads=ENCODER_THREADS):
+    """Converts many directories at once, limiting the number of concurrent encoders to fit the CPU budget."""
+    max_parallel_dirs = max(1, cpu_budget // encoder_threads)
+    print(f"Converting {max_parallel_dirs} directories at a time ({encoder_threads} encoder threads each)")
+    stop_submitting = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=max_parallel_dirs) as executor:
+        dir_iter = iter(bmp_dir_list)
+        running = {}  # future -> bmp_dir
+        progress = tqdm.tqdm(total=len(bmp_dir_list))
+        while True:
+            # Keep at most max_parallel_dirs directories in flight so stopping is quick
+            while not stop_submitting.is_set() and len(running) < max_parallel_dirs:
+                bmp_dir = next(dir_iter, None)
+                if bmp_dir is None:
+                    break
+                running[executor.submit(convert_bmp_dir_to_mp4, bmp_dir, encoder_threads)] = bmp_dir
+
+            if not running:
+                break
+
+            done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                bmp_dir = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error converting {bmp_dir}: {e}")
+            progress.update(len(done))
+
+            if not stop_submitting.is_set() and check_for_enter():
+                print("Enter pressed, finishing directories in progress.")
+                stop_submitting.set()
+        progress.close()
 
 
 # Use select to test for enter press
@@ -91,21 +205,16 @@ if __name__ == "__main__":
     # bmp_dir = Path("/home/oconnorlab/Desktop/2023-11-20_12-17-09_167964/cam-To")
 
     base_dir = Path("/mnt/data12/William/Data/")
-    trial_list = [d for d in base_dir.glob("*/cameras/*/*") if d.is_dir()]
 
-    # Ensure the directories contain .bmp files
-    trial_list_copy = []
-    for trial in trial_list:
-        if list(trial.glob("*.bmp")):
-            trial_list_copy.append(trial)
-        else:
-            print(f"No BMP files found in {trial}")
+    # Directories containing .bmp files are catalogued as image_dir rows, so no glob over the archive is needed
+    catalog = TrialCatalog(base_dir)
+    catalog.refresh()
+    trial_list_copy = [
+        Path(r["path"])
+        for r in catalog.query(kind="image_dir")
+        if Path(r["path"]).parent.parent.name == "cameras" and r["num_frames"] > 0
+    ]
 
     # Convert bmp directories to mp4
     print("Press ENTER to exit loop")
-    for trial in tqdm.tqdm(trial_list_copy):
-
-        if check_for_enter():
-            break
-
-        convert_bmp_dir_to_mp4(trial)
+    convert_dirs_in_parallel(trial_list_copy)
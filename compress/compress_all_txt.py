@@ -1,48 +1,260 @@
 import gzip
 from pathlib import Path
 import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
+import hashlib
+import json
+import multiprocessing
 import os
+import resource
+import sys
+import time
+import numpy as np
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog, STATE_CLOSED
 
-def compress_txt_file(txt_file):
-    try:
-        # Read the original file in binary mode
-        with open(txt_file, "rb") as f:
-            txt = f.read()
+# orjson parses each line several times faster than json, but is optional
+try:
+    import orjson
+
+    loads = orjson.loads
+except ModuleNotFoundError:
+    loads = json.loads
+
+CHUNK_SIZE = 8 * 1024 * 1024  # (bytes) Read size when verifying
+BLOCK_LINES = 1024  # Lines per gzip member, about 1 s at 1 kHz; a window query decompresses whole blocks
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+INDEX_SUFFIX = ".idx.npz"  # Block index written next to each .txt.gz, read by archive/state_blocks.py
+
+# Output suffix for each method. "gzip" writes indexed blocks (an ordinary multi-member .gz) using threads_per_file threads.
+METHOD_SUFFIXES = {"gzip": ".txt.gz", "zstd": ".txt.zst"}
+
+
+def index_path(gz_path):
+    return Path(str(gz_path) + INDEX_SUFFIX)
+
+
+def load_index(gz_path):
+    """Returns the block index of a log as a dict of arrays, or None if there is none or it is out of date."""
+    idx_path = index_path(gz_path)
+    if not idx_path.exists() or not Path(gz_path).exists():
+        return None
+    index = dict(np.load(idx_path))
+    stat = Path(gz_path).stat()
+    if int(index["size"]) != stat.st_size or int(index["mtime_ns"]) != stat.st_mtime_ns:
+        return None
+    return index
+
+
+def _iter_line_blocks(f, block_lines):
+    block = []
+    for line in f:
+        block.append(line)
+        if len(block) == block_lines:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _block_times(block, previous_time):
+    """(first, last) time of a block, parsing only its first and last records."""
+    records = [l for l in (block[0], block[-1]) if l.strip()]
+    if not records:
+        return previous_time, previous_time
+    return loads(records[0])["time"], loads(records[-1])["time"]
+
+
+def _write_gzip_blocks(f_in, f_out, threads, block_lines, input_hash):
+    """
+    Compresses the lines of f_in into f_out as independent gzip members, compressed in parallel. Returns (input size,
+    index arrays).
+    """
+    compress = partial(gzip.compress, compresslevel=GZIP_LEVEL, mtime=0)
+    index = {"offset": [], "length": [], "first_time": [], "last_time": [], "num_lines": []}
+    input_size = 0
+    offset = 0
+    last_time = None
+    pending = deque()
+
+    def write_oldest():
+        nonlocal offset
+        compressed = pending.popleft().result()
+        f_out.write(compressed)
+        index["offset"].append(offset)
+        index["length"].append(len(compressed))
+        offset += len(compressed)
+
+    with ThreadPoolExecutor(threads) as executor:
+        for block in _iter_line_blocks(f_in, block_lines):
+            data = b"".join(block)
+            input_hash.update(data)
+            input_size += len(data)
+            first_time, last_time = _block_times(block, last_time)
+            index["first_time"].append(first_time)
+            index["last_time"].append(last_time)
+            index["num_lines"].append(len(block))
+            pending.append(executor.submit(compress, data))
+
+            # Bound the number of blocks held in memory
+            if len(pending) > 2 * threads:
+                write_oldest()
+        while pending:
+            write_oldest()
+    return input_size, index
 
-        # Compress the file with gzip
-        with gzip.open(txt_file.with_suffix(".txt.gz"), "wb") as g:
-            g.write(txt)
 
-        # Load the compressed file to verify integrity
-        with gzip.open(txt_file.with_suffix(".txt.gz"), "rb") as f:
-            txt_compressed = f.read()
+def _write_zstd(f_in, f_out, threads, input_hash):
+    import zstandard  # Optional dependency, only needed for zstd
+
+    input_size = 0
+    with zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads).stream_writer(f_out, closefd=False) as z:
+        while True:
+            chunk = f_in.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            input_hash.update(chunk)
+            input_size += len(chunk)
+            z.write(chunk)
+    return input_size
+
+
+def _open_compressed_reader(method, compressed_file):
+    if method == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().stream_reader(open(compressed_file, "rb"), closefd=True)
+    return gzip.open(compressed_file, "rb")
+
+
+def _write_index(gz_path, index, input_size):
+    """The index records the size and mtime of the file it describes, so a rewritten log is never misread."""
+    stat = gz_path.stat()
+    tmp_index = Path(str(index_path(gz_path)) + ".tmp.npz")
+    np.savez(
+        tmp_index,
+        **{name: np.array(values, dtype=np.int64) for name, values in index.items()},
+        uncompressed_size=input_size,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+    )
+    os.replace(tmp_index, index_path(gz_path))
+
+
+def compress_txt_file(txt_file, method="gzip", threads=1, block_lines=BLOCK_LINES):
+    """
+    Compresses a state log, verifies it by streaming decompression, then deletes the original.
+
+    "gzip" writes blocks of block_lines lines as separate gzip members, plus an index of their offsets and times
+    (<log>.txt.gz.idx.npz), so that archive/state_blocks.py can read a time window without decompressing the whole
+    log. The output is still an ordinary gzip file. A .txt.gz without an index is rewritten in place.
+
+    A hash of the input is computed while compressing and compared with a hash of the decompressed output, so
+    neither file is ever held in memory. The output is written to a temp file and renamed into place only once
+    verified; on failure the temp file is removed. Returns a dict of stats (sizes, MB/s, peak RSS of this process)
+    or None on failure.
+    """
+    txt_file = Path(txt_file)
+    if txt_file.suffix == ".gz":
+        if method != "gzip":
+            raise ValueError(f"{txt_file} is already compressed; only method 'gzip' can index it")
+        out_file = txt_file
+    else:
+        out_file = Path(str(txt_file)[: -len(".txt")] + METHOD_SUFFIXES[method])
+    tmp_file = out_file.with_name(out_file.name + ".tmp")
+    start_time = time.time()
+
+    try:
+        # Compress while hashing the input
+        input_hash = hashlib.blake2b()
+        open_input = gzip.open if txt_file.suffix == ".gz" else open
+        with open_input(txt_file, "rb") as f, open(tmp_file, "wb") as f_out:
+            if method == "gzip":
+                input_size, index = _write_gzip_blocks(f, f_out, threads, block_lines, input_hash)
+            elif method == "zstd":
+                input_size = _write_zstd(f, f_out, threads, input_hash)
+            else:
+                raise ValueError(f"Unknown compression method {method}. Options: {list(METHOD_SUFFIXES)}")
+            f_out.flush()
+            os.fsync(f_out.fileno())
+
+        # Verify by decompressing and hashing the stream
+        output_hash = hashlib.blake2b()
+        output_size = 0
+        with _open_compressed_reader(method, tmp_file) as g:
+            while True:
+                chunk = g.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                output_hash.update(chunk)
+                output_size += len(chunk)
 
         # Compare original and compressed content for consistency
-        assert txt == txt_compressed, f"Integrity check failed for {txt_file}"
+        assert input_size == output_size, f"Size check failed for {txt_file}"
+        assert input_hash.digest() == output_hash.digest(), f"Integrity check failed for {txt_file}"
 
-        # Optionally, delete the original file
-        txt_file.unlink()
+        # Move into place, then delete the original
+        os.replace(tmp_file, out_file)
+        if txt_file != out_file:
+            txt_file.unlink()
+        if method == "gzip":
+            _write_index(out_file, index, input_size)
 
     except Exception as e:
         print(f"Error processing {txt_file}: {e}")
+        tmp_file.unlink(missing_ok=True)
+        return None
+
+    elapsed = time.time() - start_time
+    return {
+        "file": str(txt_file),
+        "output": str(out_file),
+        "input_MB": input_size / 1e6,
+        "output_MB": out_file.stat().st_size / 1e6,
+        "MB_per_s": input_size / 1e6 / max(elapsed, 1e-9),
+        "peak_rss_MB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,  # Linux reports kB
+    }
 
 
-def compress_all_files_in_parallel(txt_list, max_workers=4):
-    # Use ThreadPoolExecutor for multithreading
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+def compress_all_files_in_parallel(txt_list, max_workers=4, method="gzip", threads_per_file=1):
+    # Each file is compressed in a fresh worker process, so the peak RSS it reports is that file's alone.
+    # forkserver forks workers from a small server process, so a new process per file is cheap.
+    context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, max_tasks_per_child=1) as executor:
         # Display progress bar with tqdm
-        list(tqdm.tqdm(executor.map(compress_txt_file, txt_list), total=len(txt_list)))
+        futures = executor.map(compress_txt_file, txt_list, repeat(method), repeat(threads_per_file))
+        stats_list = list(tqdm.tqdm(futures, total=len(txt_list)))
+
+    # Report throughput per file and in total
+    stats_list = [s for s in stats_list if s is not None]
+    for s in stats_list:
+        print(
+            f"{s['file']}: {round(s['input_MB'], 1)} MB -> {round(s['output_MB'], 1)} MB, "
+            f"{round(s['MB_per_s'], 1)} MB/s, peak RSS {round(s['peak_rss_MB'], 1)} MB"
+        )
+    if stats_list:
+        total_MB = sum(s["input_MB"] for s in stats_list)
+        print(f"Compressed {len(stats_list)}/{len(txt_list)} files, {round(total_MB, 1)} MB total")
+    return stats_list
 
 
 if __name__ == "__main__":
     txt_dir = Path("/mnt/Data4TB")
 
-    # Get a list of all .txt files
-    txt_list = [f for f in txt_dir.rglob("*.txt") if "robot_state_data" in f.parts]
+    # Get a list of all .txt files from the catalog instead of walking the whole drive
+    catalog = TrialCatalog(txt_dir)
+    catalog.refresh()
+    txt_list = catalog.paths(kind="state_log", state=STATE_CLOSED, name_suffix=".txt")
+
+    # Indexed gzip blocks, readable by gzip/zcat and by archive/state_blocks.py window queries
+    method = "gzip"
 
-    # Compress all files in parallel using multiple threads
+    # Compress all files in parallel using multiple processes
     max_workers = os.cpu_count() * 1
-    print(f"Using {max_workers} workers.")
-    compress_all_files_in_parallel(txt_list, max_workers=max_workers)  # Adjust max_workers based on your CPU
+    print(f"Using {max_workers} workers ({method}).")
+    compress_all_files_in_parallel(txt_list, max_workers=max_workers, method=method)  # Adjust max_workers based on your CPU
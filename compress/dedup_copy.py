@@ -0,0 +1,223 @@
+# Copy files into a destination tree, skipping files that were already copied and linking instead of copying when possible
+from pathlib import Path
+import errno
+import fcntl
+import hashlib
+import json
+import os
+
+FICLONE = 0x40049409  # ioctl request for reflinks (btrfs, xfs)
+COPY_CHUNK_SIZE = 64 * 1024 * 1024  # (bytes) used by copy_file_range / sendfile
+HASH_CHUNK_SIZE = 16 * 1024 * 1024  # (bytes) read size when hashing
+MANIFEST_NAME = "manifest.json"
+
+
+def hash_file(filename):
+    """Content hash (blake2b) of a file, read in large chunks."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def try_reflink(src, dst):
+    """Creates dst as a copy-on-write clone of src. Returns False if the filesystem does not support it."""
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        if Path(dst).exists():
+            Path(dst).unlink()
+        return False
+
+
+def try_hardlink(src, dst):
+    """Hardlinks dst to src. Only works within one filesystem."""
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        return False
+
+
+def stream_copy(src, dst):
+    """Copies in kernel space with copy_file_range, falling back to sendfile."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        use_copy_file_range = hasattr(os, "copy_file_range")
+        while remaining > 0:
+            count = min(COPY_CHUNK_SIZE, remaining)
+            if use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), count)
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL):
+                        raise
+                    use_copy_file_range = False
+                    continue
+            else:
+                copied = os.sendfile(fdst.fileno(), fsrc.fileno(), None, count)
+            if copied == 0:
+                break
+            remaining -= copied
+    os.utime(dst, ns=(os.stat(src).st_atime_ns, os.stat(src).st_mtime_ns))  # Match shutil.copy2
+
+
+def copy_fast(src, dst):
+    """Copies src to dst using the cheapest available method. Returns the method used."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if try_reflink(src, dst):
+        os.utime(dst, ns=(os.stat(src).st_atime_ns, os.stat(src).st_mtime_ns))
+        return "reflink"
+    if try_hardlink(src, dst):
+        return "hardlink"
+    stream_copy(src, dst)
+    return "copy"
+
+
+class CopyManifest:
+    """
+    Records what has been copied into a directory, keyed by destination path relative to the directory.
+
+    Each entry stores the source path, size and mtime so that reruns can skip files with a stat() call. Content hashes
+    are only computed when needed (a stream copy of a file the same size as an existing copy, or verification), and
+    are then stored so that identical content can be linked from the existing copy instead of being copied again.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = Path(root_dir)
+        self.manifest_path = Path(self.root_dir, MANIFEST_NAME)
+        self.entries = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.entries = json.load(f)
+        self.by_hash = {e["hash"]: k for k, e in self.entries.items() if e.get("hash")}
+        self.by_size = {}
+        for k, e in self.entries.items():
+            self.by_size.setdefault(e["size"], set()).add(k)
+
+    def save(self):
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_copied(self, src, dst):
+        """True if dst already holds the current contents of src (checked by stat only, no hashing)."""
+        if not dst.exists():
+            return False
+        src_stat = src.stat()
+        dst_stat = dst.stat()
+        if dst_stat.st_size != src_stat.st_size:
+            return False
+
+        entry = self.entries.get(str(dst.relative_to(self.root_dir)))
+        if entry is not None:
+            return entry["size"] == src_stat.st_size and entry["mtime_ns"] == src_stat.st_mtime_ns
+
+        # Copies made before the manifest existed were made with shutil.copy2, which preserves mtime
+        if dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+            self._add_entry(src, dst, src_stat, content_hash=None, method="existing")
+            return True
+        return False
+
+    def _hash_entry(self, key):
+        """Content hash of an existing copy, computed on first use and stored in its entry."""
+        entry = self.entries[key]
+        if entry.get("hash") is None:
+            entry["hash"] = hash_file(Path(self.root_dir, key))
+            self.by_hash[entry["hash"]] = key
+        return entry["hash"]
+
+    def _find_identical(self, src, size):
+        """(key, hash of src) of an existing copy with the same content as src. src is only hashed if a copy has its size."""
+        candidates = [
+            k for k in self.by_size.get(size, ()) if self.entries[k]["size"] == size and Path(self.root_dir, k).exists()
+        ]
+        if not candidates:
+            return None, None
+        content_hash = hash_file(src)
+        for key in sorted(candidates):
+            if self._hash_entry(key) == content_hash:
+                return key, content_hash
+        return None, content_hash
+
+    def copy(self, src, dst, verify=False):
+        """
+        Copies src to dst. A reflink or hardlink of src takes constant time, so it is tried first without hashing.
+        Otherwise dst is linked from an existing copy with identical content if there is one, or stream copied.
+
+        With verify, dst is hashed and compared with src; a mismatch removes dst and raises OSError.
+        """
+        src_stat = src.stat()
+        if dst.exists():
+            dst.unlink()
+        dst.parent.mkdir(parents=True, exist_ok=True)
+
+        content_hash = None
+        if try_reflink(src, dst):
+            os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            method = "reflink"
+        elif try_hardlink(src, dst):
+            method = "hardlink"
+        else:
+            existing, content_hash = self._find_identical(src, src_stat.st_size)
+            if existing is not None:
+                method = copy_fast(Path(self.root_dir, existing), dst)
+            else:
+                stream_copy(src, dst)
+                method = "copy"
+
+        if verify:
+            content_hash = content_hash or hash_file(src)
+            if hash_file(dst) != content_hash:
+                dst.unlink()
+                raise OSError(f"Copy of {src} to {dst} does not match the source")
+
+        self._add_entry(src, dst, src_stat, content_hash, method)
+        return method
+
+    def _add_entry(self, src, dst, src_stat, content_hash, method):
+        key = str(dst.relative_to(self.root_dir))
+        self.entries[key] = {
+            "src": str(src),
+            "size": src_stat.st_size,
+            "mtime_ns": src_stat.st_mtime_ns,
+            "hash": content_hash,
+            "method": method,
+        }
+        self.by_size.setdefault(src_stat.st_size, set()).add(key)
+        if content_hash:
+            self.by_hash[content_hash] = key
+
+
+def copy_files(pairs, root_dir, dry_run=False, verify=False):
+    """
+    Copies each (src, dst) pair into root_dir, skipping ones that are already there. With verify, each copy is hashed
+    and compared with its source.
+
+    Returns the number of bytes that were (or, with dry_run, would be) copied.
+    """
+    manifest = CopyManifest(root_dir)
+    num_bytes = 0
+    try:
+        for src, dst in pairs:
+            if manifest.is_copied(src, dst):
+                continue
+            num_bytes += src.stat().st_size
+            if dry_run:
+                print(f"Would copy {src} -> {dst}")
+            else:
+                manifest.copy(src, dst, verify)
+    finally:
+        if not dry_run:
+            manifest.save()
+    return num_bytes
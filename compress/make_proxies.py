@@ -0,0 +1,193 @@
+# Low-res proxy videos and a contact sheet per trial, for browsing trials without opening full resolution videos
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from verify import get_num_frames
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from trial_catalog import TrialCatalog, STATE_RECORDING, PROXY_DIR_NAME
+from video_writers import make_writer
+
+PROXY_SIZE = 240  # (px) Width and height of each proxy
+PROXY_FPS = 25
+SOURCE_FPS = 100  # Every SOURCE_FPS // PROXY_FPS-th frame is kept, so proxies play back in real time
+SHEET_COLUMNS = 8  # Thumbnails per camera in the contact sheet, evenly spaced through the trial
+SHEET_NAME = "contact_sheet.jpg"
+MANIFEST_NAME = "manifest.json"
+CAMERA_ORDER = ["camTL", "camTo", "camTR", "camBL", "camBo", "camBR"]  # Contact sheet rows; other cameras go last
+
+
+def proxy_dir(trial_dir):
+    """<date>/cameras_proxy/<trial> for <date>/cameras/<trial>."""
+    trial_dir = Path(trial_dir)
+    return Path(trial_dir.parents[1], PROXY_DIR_NAME, trial_dir.name)
+
+
+def _source_key(mp4_path):
+    stat = Path(mp4_path).stat()
+    return [str(mp4_path), stat.st_size, stat.st_mtime_ns]
+
+
+def make_camera_proxy(mp4_path, out_path, backend="ffmpeg"):
+    """
+    Writes a PROXY_SIZE, PROXY_FPS copy of one camera. Returns (num_frames, thumbnails) where thumbnails are
+    SHEET_COLUMNS proxy frames spaced evenly through the video, taken during the same decode.
+
+    Skipped frames are only grabbed (decoded, not converted), and kept frames are resized before anything else.
+    """
+    step = max(1, SOURCE_FPS // PROXY_FPS)
+    num_source = get_num_frames(mp4_path)
+    thumb_idx = set(np.linspace(0, max(0, num_source - 1), SHEET_COLUMNS).astype(int) // step * step)
+
+    writer = make_writer(backend, out_path, PROXY_FPS, PROXY_SIZE, PROXY_SIZE)
+    cap = cv2.VideoCapture(str(mp4_path))
+    thumbnails = []
+    frame_idx = 0
+    while cap.grab():
+        if frame_idx % step == 0:
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            if frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame = cv2.resize(frame, (PROXY_SIZE, PROXY_SIZE), interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+            if frame_idx in thumb_idx:
+                thumbnails.append(frame)
+        frame_idx += 1
+    cap.release()
+    if not writer.release():
+        raise IOError(f"Writing {out_path} failed")
+    return writer.frames_written, thumbnails
+
+
+def make_contact_sheet(thumbnails_by_cam, out_path):
+    """One row of thumbnails per camera, labelled with the camera name."""
+    cams = sorted(thumbnails_by_cam, key=lambda c: (CAMERA_ORDER.index(c) if c in CAMERA_ORDER else len(CAMERA_ORDER), c))
+    sheet = np.zeros((len(cams) * PROXY_SIZE, SHEET_COLUMNS * PROXY_SIZE), dtype=np.uint8)
+    for row, cam in enumerate(cams):
+        for col, thumb in enumerate(thumbnails_by_cam[cam][:SHEET_COLUMNS]):
+            sheet[row * PROXY_SIZE : (row + 1) * PROXY_SIZE, col * PROXY_SIZE : (col + 1) * PROXY_SIZE] = thumb
+        cv2.putText(sheet, cam, (6, row * PROXY_SIZE + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 255, 2, cv2.LINE_AA)
+    cv2.imwrite(str(out_path), sheet, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+
+def make_trial_proxies(trial_dir, videos, backend="ffmpeg"):
+    """
+    Runs in a worker process. Writes the proxies and contact sheet of one trial and returns its manifest entry.
+
+    videos maps camera name to source mp4.
+    """
+    start_time = time.perf_counter()
+    out_dir = proxy_dir(trial_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    entry = {"trial": str(trial_dir), "cameras": {}}
+    thumbnails_by_cam = {}
+    for cam, mp4_path in sorted(videos.items()):
+        out_path = Path(out_dir, f"{cam}.mp4")
+        tmp_path = Path(out_dir, f"{cam}.tmp.mp4")
+        num_frames, thumbnails_by_cam[cam] = make_camera_proxy(mp4_path, tmp_path, backend)
+        os.replace(tmp_path, out_path)
+        entry["cameras"][cam] = {"source": _source_key(mp4_path), "proxy": str(out_path), "num_frames": num_frames}
+
+    make_contact_sheet(thumbnails_by_cam, Path(out_dir, SHEET_NAME))
+    entry["contact_sheet"] = str(Path(out_dir, SHEET_NAME))
+    entry["process_s"] = round(time.perf_counter() - start_time, 2)
+    return entry
+
+
+def find_trial_videos(catalog, date):
+    """
+    {trial_dir: {camera: mp4}} of the closed trials of a date, preferring the compressed <cam>.mp4. Each trial_dir is
+    on the primary save location, and its cameras may be on any location.
+    """
+    trials = {}
+    recording = set()
+    for r in catalog.query(date=date, kind="video"):
+        path = Path(r["path"])
+        if path.parent.parent.name != "cameras":
+            continue
+        trial_dir = catalog.primary_path(path.parent)
+        if r["state"] == STATE_RECORDING:
+            recording.add(trial_dir)
+        cameras = trials.setdefault(trial_dir, {})
+        if r["camera"] not in cameras or not path.stem.endswith("-orig"):
+            cameras[r["camera"]] = path
+    return {trial_dir: cameras for trial_dir, cameras in trials.items() if trial_dir not in recording}
+
+
+def read_manifest(manifest_path):
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def make_day_proxies(save_location, date, max_workers=None, backend="ffmpeg", rerun=False):
+    """
+    Makes proxies for every closed trial of a date whose sources changed since the manifest was written.
+
+    The manifest, <date>/cameras_proxy/manifest.json, maps each trial name to its proxies, contact sheet and the size
+    and mtime of the source of each proxy. It is rewritten as each trial finishes, so an interrupted run keeps its
+    progress.
+    """
+    catalog = TrialCatalog(save_location)
+    catalog.refresh(Path(save_location, date))
+    trials = find_trial_videos(catalog, date)
+    catalog.close()
+
+    manifest_path = Path(save_location, date, PROXY_DIR_NAME, MANIFEST_NAME)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(manifest_path)
+
+    todo = {}
+    for trial_dir, videos in trials.items():
+        entry = manifest.get(trial_dir.name)
+        done = entry is not None and set(entry["cameras"]) == set(videos)
+        done = done and all(entry["cameras"][cam]["source"] == _source_key(p) for cam, p in videos.items())
+        if rerun or not done:
+            todo[trial_dir] = videos
+    print(f"{date}: {len(trials)} trials, {len(trials) - len(todo)} with up to date proxies, {len(todo)} to process")
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(make_trial_proxies, t, v, backend): t for t, v in sorted(todo.items())}
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"Error making proxies for {futures[future]}: {e}")
+                continue
+            manifest[futures[future].name] = entry
+            write_manifest(manifest_path, manifest)
+    print(f"{date}: made proxies for {len(todo)} trials in {round(time.perf_counter() - start_time, 1)} s")
+    return manifest
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Make low-res proxies and contact sheets of recorded trials.")
+    parser.add_argument("dates", nargs="*", help="e.g. 2024-09-05 (default: every date)")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--backend", default="ffmpeg", choices=["ffmpeg", "opencv"], help="Video writer")
+    parser.add_argument("--rerun", action="store_true", help="Remake proxies even if they are up to date")
+    args = parser.parse_args()
+
+    dates = args.dates or sorted(d.name for d in Path(args.root).glob("*-*-*") if d.is_dir())
+    for date in dates:
+        make_day_proxies(Path(args.root), date, args.workers, args.backend, args.rerun)
@@ -0,0 +1,321 @@
+# Frame-count verification for mp4 files without spawning ffprobe
+from pathlib import Path
+import struct
+import subprocess
+import threading
+
+# Probe results are cached by (path, size, mtime) so that a file is only read once until it changes
+_probe_cache = {}
+_probe_cache_lock = threading.Lock()
+
+# Input and output durations may differ by this many frame periods (encoders differ in the last frame's duration)
+DURATION_TOLERANCE_FRAMES = 1.0
+
+
+class Mp4Info:
+    """Summary of the first video track of an mp4, read from the container index (moov box)."""
+
+    def __init__(self, num_frames, duration, timescale, keyframes=None, pts=None, sample_entry=None):
+        self.num_frames = num_frames
+        self.duration = duration  # (s)
+        self.timescale = timescale
+        self.keyframes = keyframes  # 0-based frame indices of sync samples; None means every frame is a keyframe
+        self.pts = pts  # Presentation time (s) of each frame in display order; only read if requested
+        self.sample_entry = sample_entry  # SampleEntry of the track (codec, size, decoder configuration)
+
+    def __repr__(self):
+        return f"Mp4Info(num_frames={self.num_frames}, duration={round(self.duration, 3)})"
+
+
+def _iter_boxes(f, start, end):
+    """Yields (box_type, payload_start, box_end) for each box between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos  # Box extends to end of file
+        if size < header_size:
+            return  # Corrupt or still being written
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _find_boxes(f, start, end, box_type):
+    return [(s, e) for t, s, e in _iter_boxes(f, start, end) if t == box_type]
+
+
+def _read_full_box(f, start, end):
+    f.seek(start)
+    return f.read(end - start)
+
+
+class SampleEntry:
+    """Codec parameters of a video track, from its sample description (stsd). Streams can only be joined by stream
+    copy if these are equal."""
+
+    def __init__(self, codec, width, height, decoder_config):
+        self.codec = codec  # Sample entry type, e.g. "avc1" or "mp4v"
+        self.width = width
+        self.height = height
+        self.decoder_config = decoder_config  # Bytes the decoder is initialized with (avcC/hvcC, or the mp4v VOL header)
+
+    def __eq__(self, other):
+        return isinstance(other, SampleEntry) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return f"SampleEntry(codec={self.codec}, width={self.width}, height={self.height}, decoder_config={len(self.decoder_config)} bytes)"
+
+
+def _read_descriptor(data, pos):
+    """Reads an MPEG-4 descriptor header (tag, then a length of up to 4 bytes). Returns (tag, payload_start, end)."""
+    tag = data[pos]
+    length = 0
+    pos += 1
+    for _ in range(4):
+        byte = data[pos]
+        pos += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, pos, pos + length
+
+
+def _esds_decoder_specific_info(esds):
+    """
+    The DecoderSpecificInfo of an esds box. The rest of the box (e.g. the average bitrate) differs between files
+    that can still be joined, so only this part is compared.
+    """
+    tag, pos, end = _read_descriptor(esds, 4)  # ES_Descriptor, after version and flags
+    if tag != 0x03:
+        return b""
+    flags = esds[pos + 2]
+    pos += 3  # ES_ID and flags
+    if flags & 0x80:
+        pos += 2  # dependsOn_ES_ID
+    if flags & 0x40:
+        pos += 1 + esds[pos]  # URL
+    if flags & 0x20:
+        pos += 2  # OCR_ES_ID
+    tag, pos, end = _read_descriptor(esds, pos)
+    if tag != 0x04:
+        return b""
+    pos += 13  # DecoderConfigDescriptor fields: object type, stream type, buffer size and bitrates
+    while pos < end:
+        tag, payload_start, payload_end = _read_descriptor(esds, pos)
+        if tag == 0x05:
+            return esds[payload_start:payload_end]
+        pos = payload_end
+    return b""
+
+
+def _read_sample_entry(f, stbl_start, stbl_end):
+    """Reads the first entry of the sample description box."""
+    stsd = _find_boxes(f, stbl_start, stbl_end, b"stsd")
+    if not stsd:
+        return None
+    stsd_start, stsd_end = stsd[0]
+    for entry_type, entry_start, entry_end in _iter_boxes(f, stsd_start + 8, stsd_end):
+        f.seek(entry_start + 24)  # Reserved and pre-defined fields come before the size
+        width, height = struct.unpack(">HH", f.read(4))
+        decoder_config = b""
+        for child_type, child_start, child_end in _iter_boxes(f, entry_start + 78, entry_end):
+            if child_type in (b"avcC", b"hvcC", b"av1C", b"vpcC"):
+                decoder_config = _read_full_box(f, child_start, child_end)
+            elif child_type == b"esds":
+                decoder_config = _esds_decoder_specific_info(_read_full_box(f, child_start, child_end))
+        return SampleEntry(entry_type.decode("latin-1"), width, height, decoder_config)
+    return None
+
+
+def _read_pts(f, stbl_start, stbl_end, num_frames, timescale):
+    """Presentation time (s) of each frame, from the decoding time (stts) and composition offset (ctts) tables."""
+    data = _read_full_box(f, *_find_boxes(f, stbl_start, stbl_end, b"stts")[0])
+    (entry_count,) = struct.unpack(">I", data[4:8])
+    entries = struct.unpack(f">{2 * entry_count}I", data[8 : 8 + 8 * entry_count])
+    times = []
+    t = 0
+    for count, delta in zip(entries[::2], entries[1::2]):
+        for _ in range(count):
+            times.append(t)
+            t += delta
+
+    # Composition offsets are only present when frames are stored out of display order (e.g. B-frames)
+    ctts = _find_boxes(f, stbl_start, stbl_end, b"ctts")
+    if ctts:
+        data = _read_full_box(f, *ctts[0])
+        version = data[0]
+        (entry_count,) = struct.unpack(">I", data[4:8])
+        entries = struct.unpack(f">{2 * entry_count}{'i' if version == 1 else 'I'}", data[8 : 8 + 8 * entry_count])
+        i = 0
+        for count, offset in zip(entries[::2], entries[1::2]):
+            for _ in range(count):
+                if i < len(times):
+                    times[i] += offset
+                i += 1
+    return [t / timescale for t in sorted(times[:num_frames])]
+
+
+def _parse_video_track(f, trak_start, trak_end, with_pts=False):
+    """Returns Mp4Info for a trak box if it is a video track, otherwise None."""
+    mdia = _find_boxes(f, trak_start, trak_end, b"mdia")
+    if not mdia:
+        return None
+    mdia_start, mdia_end = mdia[0]
+
+    # Handler type identifies video tracks ("vide")
+    hdlr = _find_boxes(f, mdia_start, mdia_end, b"hdlr")
+    if not hdlr or _read_full_box(f, *hdlr[0])[8:12] != b"vide":
+        return None
+
+    # Media header holds timescale and duration
+    mdhd = _read_full_box(f, *_find_boxes(f, mdia_start, mdia_end, b"mdhd")[0])
+    if mdhd[0] == 1:
+        timescale, duration = struct.unpack(">IQ", mdhd[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", mdhd[12:20])
+
+    # Sample table holds one entry per frame
+    minf_start, minf_end = _find_boxes(f, mdia_start, mdia_end, b"minf")[0]
+    stbl_start, stbl_end = _find_boxes(f, minf_start, minf_end, b"stbl")[0]
+    stsz = _find_boxes(f, stbl_start, stbl_end, b"stsz")
+    if stsz:
+        f.seek(stsz[0][0] + 8)
+        num_frames = struct.unpack(">I", f.read(4))[0]
+    else:
+        # Compact sample sizes (stz2) share the same layout for the count
+        stz2 = _find_boxes(f, stbl_start, stbl_end, b"stz2")
+        f.seek(stz2[0][0] + 8)
+        num_frames = struct.unpack(">I", f.read(4))[0]
+
+    # Sync sample table lists keyframes (1-based); absent means all frames are keyframes
+    keyframes = None
+    stss = _find_boxes(f, stbl_start, stbl_end, b"stss")
+    if stss:
+        data = _read_full_box(f, *stss[0])
+        (entry_count,) = struct.unpack(">I", data[4:8])
+        keyframes = [k - 1 for k in struct.unpack(f">{entry_count}I", data[8 : 8 + 4 * entry_count])]
+
+    pts = _read_pts(f, stbl_start, stbl_end, num_frames, timescale) if with_pts and timescale else None
+    sample_entry = _read_sample_entry(f, stbl_start, stbl_end)
+    return Mp4Info(num_frames, duration / timescale if timescale else 0.0, timescale, keyframes, pts, sample_entry)
+
+
+def read_mp4_info(mp4_filename, with_pts=False):
+    """
+    Reads the container index of an mp4 file. Returns None if the file is incomplete (no moov box yet).
+
+    with_pts also reads the presentation time of every frame, which takes longer for long videos.
+    """
+    with open(mp4_filename, "rb") as f:
+        f.seek(0, 2)
+        file_end = f.tell()
+        try:
+            moov = _find_boxes(f, 0, file_end, b"moov")
+            if not moov:
+                return None
+            moov_start, moov_end = moov[0]
+            for trak_start, trak_end in _find_boxes(f, moov_start, moov_end, b"trak"):
+                info = _parse_video_track(f, trak_start, trak_end, with_pts)
+                if info is not None:
+                    return info
+        except (struct.error, IndexError):
+            return None  # Truncated or malformed index
+    return None
+
+
+def probe_mp4(mp4_filename):
+    """Returns cached Mp4Info for a file, re-reading the container index only if size or mtime changed."""
+    mp4_filename = Path(mp4_filename)
+    stat = mp4_filename.stat()
+    key = (str(mp4_filename), stat.st_size, stat.st_mtime_ns)
+
+    with _probe_cache_lock:
+        if key in _probe_cache:
+            return _probe_cache[key]
+
+    info = read_mp4_info(mp4_filename)
+
+    # Incomplete files are not cached since they will change
+    if info is not None:
+        with _probe_cache_lock:
+            _probe_cache[key] = info
+    return info
+
+
+def get_num_frames(mp4_filename):
+    """Number of frames in the first video track, or 0 if the file has no index yet."""
+    info = probe_mp4(mp4_filename)
+    if info is None:
+        return 0
+    return info.num_frames
+
+
+def clear_probe_cache():
+    with _probe_cache_lock:
+        _probe_cache.clear()
+
+
+def run_ffmpeg_with_progress(cmd_list, cwd=None):
+    """
+    Runs an ffmpeg command, reading frame count and duration from its own progress output.
+
+    "-progress pipe:1 -nostats" is added before the output filename so that ffmpeg reports
+    key=value lines on stdout. Returns (returncode, frames_encoded, out_time_s, stderr).
+    """
+    cmd_list = [str(c) for c in cmd_list]
+    cmd_list = cmd_list[:-1] + ["-progress", "pipe:1", "-nostats"] + cmd_list[-1:]
+
+    process = subprocess.Popen(
+        cmd_list,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    # Drain stderr on another thread so that a full pipe never blocks ffmpeg
+    stderr_lines = []
+    stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr))
+    stderr_thread.start()
+
+    frames_encoded = 0
+    out_time_s = 0.0
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        if key == "frame":
+            frames_encoded = int(value)
+        elif key == "out_time_us" and value.isdigit():
+            out_time_s = int(value) / 1e6
+
+    returncode = process.wait()
+    stderr_thread.join()
+
+    return returncode, frames_encoded, out_time_s, "".join(stderr_lines)
+
+
+def verify_equivalent(input_name, output_name, frames_encoded=None, tolerance_frames=DURATION_TOLERANCE_FRAMES):
+    """
+    Confirms input and output have the same (nonzero) number of frames, and durations within tolerance_frames frame
+    periods of each other, so that a truncated or retimed encode does not pass.
+
+    If frames_encoded (from run_ffmpeg_with_progress) is given, it must also agree with the input.
+    """
+    input_info = probe_mp4(input_name)
+    output_info = probe_mp4(output_name)
+    if input_info is None or output_info is None:
+        return False
+
+    if frames_encoded is not None and frames_encoded != input_info.num_frames:
+        return False
+    if not input_info.num_frames == output_info.num_frames > 0:
+        return False
+    frame_period = input_info.duration / input_info.num_frames
+    return abs(input_info.duration - output_info.duration) <= tolerance_frames * frame_period
@@ -0,0 +1,211 @@
+# Check that the save drive can sustain the configured cameras before recording, and sample its I/O while recording
+from collections import deque
+from pathlib import Path
+import argparse
+import datetime
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import psutil
+
+WRITE_SIZE = 32 * 1024  # (bytes) ffmpeg's I/O buffer, so the size of each write made by both writer backends
+HEADROOM = 2.0  # Measured bandwidth should be at least this multiple of the required bandwidth
+FSYNC_WARNING_MS = 100  # A p99 fsync latency above this stalls catalog and sidecar writes noticeably
+
+# Upper estimates of encoded size per pixel for camera footage; raw frames are 1 byte (mono) or 3 bytes (BGR)
+CODEC_BYTES_PER_PIXEL = {"mp4v": 0.25, "libx264": 0.15, "raw": 1.0}
+
+
+class Stream:
+    """One camera's output: frame rate, size and codec, from which its write bandwidth is estimated."""
+
+    def __init__(self, name, fps, width, height, codec="mp4v", is_color=False):
+        self.name = name
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.codec = codec
+        self.is_color = is_color
+
+    def bytes_per_s(self):
+        bytes_per_pixel = CODEC_BYTES_PER_PIXEL[self.codec] * (3 if self.is_color and self.codec == "raw" else 1)
+        return self.fps * self.width * self.height * bytes_per_pixel
+
+
+def get_remaining_space(path):
+    """Remaining space (GB) on the drive holding path."""
+    usage = psutil.disk_usage(str(path))
+    return round((usage.total - usage.used) / 1e9, 2)
+
+
+def measure_write_bandwidth(path, num_writers, seconds=5.0, write_size=WRITE_SIZE):
+    """
+    Sustained write bandwidth (MB/s) with one thread per camera, each appending write_size blocks to its own file as
+    the writers do. Every file is fsynced before the clock stops, so the page cache does not inflate the result.
+    """
+    data = np.random.default_rng(0).integers(0, 256, write_size, dtype=np.uint8).tobytes()  # Incompressible
+    bytes_written = [0] * num_writers
+    with tempfile.TemporaryDirectory(prefix=".preflight_", dir=path) as tmp_dir:
+
+        def write(idx, deadline):
+            with open(Path(tmp_dir, f"writer_{idx}.bin"), "wb", buffering=0) as f:
+                while time.perf_counter() < deadline:
+                    f.write(data)
+                    bytes_written[idx] += write_size
+                os.fsync(f.fileno())
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=write, args=(i, start + seconds)) for i in range(num_writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    return sum(bytes_written) / 1e6 / elapsed
+
+
+def measure_fsync_latency(path, num_syncs=50, write_size=WRITE_SIZE):
+    """Latency (ms) of write + fsync, as made for sidecars and the catalog. Returns {"p50", "p99", "max"}."""
+    data = os.urandom(write_size)
+    latencies = []
+    with tempfile.TemporaryDirectory(prefix=".preflight_", dir=path) as tmp_dir:
+        with open(Path(tmp_dir, "fsync.bin"), "wb", buffering=0) as f:
+            for _ in range(num_syncs):
+                start = time.perf_counter()
+                f.write(data)
+                os.fsync(f.fileno())
+                latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50": float(np.percentile(latencies, 50)), "p99": float(np.percentile(latencies, 99)), "max": max(latencies)}
+
+
+def preflight(path, streams, seconds=5.0, headroom=HEADROOM):
+    """
+    Measures the drive at path against the bandwidth the streams need. Prints a report and returns a dict with the
+    measurements and "status": "ok", "warn" (less than headroom x the requirement, or slow fsyncs) or "fail" (less
+    than the requirement).
+    """
+    required_MB = sum(s.bytes_per_s() for s in streams) / 1e6
+    measured_MB = measure_write_bandwidth(path, max(len(streams), 1), seconds)
+    fsync_ms = measure_fsync_latency(path)
+
+    print(f"Disk preflight for {path}:")
+    for s in streams:
+        print(f"  {s.name}: {s.fps} fps, {s.width}x{s.height}, {s.codec} -> {round(s.bytes_per_s() / 1e6, 1)} MB/s")
+    print(
+        f"  Required {round(required_MB, 1)} MB/s, measured {round(measured_MB, 1)} MB/s with {len(streams)} writers "
+        f"({round(measured_MB / max(required_MB, 1e-9), 1)}x); fsync p50 {round(fsync_ms['p50'], 1)} ms, "
+        f"p99 {round(fsync_ms['p99'], 1)} ms"
+    )
+
+    result = {"required_MB_per_s": required_MB, "measured_MB_per_s": measured_MB, "fsync_ms": fsync_ms, "status": "ok"}
+    if measured_MB < required_MB:
+        print("ERROR: The drive cannot sustain the configured cameras; frames would back up in memory.")
+        result["status"] = "fail"
+    elif measured_MB < headroom * required_MB:
+        print(f"WARNING: Less than {headroom}x headroom over the required bandwidth.")
+        result["status"] = "warn"
+    elif fsync_ms["p99"] > FSYNC_WARNING_MS:
+        print(f"WARNING: fsync p99 is over {FSYNC_WARNING_MS} ms.")
+        result["status"] = "warn"
+    return result
+
+
+def find_device(path):
+    """Name of the block device holding path, as used by psutil.disk_io_counters (e.g. "nvme0n1p1" or "dm-0")."""
+    path = os.path.realpath(path)
+    best = None
+    for partition in psutil.disk_partitions(all=False):
+        mountpoint = partition.mountpoint
+        if (path == mountpoint or path.startswith(mountpoint.rstrip("/") + "/")) and (
+            best is None or len(mountpoint) > len(best.mountpoint)
+        ):
+            best = partition
+    if best is None:
+        return None
+    device = os.path.basename(os.path.realpath(best.device))
+    return device if device in psutil.disk_io_counters(perdisk=True) else None
+
+
+class DiskIOSampler:
+    """
+    Samples the save drive's I/O counters, and the length of the saving queues, every interval while recording.
+
+    Each sample is appended to a CSV, so that a stall (queues backing up) can be attributed: a busy drive with long
+    write waits means the disk is the bottleneck; an idle drive means the saving threads are (e.g. encoding).
+    """
+
+    def __init__(self, path, csv_path, queues=(), interval=1.0, queue_warning=50):
+        self.device = find_device(path)
+        self.csv_path = Path(csv_path)
+        self.queues = list(queues)
+        self.interval = interval
+        self.queue_warning = queue_warning
+        self.samples = deque(maxlen=3600)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.device is None:
+            print("Disk I/O sampling disabled: no block device found for the save location")
+            return
+        self.csv_path.parent.mkdir(parents=True, exist_ok=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _run(self):
+        previous = psutil.disk_io_counters(perdisk=True)[self.device]
+        previous_time = time.perf_counter()
+        with open(self.csv_path, "a") as f:
+            if f.tell() == 0:
+                f.write("time,write_MB_per_s,writes_per_s,write_wait_ms,busy_percent,max_queue\n")
+            while not self.stop_event.wait(self.interval):
+                now = time.perf_counter()
+                counters = psutil.disk_io_counters(perdisk=True)[self.device]
+                dt = now - previous_time
+                num_writes = counters.write_count - previous.write_count
+                sample = {
+                    "time": time.time(),
+                    "write_MB_per_s": (counters.write_bytes - previous.write_bytes) / 1e6 / dt,
+                    "writes_per_s": num_writes / dt,
+                    "write_wait_ms": (counters.write_time - previous.write_time) / num_writes if num_writes else 0.0,
+                    "busy_percent": min(100.0, (getattr(counters, "busy_time", 0) - getattr(previous, "busy_time", 0)) / 10 / dt),
+                    "max_queue": max((q.qsize() for q in self.queues), default=0),
+                }
+                self.samples.append(sample)
+                f.write(",".join(str(round(v, 3)) for v in sample.values()) + "\n")
+                f.flush()
+                previous, previous_time = counters, now
+
+                if sample["max_queue"] > self.queue_warning:
+                    cause = "disk is saturated" if sample["busy_percent"] > 90 else "disk is not busy, saving threads are behind"
+                    print(
+                        f"\nSaving queues at {sample['max_queue']} frames: {cause} ({round(sample['write_MB_per_s'], 1)} MB/s, "
+                        f"{round(sample['busy_percent'])}% busy, {round(sample['write_wait_ms'], 1)} ms per write)"
+                    )
+
+
+def disk_io_csv_path(save_location):
+    return Path(save_location, datetime.date.today().strftime("%Y-%m-%d"), "disk_io.csv")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Check that a drive can sustain a set of cameras.")
+    parser.add_argument("--path", default="/mnt/Data4TB", help="Save location to test")
+    parser.add_argument("--cameras", type=int, default=6)
+    parser.add_argument("--fps", type=float, default=100.0)
+    parser.add_argument("--width", type=int, default=960)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--codec", default="mp4v", choices=list(CODEC_BYTES_PER_PIXEL))
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    streams = [Stream(f"cam{i}", args.fps, args.width, args.height, args.codec) for i in range(args.cameras)]
+    print(f"Free space: {get_remaining_space(args.path)} GB")
+    print(preflight(args.path, streams, args.seconds)["status"])
@@ -0,0 +1,102 @@
+# Latest frame of each camera in shared memory, written by the recorder and read by viewers in other processes
+from multiprocessing import resource_tracker, shared_memory
+import json
+import time
+import numpy as np
+
+SHM_NAME = "flir_latest_frames"
+HEADER_BYTES = 4096  # JSON layout description, zero padded
+SLOT_META = 3  # Per slot: sequence number, frame index, host time (stored as float64)
+PUBLISH_INTERVAL = 1 / 30  # (s) Each camera publishes at most this often; viewers do not need 100 fps
+
+
+def _attach(name):
+    """Opens an existing segment without registering it for cleanup, so a viewer exiting does not remove it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class LatestFrames:
+    """
+    One slot per camera holding its most recent frame, plus a sequence number per slot.
+
+    The writer makes the sequence number odd while it copies a frame and even when done, so a reader can tell that a
+    frame changed, or that it was read mid-copy and should be read again, without any lock between processes.
+    """
+
+    def __init__(self, shm, cams, shape):
+        self.shm = shm
+        self.cams = list(cams)
+        self.shape = tuple(shape)
+        num = len(self.cams)
+        self.meta = np.ndarray((num, SLOT_META), dtype=np.float64, buffer=shm.buf, offset=HEADER_BYTES)
+        self.frames = np.ndarray((num,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=HEADER_BYTES + self.meta.nbytes)
+        self.last_publish = np.zeros(num)
+
+    @classmethod
+    def create(cls, cams, shape, name=SHM_NAME):
+        """Creates the segment for the recorder, replacing one left behind by a recorder that did not exit cleanly."""
+        header = json.dumps({"cams": list(cams), "shape": list(shape)}).encode()
+        size = HEADER_BYTES + len(cams) * (SLOT_META * 8 + int(np.prod(shape)))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[: len(header)] = header
+        latest = cls(shm, cams, shape)
+        latest.meta[:] = 0
+        return latest
+
+    @classmethod
+    def attach(cls, name=SHM_NAME):
+        """Opens the recorder's segment. Raises FileNotFoundError if the recorder is not running."""
+        shm = _attach(name)
+        header = json.loads(bytes(shm.buf[:HEADER_BYTES]).rstrip(b"\x00"))
+        return cls(shm, header["cams"], header["shape"])
+
+    def publish(self, cam, frame, frame_idx):
+        """Copies a frame into the camera's slot, at most once per PUBLISH_INTERVAL. Returns True if it was copied."""
+        now = time.time()
+        slot = self.cams.index(cam)
+        if now - self.last_publish[slot] < PUBLISH_INTERVAL or frame.shape != self.shape:
+            return False
+        self.last_publish[slot] = now
+        meta = self.meta[slot]
+        meta[0] += 1  # Odd: copy in progress
+        self.frames[slot] = frame
+        meta[1] = frame_idx
+        meta[2] = now
+        meta[0] += 1
+        return True
+
+    def sequence(self, slot):
+        return int(self.meta[slot, 0])
+
+    def read(self, slot, out, step=1, retries=3):
+        """
+        Copies the latest frame of a slot into out (subsampled by step). Returns (sequence, frame_idx, host_time), or
+        None if every attempt overlapped a write.
+        """
+        for _ in range(retries):
+            seq = self.sequence(slot)
+            if seq % 2:
+                continue
+            out[:] = self.frames[slot, ::step, ::step]
+            frame_idx, host_time = self.meta[slot, 1], self.meta[slot, 2]
+            if self.sequence(slot) == seq:
+                return seq, int(frame_idx), host_time
+        return None
+
+    def close(self, unlink=False):
+        # The arrays must be released before the buffer can be closed
+        del self.meta, self.frames
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
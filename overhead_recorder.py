@@ -0,0 +1,146 @@
+# Recorder for the software-triggered overhead camera: frame-rate-locked capture into time-based mp4 segments
+from pathlib import Path
+import datetime
+import queue
+import threading
+import time
+import numpy as np
+from camera_frames import frame_from_image, debayer
+from trial_catalog import TrialCatalog, CatalogWriter, STATE_RECORDING, STATE_CLOSED, BATCH_TIME_FORMAT, frame_times_path
+from video_writers import make_writer
+
+SEGMENT_SECONDS = 600  # (s) A new segment is started after this much wall-clock time
+QUEUE_WARNING = 30  # Frames waiting to be saved before a warning is printed
+
+
+class OverheadRecorder:
+    """
+    Captures a free-running camera (PySpin, or camera_frames.SimulatedCamera) and saves it as a series of segments:
+
+    <save_location>/<date>/<cam_name>/<segment start>/<cam_name>.mp4 and <cam_name>_frame_times.txt
+
+    Segments are named by the host time of their first frame, so no existing directories are scanned at start, and
+    every segment is written with the same writer settings, so they can be joined by stream copy. Frame times use the
+    same clock (time.time()) and sidecar as the high-speed cameras, and segments are recorded in the trial catalog.
+    """
+
+    def __init__(
+        self,
+        camera,
+        cam_name,
+        fps,
+        save_location,
+        width=1920,
+        height=1200,
+        bayer=True,
+        color=True,
+        backend="opencv",
+        writer_kwargs=None,
+        segment_seconds=SEGMENT_SECONDS,
+        grab_timeout_ms=250,
+        grab_errors=(Exception,),
+        save_queue=None,
+        display_queues=(),
+    ):
+        self.camera = camera
+        self.cam_name = cam_name
+        self.fps = fps
+        self.save_location = Path(save_location)
+        self.width = width
+        self.height = height
+        self.bayer = bayer  # Raw frames are Bayer RG and are debayered before saving
+        self.color = color  # Save BGR, otherwise gray
+        self.backend = backend
+        self.writer_kwargs = writer_kwargs or {}
+        self.segment_seconds = segment_seconds
+        self.grab_timeout_ms = grab_timeout_ms
+        self.grab_errors = grab_errors  # Exceptions from GetNextImage that mean "no frame yet"
+        self.display_queues = list(display_queues)
+
+        self.save_queue = save_queue if save_queue is not None else queue.Queue()
+        self.catalog = CatalogWriter(TrialCatalog(self.save_location))  # Saving never waits on the database
+        self.segments = []  # (mp4 path, number of frames) of each closed segment
+        self.frames_captured = 0
+
+    def capture(self, stop_event):
+        """Grabs frames until stop_event is set. Each frame is copied once and shared by the saving and display queues."""
+        self.camera.BeginAcquisition()
+        while not stop_event.is_set():
+            try:
+                image_result = self.camera.GetNextImage(self.grab_timeout_ms)
+            except self.grab_errors:
+                continue
+            host_time = time.time()
+            if image_result.IsIncomplete():
+                print(f"[{self.cam_name}] Image incomplete with image status {image_result.GetImageStatus()}")
+                image_result.Release()
+                continue
+
+            frame = frame_from_image(image_result)
+            self.save_queue.put((frame, host_time, ""))
+            for q in self.display_queues:
+                q.put((frame, host_time, ""))
+            self.frames_captured += 1
+
+        self.camera.EndAcquisition()
+        self.save_queue.put((None, None, None))
+
+    def _open_segment(self, host_time):
+        segment_name = datetime.datetime.fromtimestamp(host_time).strftime(BATCH_TIME_FORMAT)
+        mp4_path = Path(self.save_location, segment_name[:10], self.cam_name, segment_name, f"{self.cam_name}.mp4")
+        mp4_path.parent.mkdir(parents=True, exist_ok=True)
+        writer = make_writer(self.backend, mp4_path, self.fps, self.width, self.height, is_color=self.color, **self.writer_kwargs)
+        self.catalog.record_file(mp4_path, STATE_RECORDING)
+        return writer, mp4_path
+
+    def _close_segment(self, writer, mp4_path, frame_times):
+        writer.release()
+        np.savetxt(frame_times_path(mp4_path), frame_times, fmt="%.6f")
+        self.catalog.record_file(mp4_path, STATE_CLOSED, num_frames=len(frame_times))
+        self.segments.append((mp4_path, len(frame_times)))
+
+        # Frames more than 1.5 periods apart mean the camera or the capture thread missed a frame
+        intervals = np.diff(frame_times)
+        num_missed = int(np.sum(np.round(intervals[intervals > 1.5 / self.fps] * self.fps) - 1)) if len(intervals) else 0
+        duration = frame_times[-1] - frame_times[0] if len(frame_times) > 1 else 0
+        measured_fps = (len(frame_times) - 1) / duration if duration > 0 else 0
+        print(
+            f"[{self.cam_name}] Segment {mp4_path.parent.name}: {len(frame_times)} frames, "
+            f"{round(measured_fps, 2)} fps, {num_missed} missed"
+        )
+
+    def save(self):
+        """Writes queued frames, starting a new segment every segment_seconds. Returns when capture has finished."""
+        writer, mp4_path, frame_times = None, None, []
+        segment_start = None
+        while True:
+            frame, host_time, _ = self.save_queue.get()
+            if frame is None:
+                break
+            if self.save_queue.qsize() > QUEUE_WARNING:
+                print(f"[{self.cam_name}] Save queue length: {self.save_queue.qsize()}")
+
+            if writer is None or host_time - segment_start >= self.segment_seconds:
+                if writer is not None:
+                    self._close_segment(writer, mp4_path, frame_times)
+                writer, mp4_path = self._open_segment(host_time)
+                frame_times = []
+                segment_start = host_time
+
+            writer.write(debayer(frame, self.color) if self.bayer else frame)
+            frame_times.append(host_time)
+
+        if writer is not None:
+            self._close_segment(writer, mp4_path, frame_times)
+
+    def run(self, stop_event):
+        """Captures and saves on two threads until stop_event is set, then finishes saving and returns."""
+        threads = [
+            threading.Thread(target=self.capture, args=(stop_event,)),
+            threading.Thread(target=self.save),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.catalog.close()
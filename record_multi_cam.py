@@ -1,5 +1,4 @@
 import PySpin
-import psutil
 import threading
 import queue
 import time
@@ -12,6 +11,9 @@ from record_multi_cam_params import (
     CAMERA_NAMES_DICT_MONO,
     CAMERA_SPECIFIC_DICT,
     SAVE_LOCATION,
+    SAVE_LOCATIONS,
+    SAVE_PLACEMENT,
+    CAMERA_SAVE_LOCATIONS,
     SAVE_PREFIX,
     GRAB_TIMEOUT,
     NUM_THREADS_PER_CAM,
@@ -20,11 +22,29 @@ from record_multi_cam_params import (
     VIDEO_FPS,
     VIDEO_WIDTH,
     VIDEO_HEIGHT,
+    VIDEO_WRITER_BACKEND,
     CAMERA_OVERHEAD_LIST,
+    OVERHEAD_FPS,
+    OVERHEAD_WIDTH,
+    OVERHEAD_HEIGHT,
+    OVERHEAD_WRITER_BACKEND,
+    DISK_PREFLIGHT,
+    DISK_PREFLIGHT_SECONDS,
+    DISK_IO_SAMPLE_INTERVAL,
+    STATE_LISTENER_PORT,
+    STATE_LISTENER_HOST,
+    PUBLISH_LATEST_FRAMES,
 )
 import cv2
 import numpy as np
 from record_single_cam import record_cam_sw, display_frame_from_queues
+from trial_catalog import TrialCatalog, CatalogWriter, STATE_RECORDING, STATE_CLOSED, BATCH_TIME_FORMAT, frame_times_path, resolve_path
+from save_targets import SaveTargets
+from state_listener import StateListener
+from latest_frames import LatestFrames
+from camera_frames import frame_from_image, debayer
+from video_writers import make_writer
+from disk_preflight import Stream, preflight, get_remaining_space, DiskIOSampler, disk_io_csv_path
 
 ############################################
 ### Global variables used across threads ###
@@ -36,9 +56,31 @@ SAVING_DONE_FLAG = False  # Flag for signaling that all queued images have been
 # Images are grouped into batches. New batches are created when a new image is acquired more than MIN_BATCH_INTERVAL from the previous image.
 prev_image_timestamp = time.time()  # Timestamp of previous image
 curr_image_timestamp = time.time()  # Timestamp of current image
-batch_dir_name = datetime.datetime.fromtimestamp(curr_image_timestamp).strftime("%Y-%m-%d_%H-%M-%S_%f")
+batch_dir_name = datetime.datetime.fromtimestamp(curr_image_timestamp).strftime(BATCH_TIME_FORMAT)
 lock = threading.Lock()  # Used to lock the batch_dir_name variable when it is being updated
 
+# Host time of each frame, per (camera, batch). Appended by the acquisition threads and written next to each mp4 by the
+# saving threads at the end of the batch, so that frames can be matched to robot state offline.
+FRAME_TIMES = {}
+
+# Catalog of recorded files, updated as each mp4 is opened and closed so that offline tools do not rescan the drive
+CATALOG = TrialCatalog(SAVE_LOCATION, extra_locations=SAVE_LOCATIONS)
+CATALOG_WRITER = CatalogWriter(CATALOG)  # The saving threads write through this, so they never wait on the database
+
+# Save location of each camera's mp4 in each batch, chosen by the saving threads as they open the file
+SAVE_TARGETS = SaveTargets(
+    SAVE_LOCATIONS,
+    SAVE_PLACEMENT,
+    cameras=list(CAMERA_NAMES_DICT_COLOR.values()) + list(CAMERA_NAMES_DICT_MONO.values()),
+    pins=CAMERA_SAVE_LOCATIONS,
+)
+
+# Optional listener for robot state packets, written into each batch directory by the saving threads' open/close calls
+STATE_LISTENER = StateListener(STATE_LISTENER_PORT, STATE_LISTENER_HOST) if STATE_LISTENER_PORT is not None else None
+
+# Latest frame of each camera in shared memory, for viewers in other processes; updated by the saving threads
+LATEST_FRAMES = None
+
 
 ################################
 ### Initialization functions ###
@@ -307,10 +349,11 @@ def acquire_images(cam, image_queue_list):
                         if curr_image_timestamp - prev_image_timestamp > MIN_BATCH_INTERVAL:
                             # Update batch_dir_name to reflect the current timestamp
                             batch_dir_name = datetime.datetime.fromtimestamp(curr_image_timestamp).strftime(
-                                "%Y-%m-%d_%H-%M-%S_%f"
+                                BATCH_TIME_FORMAT
                             )
 
                         prev_image_timestamp = curr_image_timestamp
+                        frame_time = curr_image_timestamp
 
                 except PySpin.SpinnakerException:
                     time.sleep(0.001)  # Allow time on other threads
@@ -328,13 +371,15 @@ def acquire_images(cam, image_queue_list):
                             device_user_ID, image_result.GetImageStatus()
                         )
                     )
+                    image_result.Release()
                 else:
-                    # Add grabbed image to queue, which will be saved by saver threads
-                    image_copy = PySpin.Image.Create(image_result)
-                    # image_queue.put((frame_idx, image_copy))
+                    # Add grabbed image to queue, which will be saved by saver threads. The image is copied once into
+                    # a read-only array and released before queueing; every queue shares that array.
+                    frame = frame_from_image(image_result)
+                    batch_dir = batch_dir_name
                     for q in image_queue_list:
-                        q.put((image_copy, frame_idx, batch_dir_name))
-                    image_result.Release()
+                        q.put((frame, frame_idx, batch_dir))
+                    FRAME_TIMES.setdefault((device_user_ID, batch_dir), []).append(frame_time)
                     frame_idx += 1
 
             except PySpin.SpinnakerException as ex:
@@ -350,11 +395,26 @@ def acquire_images(cam, image_queue_list):
         return
 
 
+def finish_video(cam_name, out, savename, batch_dir, num_frames, save_location):
+    """Releases a camera's video of a batch and writes its frame times, listener end, catalog row and placement."""
+    out.release()
+    frame_times = FRAME_TIMES.pop((cam_name, batch_dir), [])
+    np.savetxt(frame_times_path(savename), frame_times, fmt="%.6f")
+    if STATE_LISTENER is not None:
+        # Every open_batch is matched, even without frame times, so the listener can finalize the batch
+        t_end = frame_times[-1] if len(frame_times) > 0 else time.time()
+        STATE_LISTENER.close_batch(Path(save_location, batch_dir[:10], "cameras", batch_dir), t_end)
+    CATALOG_WRITER.record_file(savename, STATE_CLOSED, num_frames=num_frames)
+    SAVE_TARGETS.release(cam_name, batch_dir)
+
+
 def save_mp4(cam_name, image_queue, save_location):
-    """Saves images that are in the image_queue to a mp4 file."""
+    """
+    Saves images that are in the image_queue to a mp4 file, on the location chosen by SAVE_TARGETS. State logs go in
+    the batch directory on save_location (the primary location).
+    """
 
     # Video parameters
-    codec = "mp4v"
     FPS = VIDEO_FPS
     WIDTH = VIDEO_WIDTH
     HEIGHT = VIDEO_HEIGHT
@@ -374,36 +434,43 @@ def save_mp4(cam_name, image_queue, save_location):
                 continue
 
             # Handle different types of values sent to queue
-            if type(frame_copy) == type(None):
-                break  # Exit loop if "None" is received
-            elif type(frame_copy) == type("end_of_batch"):
-                out.release()
+            if type(frame_copy) == type(None) or type(frame_copy) == type("end_of_batch"):
+                # "None" at shutdown may arrive mid-batch, so the open video is finished the same way
+                if frame_count > 0:
+                    finish_video(cam_name, out, savename, video_batch_dir, frame_count, save_location)
                 break
-            elif type(frame_copy) == PySpin.ImagePtr:
-
-                # Convert to numpy array
-                frame = frame_copy.GetNDArray()  # Convert to numpy array
+            elif type(frame_copy) == np.ndarray:
+                frame = frame_copy
 
                 # Debayer
                 if cam_name in CAMERA_NAMES_DICT_COLOR.values():
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BayerRG2RGB)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+                    frame = debayer(frame, color=False)
 
             else:
-                raise ValueError("Frame is not None, 'end_of_batch', or PySpin.Image")
+                raise ValueError("Frame is not None, 'end_of_batch', or np.ndarray")
 
             # If first frame, create video writer
             if frame_count == 0:
                 time_start = time.time()
 
-                fourcc = cv2.VideoWriter_fourcc(*codec)
-                savename = Path(save_location, batch_dir[:10], "cameras", batch_dir, f"{cam_name}.mp4")
+                video_batch_dir = batch_dir
+                location = SAVE_TARGETS.location_for(cam_name, batch_dir)
+                savename = Path(location, batch_dir[:10], "cameras", batch_dir, f"{cam_name}.mp4")
                 savename.parent.mkdir(parents=True, exist_ok=True)
-                out = cv2.VideoWriter(str(savename), fourcc, FPS, (WIDTH, HEIGHT), isColor=False)
+                out = make_writer(VIDEO_WRITER_BACKEND, savename, FPS, WIDTH, HEIGHT, is_color=False)
+                CATALOG_WRITER.record_file(savename, STATE_RECORDING)
+                if STATE_LISTENER is not None:
+                    # The batch name is the time of its first frame
+                    batch_start = datetime.datetime.strptime(batch_dir, BATCH_TIME_FORMAT).timestamp()
+                    primary_batch_dir = Path(save_location, batch_dir[:10], "cameras", batch_dir)
+                    primary_batch_dir.mkdir(parents=True, exist_ok=True)
+                    STATE_LISTENER.open_batch(primary_batch_dir, batch_start)
 
             # Add frame to video
             if type(frame) == np.ndarray:
                 out.write(frame)
+                if LATEST_FRAMES is not None:
+                    LATEST_FRAMES.publish(cam_name, frame, frame_idx)
 
             # # If last frame, release video writer
             # if type(frame) == type("end_of_batch"):
@@ -574,11 +641,11 @@ def print_previous_batch_size(cam_names):
         date_dir = batch_dir_name[:10] + "/cameras"
         batch_dir_path = Path(SAVE_LOCATION, date_dir, batch_dir_name)
 
-        # Print status if (1) MIN_BATCH_INTERVAL has passed since the last image was acquired. (2) batch_dir_name has not already had its status printed. (3) batch_dir_path exists i.e. the batch directory has been created and images were saved.
+        # Print status if (1) MIN_BATCH_INTERVAL has passed since the last image was acquired. (2) batch_dir_name has not already had its status printed. (3) batch_dir_path exists on any save location i.e. the batch directory has been created and images were saved.
         if (
             (time.time() - curr_image_timestamp > MIN_BATCH_INTERVAL)
             and (batch_dir_name not in batches_already_reported)
-            and (batch_dir_path.exists())
+            and (len(CATALOG.equivalent_paths(batch_dir_path)) > 0)
         ):
 
             # Wait until mp4 sizes are constant (indicating that the mp4s are done saving)
@@ -588,8 +655,8 @@ def print_previous_batch_size(cam_names):
             DEADLINE = time.time() + wait_time
             while time.time() < DEADLINE:
                 for idx, cam_name in enumerate(cam_names):
-                    mp4_path = Path(batch_dir_path, cam_name + ".mp4")
-                    mp4_sizes_new[idx] = mp4_path.stat().st_size
+                    mp4_path = resolve_path(Path(batch_dir_path, cam_name + ".mp4"))
+                    mp4_sizes_new[idx] = mp4_path.stat().st_size if mp4_path.exists() else 0
 
                 if (mp4_sizes_new == mp4_sizes_old) and (np.array(mp4_sizes_new) != 0).all():
                     break
@@ -617,7 +684,7 @@ def print_previous_batch_size(cam_names):
 
             # Append the number of images saved for each mp4
             for cam_name in cam_names:
-                mp4_path = Path(batch_dir_path, cam_name + ".mp4")
+                mp4_path = resolve_path(Path(batch_dir_path, cam_name + ".mp4"))
                 # Open mp4 file and get number of frames
                 cap = cv2.VideoCapture(str(mp4_path))
                 num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -675,10 +742,10 @@ def display_images_in_queues(image_queues_display):
                 break
             elif type(frame_copy) == type("end_of_batch"):
                 break
-            elif type(frame_copy) == PySpin.ImagePtr:
-                frame = frame_copy.GetNDArray()
+            elif type(frame_copy) == np.ndarray:
+                frame = frame_copy
             else:
-                raise ValueError("Frame is not None, 'end_of_batch', or PySpin.Image")
+                raise ValueError("Frame is not None, 'end_of_batch', or np.ndarray")
 
             last_image_list.append(frame)
 
@@ -783,6 +850,16 @@ def record_high_bandwidth_video(cam_list, list_of_queue_lists):
         print_previous_batch_size_thread = threading.Thread(target=print_previous_batch_size, args=(cam_names,))
         print_previous_batch_size_thread.start()
 
+        # Sample each save drive's I/O alongside the saving queues, so that stalls can be attributed to the disk
+        disk_io_samplers = []
+        if DISK_IO_SAMPLE_INTERVAL is not None:
+            saving_queues = [queue_list[0] for queue_list in list_of_queue_lists]
+            for location in SAVE_LOCATIONS:
+                disk_io_samplers.append(
+                    DiskIOSampler(location, disk_io_csv_path(location), saving_queues, DISK_IO_SAMPLE_INTERVAL)
+                )
+                disk_io_samplers[-1].start()
+
         ######################################################
         ### Loop until ctrl+c indicates the end of acquisition ###
         ######################################################
@@ -828,6 +905,8 @@ def record_high_bandwidth_video(cam_list, list_of_queue_lists):
                 SAVING_DONE_FLAG = True
                 # queue_counter_thread.join()
                 print_previous_batch_size_thread.join()
+                for disk_io_sampler in disk_io_samplers:
+                    disk_io_sampler.stop()
 
             except KeyboardInterrupt:
                 print("KeyboardInterrupt rejected. Be patient, images are still being saved.")
@@ -852,21 +931,40 @@ def record_high_bandwidth_video(cam_list, list_of_queue_lists):
 ########################
 
 
-def get_remaining_space():
-    """Returns the remaining space on the hard drive in GB."""
-    total_space = psutil.disk_usage(str(SAVE_LOCATION)).total
-    used_space = psutil.disk_usage(str(SAVE_LOCATION)).used
-    remaining_space = total_space - used_space
-    return round(remaining_space / 1e9, 2)
+def check_hard_drive_space():
+    """Prints warning if any save drive is low on space."""
+    for location in SAVE_LOCATIONS:
+        remaining_space_GB = get_remaining_space(location)
+        print(f"Free space on {location}: {remaining_space_GB} GB")
 
+        if remaining_space_GB < 100:
+            print(f"WARNING: Less than 100 GB of free space on {location}.")
 
-def check_hard_drive_space():
-    """Prints warning if hard drive is low on space."""
-    remaining_space_GB = get_remaining_space()
-    print(f"Free space on the hard drive: {remaining_space_GB} GB")
 
-    if remaining_space_GB < 100:
-        print("WARNING: Less than 100 GB of free space on the hard drive.")
+def check_hard_drive_bandwidth():
+    """
+    Measures each save drive against the bandwidth of the cameras placed on it for the next batch. Exits before
+    acquisition if a drive is too slow and DISK_PREFLIGHT is "refuse". The measured bandwidths are given to
+    SAVE_TARGETS for the "least_loaded" placement.
+    """
+    if DISK_PREFLIGHT is None:
+        return
+    cam_names = list(CAMERA_NAMES_DICT_COLOR.values()) + list(CAMERA_NAMES_DICT_MONO.values())
+    failed = False
+    for location, location_cam_names in SAVE_TARGETS.plan(cam_names).items():
+        codec = "libx264" if VIDEO_WRITER_BACKEND == "ffmpeg" else "mp4v"
+        streams = [Stream(cam_name, VIDEO_FPS, VIDEO_WIDTH, VIDEO_HEIGHT, codec) for cam_name in location_cam_names]
+        if len(CAMERA_OVERHEAD_LIST) > 0 and location == Path(SAVE_LOCATION):
+            codec = "libx264" if OVERHEAD_WRITER_BACKEND == "ffmpeg" else "mp4v"
+            streams.append(Stream("overhead", OVERHEAD_FPS, OVERHEAD_WIDTH, OVERHEAD_HEIGHT, codec, is_color=True))
+
+        result = preflight(location, streams, DISK_PREFLIGHT_SECONDS)
+        SAVE_TARGETS.bandwidths[location] = result["measured_MB_per_s"]
+        failed = failed or result["status"] == "fail"
+
+    if failed and DISK_PREFLIGHT == "refuse":
+        print("Not starting acquisition. Set DISK_PREFLIGHT = \"warn\" to record anyway.")
+        exit()
 
 
 def split_cameras_into_overhead_and_high_speed(cam_list):
@@ -902,8 +1000,15 @@ def split_cameras_into_overhead_and_high_speed(cam_list):
 
 
 if __name__ == "__main__":
-    # Check hard drive space
+    # Check hard drive space and bandwidth
     check_hard_drive_space()
+    check_hard_drive_bandwidth()
+
+    if STATE_LISTENER is not None:
+        STATE_LISTENER.start()
+    if PUBLISH_LATEST_FRAMES:
+        cam_names = list(CAMERA_NAMES_DICT_COLOR.values()) + list(CAMERA_NAMES_DICT_MONO.values())
+        LATEST_FRAMES = LatestFrames.create(cam_names, (VIDEO_HEIGHT, VIDEO_WIDTH))
 
     # Identify connected cameras and reset them
     cam_list, system, num_cameras = find_cameras()
@@ -917,7 +1022,7 @@ if __name__ == "__main__":
         result = set_camera_params(cam_high_speed_list)
 
         # Initialize overhead camera
-        overhead_fps = 30.0
+        overhead_fps = OVERHEAD_FPS
         if using_cam_overhead:
             sw_queue_list = [queue.Queue(), queue.Queue()]  # First queue is for saving, second is for display
             stop_event = threading.Event()
@@ -945,11 +1050,16 @@ if __name__ == "__main__":
         display_thread.start()
 
         record_high_bandwidth_video(cam_high_speed_list, list_of_queue_lists)
+        CATALOG_WRITER.close()
+        if STATE_LISTENER is not None:
+            STATE_LISTENER.stop()
+        if LATEST_FRAMES is not None:
+            LATEST_FRAMES.close(unlink=True)
 
         # Stop overhead thread
         if using_cam_overhead:
             stop_event.set()
-            for q in sw_queue_list:
+            for q in sw_queue_list[1:]:  # The saving queue is closed by the recorder once capture has stopped
                 q.put((None, None, None))
             cv2.destroyAllWindows()
             record_thread.join()
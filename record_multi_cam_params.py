@@ -2,12 +2,17 @@ import PySpin
 
 SAVE_LOCATION = "/mnt/Data4TB"
 # SAVE_LOCATION = "/home/oconnorlab/Data"
+SAVE_LOCATIONS = [SAVE_LOCATION]  # Drives over which camera videos are spread; SAVE_LOCATION also holds the catalog, state logs and overhead video
+# SAVE_LOCATIONS = [SAVE_LOCATION, "/mnt/Data4TB_2", "/mnt/Data4TB_3"]
+SAVE_PLACEMENT = "round_robin"  # "pin" (CAMERA_SAVE_LOCATIONS), "round_robin" (rotated every batch) or "least_loaded" (see save_targets.py)
+CAMERA_SAVE_LOCATIONS = {}  # For "pin": camera name -> path or index in SAVE_LOCATIONS, e.g. {"cam1": 0, "cam2": 1}
 SAVE_PREFIX = ""  # String appended to beginning of each image filename. Can be left blank.
 GRAB_TIMEOUT = 100  # (ms) length of time before cam.GrabNextImage() will timeout and stop hanging
 NUM_THREADS_PER_CAM = 10  # The number of saving threads per camera; each system has different best value
 VIDEO_FPS = 100.0  # What fps to save the video file as
 VIDEO_WIDTH = 960
 VIDEO_HEIGHT = 960
+VIDEO_WRITER_BACKEND = "opencv"  # "opencv" or "ffmpeg" (see video_writers.py) for the mp4 of each camera
 # PIXEL_FORMAT = (
 #     PySpin.PixelFormat_BayerRG8
 # )  # What color format to convert from bayer; must match above
@@ -16,6 +21,18 @@ VIDEO_HEIGHT = 960
 #     75  # 0 is worst; 95 is best; 100 disbles jpeg compression. Only matters if save_format_extension is jpg.
 # )
 MIN_BATCH_INTERVAL = 1  # (s) If time between this and previous image is more than this, a new directory is created (this separates images into directories for each new trial)
+STATE_LISTENER_PORT = None  # UDP port on which the robot controller publishes state packets (e.g. 5005); None disables the listener
+STATE_LISTENER_HOST = "127.0.0.1"
+PUBLISH_LATEST_FRAMES = True  # Share the latest frame of each camera with viewers (archive/display.py)
+DISK_PREFLIGHT = "warn"  # Measure SAVE_LOCATION against the cameras' bandwidth at startup: "refuse" exits if too slow, "warn" only reports, None skips
+DISK_PREFLIGHT_SECONDS = 5.0  # (s) Length of the write bandwidth test
+DISK_IO_SAMPLE_INTERVAL = 1.0  # (s) Sample the drive's I/O into <date>/disk_io.csv while recording; None disables
+OVERHEAD_FPS = 30.0  # Frame rate of the software-triggered overhead camera
+OVERHEAD_WIDTH = 1920
+OVERHEAD_HEIGHT = 1200
+OVERHEAD_EXPOSURE_TIME = 30000  # (us)
+OVERHEAD_SEGMENT_SECONDS = 600  # (s) The overhead video is split into segments of this length, joined later by archive/join_segments.py
+OVERHEAD_WRITER_BACKEND = "opencv"  # "opencv" or "ffmpeg" (see video_writers.py); must not change between segments that will be joined
 
 
 # Assign custom names to cameras based on their serial numbers. Comment out to ignore that camera.
@@ -1,94 +1,18 @@
 import cv2
 import threading
-from pathlib import Path
 import time
-import datetime
-from queue import Queue
+from queue import Queue, Empty
 import PySpin
 import numpy as np
-
-
-def save_frame_from_queue(queue_A, SAVE_DIR, IMG_WIDTH, IMG_HEIGHT, FPS):
-
-    # Initialize variables to estimate fps
-    start_time = time.time()
-    frame_count = 0
-
-    # Get list of all subdirs
-    subdirs = SAVE_DIR.glob("*")
-    subdirs = [s for s in subdirs if s.is_dir()]
-    subdirs.sort()
-    if len(subdirs) > 0:
-        group_number = int(str(subdirs[-1].stem)) + 1
-        group_count = 0
-    else:
-        group_number = 0
-        group_count = 0
-
-    # Create mp4 out object
-    group_dir = str(group_number).zfill(4)
-    mp4_filename = Path(SAVE_DIR, group_dir, f"{group_number}.mp4")
-    mp4_filename.parent.mkdir(parents=True, exist_ok=True)
-    mp4_out = cv2.VideoWriter(str(mp4_filename), cv2.VideoWriter_fourcc(*"mp4v"), FPS, (IMG_WIDTH, IMG_HEIGHT))
-
-    # Create txt file to save frame times
-    txt_filename = Path(SAVE_DIR, group_dir, f"{group_number}.txt")
-
-    try:
-        while True:
-            # Print size of queue if getting full
-            queue_length = queue_A.qsize()
-            if queue_length > 0:
-                print(f"Queue length: {queue_length}")
-
-            # Get frame from queue
-            item = queue_A.get()
-            frame, frame_time, _ = item
-
-            # None is signal to stop thread
-            if frame is None:
-                break
-            frame_as_cv2 = cv2.cvtColor(frame.GetNDArray(), cv2.COLOR_BayerRG2BGR)
-            mp4_out.write(frame_as_cv2)
-
-            # Save frame_time to txt_file
-            with open(txt_filename, "a") as file:
-                file.write(frame_time + "\n")
-
-            # Estimate fps
-            frame_count += 1
-            if frame_count % 15 == 0:
-                end_time = time.time()
-                fps = frame_count / (end_time - start_time)
-                print(f"Estimated FPS of saving: {round(fps,3)}", end="\r")
-
-                # Reset variables
-                frame_count = 0
-                start_time = time.time()
-
-            # Iterate group number
-            group_count += 1
-            if group_count > 10000:
-                group_number += 1
-                group_count = 0
-
-                # Close mp4_out and open new one
-                mp4_out.release()
-
-                group_dir = str(group_number).zfill(4)
-                mp4_filename = Path(SAVE_DIR, group_dir, f"{group_number}.mp4")
-                mp4_filename.parent.mkdir(parents=True, exist_ok=True)
-                mp4_out = cv2.VideoWriter(
-                    str(mp4_filename), cv2.VideoWriter_fourcc(*"mp4v"), FPS, (IMG_WIDTH, IMG_HEIGHT)
-                )
-
-                # Create new txt file
-                txt_filename = Path(SAVE_DIR, group_dir, f"{group_number}.txt")
-
-    finally:
-        mp4_out.release()
-
-    print("Save thread joined")
+from record_multi_cam_params import (
+    SAVE_LOCATION,
+    OVERHEAD_WIDTH,
+    OVERHEAD_HEIGHT,
+    OVERHEAD_EXPOSURE_TIME,
+    OVERHEAD_SEGMENT_SECONDS,
+    OVERHEAD_WRITER_BACKEND,
+)
+from overhead_recorder import OverheadRecorder
 
 
 def display_frame_from_queues(list_of_queue_lists, window_names_list):
@@ -118,23 +42,24 @@ def display_frame_from_queues(list_of_queue_lists, window_names_list):
             # Collect frames from queues
             for queue_idx, queue in enumerate(queue_list):
 
-                # Loop until no more frames in queue (prevent display queue from getting too large; we only need to display the most recent frame anyway).
+                # Loop until no more frames in queue (prevent display queue from getting too large; we only need to display the most recent frame anyway). Only that frame is converted.
+                latest_frame = None
                 while True:
                     try:
-                        frame, _, _ = queue.get_nowait()
-
-                        # None is signal to stop thread -> exit loop to join thread
-                        if frame is None:
-                            continue_looping = False
-                            break
-
-                        # Convert to numpy
-                        frame = cv2.cvtColor(frame.GetNDArray(), cv2.COLOR_BayerRG2BGR)
-                        # frame = cv2.resize(frame, (IMG_WIDTH // 2, IMG_HEIGHT // 2))  # Resize to fit on screen
-                        list_of_last_frame_lists[window_idx][queue_idx] = frame
-                    except:
+                        frame = queue.get_nowait()[0]
+                    except Empty:
                         break
 
+                    # None is signal to stop thread -> exit loop to join thread
+                    if frame is None:
+                        continue_looping = False
+                        break
+                    elif type(frame) == np.ndarray:
+                        latest_frame = frame
+
+                if latest_frame is not None:
+                    list_of_last_frame_lists[window_idx][queue_idx] = cv2.cvtColor(latest_frame, cv2.COLOR_BayerRG2BGR)
+
             # Stack into one image, converting to two rows if necessary. Handle different size images if needed
             img_height_max = 0
             img_width_max = 0
@@ -175,7 +100,7 @@ def display_frame_from_queue(queue_B, IMG_WIDTH, IMG_HEIGHT, window_name):
         if frame is None:
             break
 
-        frame = cv2.cvtColor(frame.GetNDArray(), cv2.COLOR_BayerRG2BGR)
+        frame = cv2.cvtColor(frame, cv2.COLOR_BayerRG2BGR)
         frame = cv2.resize(frame, (IMG_WIDTH // 2, IMG_HEIGHT // 2))  # Resize to fit on screen
         cv2.imshow(window_name, frame)
 
@@ -190,58 +115,8 @@ def join_threads(thread_list):
         thread.join()
 
 
-def capture_frames(camera, queue_list, YYYY_MM_DD, stop_event):
-
-    camera.BeginAcquisition()
-
-    # Initialize variables to estimate fps
-    start_time = time.time()
-    frame_count = 0
-
-    while not stop_event.is_set():
-        try:
-            image_result = camera.GetNextImage(250)
-
-            if image_result.IsIncomplete():
-                print("Image incomplete with image status %d ..." % image_result.GetImageStatus())
-            else:
-                # Get current time
-                current_time = datetime.datetime.now()
-                formatted_time = current_time.strftime("%H-%M-%S-") + str(current_time.microsecond).zfill(6)
-                frame_time = f"{YYYY_MM_DD}_{formatted_time}"
-
-                # Add image to queues
-                image_copy = PySpin.Image.Create(image_result)
-                for queue in queue_list:
-                    queue.put((image_copy, frame_time, ""))
-
-                # Ensure to release the image to avoid memory leak
-                image_result.Release()
-
-        except PySpin.SpinnakerException as ex:
-            print("Error: %s" % ex)
-            continue
-
-        # Estimate fps
-        frame_count += 1
-        if frame_count % 15 == 0:
-            end_time = time.time()
-            fps = frame_count / (end_time - start_time)
-
-            frame_count = 0
-            start_time = time.time()
-
-    camera.EndAcquisition()
-    print("Capture thread joined")
-
-
 def record_cam_sw(cam, queue_list, stop_event, fps, cam_name):
-
-    YYYY_MM_DD = time.strftime("%Y-%m-%d")
-    SAVE_DIR = Path("/mnt/Data4TB", YYYY_MM_DD, cam_name)
-    SAVE_DIR.mkdir(parents=True, exist_ok=True)
-    IMG_WIDTH = 1920
-    IMG_HEIGHT = 1200
+    """Records a software-triggered camera until stop_event is set. The 0th queue is for saving, the rest are for display."""
 
     try:
         cam.Init()
@@ -251,28 +126,27 @@ def record_cam_sw(cam, queue_list, stop_event, fps, cam_name):
         cam.AcquisitionFrameRateEnable.SetValue(True)
         cam.AcquisitionFrameRate.SetValue(fps)
         cam.ExposureAuto.SetValue(PySpin.ExposureAuto_Off)
-        cam.ExposureTime.SetValue(30000)  # us
+        cam.ExposureTime.SetValue(OVERHEAD_EXPOSURE_TIME)  # us
 
     except PySpin.SpinnakerException as ex:
         print("Error: %s" % ex)
         exit()
 
-    # Start thread that captures frames from camera, placing a copy in each queue.
-    thread_capture = threading.Thread(target=capture_frames, args=(cam, queue_list, YYYY_MM_DD, stop_event))
-
-    # Start thread that saves frames from queue 0 to disk
-    thread_save = threading.Thread(
-        target=save_frame_from_queue, args=(queue_list[0], SAVE_DIR, IMG_WIDTH, IMG_HEIGHT, fps)
-    )
-
-    thread_list = [thread_capture, thread_save]
-
-    for th in thread_list:
-        th.start()
-
-    join_threads(
-        thread_list,
+    recorder = OverheadRecorder(
+        cam,
+        cam_name,
+        fps,
+        SAVE_LOCATION,
+        width=OVERHEAD_WIDTH,
+        height=OVERHEAD_HEIGHT,
+        backend=OVERHEAD_WRITER_BACKEND,
+        segment_seconds=OVERHEAD_SEGMENT_SECONDS,
+        grab_errors=(PySpin.SpinnakerException,),
+        save_queue=queue_list[0],
+        display_queues=queue_list[1:],
     )
+    recorder.run(stop_event)
+    print(f"Recorded {recorder.frames_captured} frames from {cam_name} in {len(recorder.segments)} segments")
 
 
 if __name__ == "__main__":
@@ -330,10 +204,8 @@ if __name__ == "__main__":
         record_threadB.join()
     except KeyboardInterrupt:
         stop_event.set()
-        for queue in queueA_list:
-            queue.put((None, None))
-        for queue in queueB_list:
-            queue.put((None, None))
+        for queue in queueA_list[1:] + queueB_list[1:]:
+            queue.put((None, None, None))
         cv2.destroyAllWindows()
     finally:
         record_threadA.join()
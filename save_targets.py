@@ -0,0 +1,106 @@
+# Placement of each camera's files across several save locations (drives), so writers do not share one disk
+from pathlib import Path
+import threading
+from disk_preflight import get_remaining_space
+
+POLICIES = ["pin", "round_robin", "least_loaded"]
+MIN_FREE_GB = 100  # Locations with less free space than this are skipped while another location has more
+
+
+class SaveTargets:
+    """
+    Chooses the save location of each camera's file in each batch. Every location has the same layout
+    (<location>/<date>/cameras/<batch>/<cam>.mp4), and one camera's file of a batch is always on one location.
+
+    - "pin": each camera goes to pins[cam] (a location path or index); unpinned cameras are placed round robin
+    - "round_robin": cameras are spread over the locations in order, rotated by one location every batch, so each
+      drive gets an equal share of the writers and of each camera's data
+    - "least_loaded": the location with the fewest open writers per MB/s of bandwidth (measured by the disk
+      preflight, else equal), with ties going to the one with the most free space
+
+    round_robin and least_loaded skip locations with less than min_free_GB free while any other location has more.
+    """
+
+    def __init__(self, locations, policy="round_robin", cameras=(), pins=None, bandwidths=None, min_free_GB=MIN_FREE_GB):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown placement policy {policy}. Options: {POLICIES}")
+        self.locations = [Path(p) for p in locations]
+        self.policy = policy
+        self.cameras = list(cameras)  # Order in which round_robin spreads cameras over the locations
+        self.pins = {cam: self._as_location(value) for cam, value in (pins or {}).items()}
+        self.bandwidths = {location: 1.0 for location in self.locations}
+        self.bandwidths.update({Path(p): mb for p, mb in (bandwidths or {}).items()})
+        self.min_free_GB = min_free_GB
+
+        self.lock = threading.Lock()
+        self.assigned = {}  # (batch, cam) -> location, while the file is open
+        self.batch_numbers = {}  # batch -> sequence number of the batch, while any of its files is open
+        self.num_batches = 0
+        self.open_writers = {location: 0 for location in self.locations}
+
+    def _as_location(self, value):
+        location = self.locations[value] if isinstance(value, int) else Path(value)
+        if location not in self.locations:
+            raise ValueError(f"Pinned location {location} is not one of {self.locations}")
+        return location
+
+    def _free_GB(self, location):
+        """Free space of a location; 0 if it does not exist (e.g. a drive that is not mounted)."""
+        try:
+            return get_remaining_space(location)
+        except FileNotFoundError:
+            return 0.0
+
+    def _with_space(self, candidates):
+        """Candidates with at least min_free_GB free, in the same order; all of them if none has."""
+        roomy = [location for location in candidates if self._free_GB(location) >= self.min_free_GB]
+        return roomy or candidates
+
+    def _choose(self, cam_name, batch_number, open_writers):
+        if self.policy == "pin" and cam_name in self.pins:
+            return self.pins[cam_name]
+        if self.policy == "least_loaded":
+            candidates = self._with_space(self.locations)
+            return min(
+                candidates,
+                key=lambda loc: ((open_writers[loc] + 1) / self.bandwidths[loc], -self._free_GB(loc)),
+            )
+
+        if cam_name not in self.cameras:
+            self.cameras.append(cam_name)
+        start = (self.cameras.index(cam_name) + batch_number) % len(self.locations)
+        rotated = self.locations[start:] + self.locations[:start]
+        return self._with_space(rotated)[0]
+
+    def location_for(self, cam_name, batch_name):
+        """Location for a camera's file of a batch; the same location until release() is called for it."""
+        with self.lock:
+            key = (batch_name, cam_name)
+            if key not in self.assigned:
+                if batch_name not in self.batch_numbers:
+                    self.batch_numbers[batch_name] = self.num_batches
+                    self.num_batches += 1
+                location = self._choose(cam_name, self.batch_numbers[batch_name], self.open_writers)
+                self.assigned[key] = location
+                self.open_writers[location] += 1
+            return self.assigned[key]
+
+    def release(self, cam_name, batch_name):
+        """Marks a camera's file of a batch as closed."""
+        with self.lock:
+            location = self.assigned.pop((batch_name, cam_name), None)
+            if location is not None:
+                self.open_writers[location] -= 1
+            if not any(batch == batch_name for batch, _ in self.assigned):
+                self.batch_numbers.pop(batch_name, None)
+
+    def plan(self, cam_names):
+        """{location: [cameras]} for the next batch, without assigning anything (e.g. for the disk preflight)."""
+        with self.lock:
+            open_writers = dict(self.open_writers)
+            plan = {location: [] for location in self.locations}
+            for cam_name in cam_names:
+                location = self._choose(cam_name, self.num_batches, open_writers)
+                open_writers[location] += 1
+                plan[location].append(cam_name)
+            return plan
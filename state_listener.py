@@ -0,0 +1,357 @@
+# Receives robot state packets over UDP in the recorder process, stamps them with the camera frame clock (time.time())
+# and writes them as columnar blocks into each trial directory, next to the mp4s.
+from collections import deque
+from pathlib import Path
+import argparse
+import json
+import socket
+import threading
+import time
+import numpy as np
+
+# orjson parses each packet several times faster than json, but is optional
+try:
+    import orjson
+
+    loads = orjson.loads
+except ModuleNotFoundError:
+    loads = json.loads
+
+STATE_DIR_NAME = "robot_state"  # <batch_dir>/robot_state/block_00000.npz, ...
+RING_SIZE = 4096  # Raw packets held until parsed; about 4 s at 1 kHz, parsing runs every FLUSH_INTERVAL
+MAX_PACKET = 8192  # (bytes) Larger packets are truncated by the socket and dropped as malformed
+BLOCK_ROWS = 1024  # Rows per block file
+FLUSH_INTERVAL = 0.2  # (s) How often new packets are parsed and handed to open batches
+HISTORY_S = 60.0  # (s) Parsed state kept for batches opened late, e.g. when the saving threads lag acquisition
+PAD_S = 0.1  # (s) State kept before the first and after the last frame of a batch
+CLOSE_TIMEOUT = 1.0  # (s) A closed batch is finalized after this even if no later packet arrives
+STRING_LIST_COLUMNS = ["current_errors"]  # List columns that hold strings; stored joined by "/", as in read_state_data
+
+
+def infer_schema(state_dict):
+    """Maps each field of the first packet to (kind, width), with the kinds used by read_state_data.infer_schema."""
+    schema = {}
+    for k, v in state_dict.items():
+        if isinstance(v, bool):
+            schema[k] = ("bool", 1)
+        elif isinstance(v, (int, float)):
+            schema[k] = ("num", 1)
+        elif isinstance(v, list) and (k in STRING_LIST_COLUMNS or (len(v) > 0 and isinstance(v[0], str))):
+            schema[k] = ("strlist", 1)
+        elif isinstance(v, list):
+            schema[k] = ("vec", len(v))
+        else:
+            schema[k] = ("str", 1)
+    return schema
+
+
+def records_to_columns(records, schema):
+    """One array per field. Strings are stored as fixed-width unicode, so blocks load without pickle."""
+    columns = {}
+    for k, (kind, width) in schema.items():
+        values = [r.get(k) for r in records]
+        if kind == "strlist":
+            columns[k] = np.array(["/".join(v or []) for v in values], dtype=str)
+        elif kind == "str":
+            columns[k] = np.array(["" if v is None else str(v) for v in values], dtype=str)
+        elif kind == "bool":
+            columns[k] = np.array([bool(v) for v in values], dtype=bool)
+        elif kind == "vec":
+            columns[k] = np.array([v if v is not None else [np.nan] * width for v in values], dtype=np.float64)
+        else:
+            columns[k] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return columns
+
+
+class StateListener:
+    """
+    Listens for robot state packets (one JSON record per UDP datagram, as in the state logs) on a background thread.
+
+    The receive thread only copies each datagram into a preallocated ring and stamps it with time.time(), so it holds
+    the GIL for a few microseconds per packet and does not delay the camera acquisition threads. A second thread parses
+    the ring in blocks and writes the state of each batch, between open_batch and close_batch, to the batch directory.
+    """
+
+    def __init__(self, port, host="127.0.0.1", ring_size=RING_SIZE, max_packet=MAX_PACKET):
+        self.port = port
+        self.host = host
+        self.ring = np.zeros((ring_size, max_packet), dtype=np.uint8)
+        self.ring_lengths = np.zeros(ring_size, dtype=np.int64)
+        self.ring_times = np.zeros(ring_size, dtype=np.float64)
+        self.ring_views = [memoryview(row) for row in self.ring]
+        self.write_seq = 0  # Total packets received; only the receive thread changes it
+        self.read_seq = 0  # Total packets parsed; only the writer thread changes it
+
+        self.schema = None
+        self.history = deque()  # Parsed blocks: (block_seq, host_time, columns)
+        self.num_blocks = 0
+        self.num_overrun = 0  # Packets overwritten in the ring before they were parsed
+        self.num_malformed = 0
+        self.latest_time = 0.0
+
+        self.batches = {}  # batch_dir -> dict of batch state
+        self.finished_batches = set()
+        self.batches_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.sock = None
+        self.threads = []
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(0.1)
+        self.threads = [
+            threading.Thread(target=self._receive, daemon=True),
+            threading.Thread(target=self._write, daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+        print(f"Listening for robot state on {self.host}:{self.port}")
+
+    def stop(self):
+        """Stops receiving, then finalizes every open batch with the state received so far."""
+        self.stop_event.set()
+        for t in self.threads:
+            t.join()
+        self._parse_new()
+        with self.batches_lock:
+            for batch in self.batches.values():
+                batch["closed_at"] = batch["closed_at"] or time.time()
+                batch["t_end"] = batch["t_end"] or self.latest_time
+        self._update_batches(force=True)
+        if self.sock is not None:
+            self.sock.close()
+        print(
+            f"Robot state: {self.write_seq} packets, {self.num_overrun} overrun, {self.num_malformed} malformed"
+        )
+
+    def open_batch(self, batch_dir, t_start):
+        """Starts writing state from t_start - PAD_S into batch_dir. Safe to call once per camera."""
+        batch_dir = Path(batch_dir)
+        with self.batches_lock:
+            if batch_dir in self.batches or batch_dir in self.finished_batches:
+                if batch_dir in self.batches:
+                    self.batches[batch_dir]["num_open"] += 1
+                return
+            self.batches[batch_dir] = {
+                "t_start": t_start - PAD_S,
+                "t_end": None,
+                "closed_at": None,
+                "num_open": 1,
+                "next_block": None,  # First history block not yet handed to this batch
+                "pending": [],
+                "num_pending": 0,
+                "num_written": 0,
+            }
+
+    def close_batch(self, batch_dir, t_end):
+        """Marks the end of a batch (time of its last frame). The batch is finalized once every opener has closed it."""
+        batch_dir = Path(batch_dir)
+        with self.batches_lock:
+            batch = self.batches.get(batch_dir)
+            if batch is None:
+                return
+            batch["num_open"] -= 1
+            batch["t_end"] = max(batch["t_end"] or 0.0, t_end + PAD_S)
+            if batch["num_open"] <= 0:
+                batch["closed_at"] = time.time()
+
+    def _receive(self):
+        ring_size = len(self.ring)
+        while not self.stop_event.is_set():
+            slot = self.write_seq % ring_size
+            try:
+                length = self.sock.recv_into(self.ring_views[slot])
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.ring_times[slot] = time.time()
+            self.ring_lengths[slot] = length
+            self.write_seq += 1
+
+    def _parse_new(self):
+        """Parses the packets received since the last call into one columnar block of the history."""
+        write_seq = self.write_seq
+        ring_size = len(self.ring)
+        if write_seq - self.read_seq > ring_size:
+            self.num_overrun += write_seq - self.read_seq - ring_size
+            self.read_seq = write_seq - ring_size
+        if write_seq == self.read_seq:
+            return
+
+        records, host_times, seqs = [], [], []
+        for seq in range(self.read_seq, write_seq):
+            slot = seq % ring_size
+            try:
+                records.append(loads(self.ring[slot, : self.ring_lengths[slot]].tobytes()))
+                host_times.append(self.ring_times[slot])
+                seqs.append(seq)
+            except ValueError:
+                self.num_malformed += 1
+
+        # Slots that the receive thread overwrote while they were being parsed are discarded, by sequence number since
+        # malformed packets are already missing from records
+        oldest_seq = self.write_seq - ring_size
+        if oldest_seq > self.read_seq:
+            self.num_overrun += oldest_seq - self.read_seq
+            keep = [i for i, seq in enumerate(seqs) if seq >= oldest_seq]
+            records, host_times = [records[i] for i in keep], [host_times[i] for i in keep]
+        self.read_seq = write_seq
+        if not records:
+            return
+
+        if self.schema is None:
+            self.schema = infer_schema(records[0])
+        block = (self.num_blocks, np.array(host_times), records_to_columns(records, self.schema))
+        self.history.append(block)
+        self.num_blocks += 1
+        self.latest_time = host_times[-1]
+        while self.history and self.history[0][1][-1] < self.latest_time - HISTORY_S:
+            self.history.popleft()
+
+    def _update_batches(self, force=False):
+        """
+        Hands new history blocks to each open batch, writes full blocks, and finalizes batches that have ended.
+
+        close_batch sets t_end and closed_at from the camera threads, so they are read once under the lock. The other
+        fields of a batch are only used by this thread.
+        """
+        now = time.time()
+        with self.batches_lock:
+            batches = [(batch_dir, batch, batch["t_end"], batch["closed_at"]) for batch_dir, batch in self.batches.items()]
+        for batch_dir, batch, t_end, closed_at in batches:
+            if batch["next_block"] is None:
+                batch["next_block"] = self.history[0][0] if self.history else self.num_blocks
+            for block_seq, host_time, columns in self.history:
+                if block_seq < batch["next_block"]:
+                    continue
+                keep = host_time >= batch["t_start"]
+                if t_end is not None:
+                    keep &= host_time <= t_end
+                if keep.any():
+                    batch["pending"].append((host_time[keep], {k: v[keep] for k, v in columns.items()}))
+                    batch["num_pending"] += int(keep.sum())
+                batch["next_block"] = block_seq + 1
+
+            ended = closed_at is not None and (force or self.latest_time > t_end or now - closed_at > CLOSE_TIMEOUT)
+            if batch["num_pending"] >= BLOCK_ROWS or (ended and batch["pending"]):
+                self._write_block(batch_dir, batch)
+            if ended:
+                with self.batches_lock:
+                    del self.batches[batch_dir]
+                    self.finished_batches.add(batch_dir)
+
+    def _write_block(self, batch_dir, batch):
+        host_time = np.concatenate([p[0] for p in batch["pending"]])
+        columns = {k: np.concatenate([p[1][k] for p in batch["pending"]]) for k in batch["pending"][0][1]}
+        out_dir = Path(batch_dir, STATE_DIR_NAME)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(out_dir / f"block_{batch['num_written']:05d}.npz", host_time=host_time, **columns)
+        batch["num_written"] += 1
+        batch["pending"] = []
+        batch["num_pending"] = 0
+
+    def _write(self):
+        while not self.stop_event.is_set():
+            time.sleep(FLUSH_INTERVAL)
+            self._parse_new()
+            self._update_batches()
+
+
+def load_batch_state(batch_dir):
+    """Concatenates the state blocks of a batch directory into {field: array}, including "host_time" (s)."""
+    block_paths = sorted(Path(batch_dir, STATE_DIR_NAME).glob("block_*.npz"))
+    parts = {}
+    for block_path in block_paths:
+        with np.load(block_path) as block:
+            for k in block.files:
+                parts.setdefault(k, []).append(block[k])
+    return {k: np.concatenate(v) for k, v in parts.items()}
+
+
+def synthetic_state_packets(num_packets, start_ms=1000):
+    """Small state records with the fields and types of the real ones, for the stand-in publisher."""
+    rng = np.random.default_rng(0)
+    stages = ["approach", "slowdown", "grasp", "lift", "release", "retract"]
+    for i in range(num_packets):
+        phase = i / 1000.0
+        yield {
+            "time": start_ms + i,
+            "q_d": np.sin(phase + np.arange(7)).tolist(),
+            "O_T_EE": (np.sin(phase + np.arange(16)) + 0.01 * rng.standard_normal(16)).tolist(),
+            "tau_ext_hat_filtered": (0.1 * rng.standard_normal(7)).tolist(),
+            "control_command_success_rate": 0.9 + 0.1 * rng.random(),
+            "halt_motion": bool((i // 5000) % 7 == 3),
+            "stage": stages[(i // 2000) % len(stages)],
+            "current_errors": [],
+        }
+
+
+def publish_state(port, host="127.0.0.1", rate=1000.0, duration=10.0, replay=None):
+    """
+    Stand-in for the robot controller: sends one JSON record per datagram at rate Hz for duration seconds.
+
+    With replay, sends the lines of an existing state log instead of synthetic records.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    num_packets = int(rate * duration)
+    if replay is not None:
+        with open(replay, "rb") as f:
+            packets = [l.rstrip(b"\n") for _, l in zip(range(num_packets), f) if l.strip()]
+    else:
+        packets = [json.dumps(r).encode() for r in synthetic_state_packets(num_packets)]
+
+    start_time = time.perf_counter()
+    for i, packet in enumerate(packets):
+        # Sleep until each packet is due, rather than a fixed interval, so the average rate does not drift
+        delay = start_time + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sock.sendto(packet, (host, port))
+    sock.close()
+    return len(packets)
+
+
+if __name__ == "__main__":
+    # Loopback check: publish for a few seconds while a listener records two fake batches into a temporary directory
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Publish stand-in robot state, or check the listener on loopback.")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Packets per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="(s)")
+    parser.add_argument("--replay", help="Send the lines of this state log instead of synthetic records")
+    parser.add_argument("--publish-only", action="store_true", help="Only publish, e.g. to a running recorder")
+    args = parser.parse_args()
+
+    if args.publish_only:
+        num_sent = publish_state(args.port, rate=args.rate, duration=args.duration, replay=args.replay)
+        print(f"Sent {num_sent} packets")
+    else:
+        listener = StateListener(args.port)
+        listener.start()
+        publisher = threading.Thread(target=publish_state, args=(args.port, "127.0.0.1", args.rate, args.duration, args.replay))
+        publisher.start()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            batch_dirs = [Path(tmp_dir, "batch_0"), Path(tmp_dir, "batch_1")]
+            time.sleep(0.5)
+            for batch_dir in batch_dirs:
+                t_start = time.time()
+                listener.open_batch(batch_dir, t_start)
+                time.sleep(args.duration / 3)
+                listener.close_batch(batch_dir, time.time())
+            publisher.join()
+            listener.stop()
+
+            for batch_dir in batch_dirs:
+                state = load_batch_state(batch_dir)
+                host_time = state.get("host_time", np.zeros(0))
+                dt_ms = np.diff(host_time) * 1000
+                print(
+                    f"{batch_dir.name}: {len(host_time)} records in {len(list(Path(batch_dir, STATE_DIR_NAME).glob('*.npz')))} blocks, "
+                    f"{round(host_time[-1] - host_time[0], 3) if len(host_time) else 0} s, "
+                    f"max gap {round(dt_ms.max(), 2) if len(dt_ms) else 0} ms"
+                )
@@ -0,0 +1,500 @@
+# SQLite catalog of recorded files, so that tools can query trials instead of rescanning the whole drive
+import argparse
+import datetime
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CATALOG_NAME = "trial_catalog.sqlite"
+PRIMARY_MARKER_NAME = "trial_catalog_primary.txt"  # In each extra save location: path of the location holding the catalog
+IMAGE_SUFFIXES = (".bmp", ".jpg")  # Directories of these are catalogued as one row, not one row per image
+MIN_CLOSED_AGE = 60  # (s) Files found by a scan that have not been modified for this long are assumed closed
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+BATCH_TIME_FORMAT = "%Y-%m-%d_%H-%M-%S_%f"  # Name of each trial directory under <date>/cameras
+FRAME_TIMES_SUFFIX = "_frame_times.txt"  # Host time of each frame, written by the recorder next to each mp4
+PROXY_DIR_NAME = "cameras_proxy"  # Low-res review copies, <date>/cameras_proxy/<trial>/<cam>.mp4
+
+# States a file moves through
+STATE_RECORDING = "recording"  # Writer is open
+STATE_CLOSED = "closed"  # Writer released, original (e.g. -orig.mp4) is complete
+STATE_COMPRESSED = "compressed"  # Compressed output exists
+STATE_VERIFIED = "verified"  # Compressed output has the same number of frames as the original
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    date TEXT,
+    trial TEXT,
+    camera TEXT,
+    kind TEXT,
+    size INTEGER,
+    mtime REAL,
+    num_frames INTEGER,
+    state TEXT,
+    updated REAL,
+    location TEXT
+);
+CREATE INDEX IF NOT EXISTS files_trial ON files (date, trial, camera);
+CREATE INDEX IF NOT EXISTS files_state ON files (kind, state);
+CREATE INDEX IF NOT EXISTS files_parent ON files (parent);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS locations (
+    path TEXT PRIMARY KEY
+);
+"""
+
+
+def _prefix_pattern(path):
+    """LIKE pattern matching everything below a directory, with LIKE wildcards (_ and %) in the path escaped."""
+    escaped = str(path).rstrip("/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "/%"
+
+
+def frame_times_path(mp4_path):
+    """Sidecar with one host timestamp (s) per frame, shared by <cam>-orig.mp4 and the compressed <cam>.mp4."""
+    mp4_path = Path(mp4_path)
+    return Path(mp4_path.parent, mp4_path.stem.replace("-orig", "") + FRAME_TIMES_SUFFIX)
+
+
+_locations_cache = {}
+
+
+def save_locations(path):
+    """
+    (locations, root): every save location sharing a catalog with the one path is under, primary first, and the
+    location path is under. ([], None) if path is not under a catalogued save location.
+    """
+    path = Path(path)
+    for root in [path] + list(path.parents):
+        if Path(root, CATALOG_NAME).exists():
+            primary = root
+        elif Path(root, PRIMARY_MARKER_NAME).exists():
+            primary = Path(Path(root, PRIMARY_MARKER_NAME).read_text().strip())
+        else:
+            continue
+        if primary not in _locations_cache:
+            catalog = TrialCatalog(primary)
+            _locations_cache[primary] = catalog.locations()
+            catalog.close()
+        return _locations_cache[primary], root
+    return [], None
+
+
+def resolve_path(path):
+    """
+    Returns path if it exists, otherwise the same path relative to another save location that holds it (the recorder
+    may have placed a camera's files on any of them). Returns path unchanged if no location has it.
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    locations, root = save_locations(path)
+    for location in locations:
+        candidate = Path(location, path.relative_to(root))
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def classify(root, path, is_dir=False):
+    """
+    Returns (date, trial, camera, kind) for a path under root, following the layout written by the recorder:
+
+    <date>/cameras/<trial>/<cam>.mp4, <date>/cameras/<trial>/<cam>/*.bmp, <date>/<overhead>/<segment>/<overhead>.mp4,
+    <date>/robot_state_data/.../*.txt(.gz) and <date>/cameras_proxy/<trial>/<cam>.mp4
+    """
+    parts = Path(path).relative_to(root).parts
+    date = parts[0] if parts and DATE_PATTERN.match(parts[0]) else None
+    name = parts[-1]
+
+    if is_dir:
+        kind = "image_dir"
+        camera = name.replace("-orig", "").replace("-bayer", "")
+        trial = parts[-2] if len(parts) >= 2 else None
+    elif name.endswith(".mp4") and len(parts) >= 2 and parts[1] == PROXY_DIR_NAME:
+        kind = "proxy"
+        trial = parts[-2] if len(parts) >= 2 else None
+        camera = Path(name).stem
+    elif name.endswith(".mp4"):
+        kind = "video"
+        trial = parts[-2] if len(parts) >= 2 else None
+        if len(parts) >= 2 and parts[1].startswith("cameras"):
+            camera = Path(name).stem.replace("-orig", "").replace("_full_res", "")
+        else:
+            camera = parts[1] if len(parts) >= 3 else Path(name).stem  # e.g. overhead/<segment>/overhead.mp4
+    elif "robot_state_data" in parts and (name.endswith(".txt") or name.endswith(".txt.gz")):
+        kind = "state_log"
+        trial = name.split(".")[0]
+        camera = None
+    else:
+        kind = "other"
+        trial = parts[-2] if len(parts) >= 2 else None
+        camera = None
+
+    return date, trial, camera, kind
+
+
+class TrialCatalog:
+    """
+    Catalog of files under a save location (e.g. /mnt/Data4TB), stored in <save_location>/trial_catalog.sqlite.
+
+    The recorder and tools update rows as files change state. refresh() only relists directories whose mtime has
+    changed since the previous refresh, so a rescan of an unchanged drive costs one stat() per directory. Directories
+    are listed outside of any transaction and written one per transaction, so a refresh by one tool only holds the
+    database for milliseconds at a time while the recorder writes to it.
+
+    Files may also be spread over extra save locations (other drives) with the same layout. These are registered once
+    (extra_locations) and remembered by the catalog; each row records the location its file is on, and refresh()
+    and query(under=...) cover the same directory on every location.
+    """
+
+    def __init__(self, save_location, db_path=None, extra_locations=None):
+        self.root = Path(save_location)
+        self.db_path = Path(db_path) if db_path is not None else Path(self.root, CATALOG_NAME)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection shared by all threads of this process; WAL lets other processes read while we write
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+            # Catalogs created before files were spread over several locations have no location column
+            columns = [r["name"] for r in self.conn.execute("PRAGMA table_info(files)")]
+            if "location" not in columns:
+                self.conn.execute("ALTER TABLE files ADD COLUMN location TEXT")
+                self.conn.execute("UPDATE files SET location = ?", (str(self.root),))
+
+        with self.lock:
+            extra = [Path(r["path"]) for r in self.conn.execute("SELECT path FROM locations ORDER BY rowid")]
+        self.roots = [self.root] + [p for p in extra if p != self.root]
+        if extra_locations:
+            self.add_locations(extra_locations)
+
+    def add_locations(self, extra_locations):
+        """Registers extra save locations, each marked with the path of this (primary) location."""
+        for location in extra_locations:
+            location = Path(location)
+            if location in self.roots:
+                continue
+            location.mkdir(parents=True, exist_ok=True)
+            Path(location, PRIMARY_MARKER_NAME).write_text(str(self.root) + "\n")
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO locations VALUES (?)", (str(location),))
+            self.roots.append(location)
+        _locations_cache.pop(self.root, None)
+
+    def locations(self):
+        """All save locations, primary first."""
+        return list(self.roots)
+
+    def location_of(self, path):
+        """The save location a path is under (the primary location if none)."""
+        path = Path(path)
+        for root in sorted(self.roots, key=lambda p: len(p.parts), reverse=True):
+            if path == root or root in path.parents:
+                return root
+        return self.root
+
+    def _on_every_location(self, path):
+        """The same path relative to every save location; just path if it is not under any of them."""
+        path = Path(path)
+        location = self.location_of(path)
+        if path != location and location not in path.parents:
+            return [path]
+        return [Path(root, path.relative_to(location)) for root in self.locations()]
+
+    def equivalent_paths(self, path):
+        """The same path relative to every save location, for those where it exists."""
+        return [p for p in self._on_every_location(path) if p.exists()]
+
+    def primary_path(self, path):
+        """The same path relative to the primary location, e.g. to group a trial's files that are on several drives."""
+        return self._on_every_location(path)[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    ###############
+    ### Updates ###
+    ###############
+
+    def _row_for_path(self, path, state, num_frames=None, is_dir=False):
+        path = Path(path)
+        location = self.location_of(path)
+        date, trial, camera, kind = classify(location, path, is_dir=is_dir)
+        try:
+            stat = path.stat()
+            size, mtime = stat.st_size, stat.st_mtime
+        except FileNotFoundError:
+            size, mtime = 0, time.time()
+        return (str(path), str(path.parent), date, trial, camera, kind, size, mtime, num_frames, state, time.time(), str(location))
+
+    def record_file(self, path, state, num_frames=None):
+        """Inserts or updates a file, refreshing its size and mtime."""
+        row = self._row_for_path(path, state, num_frames)
+        with self.lock, self.conn:
+            self.conn.execute(
+                """INSERT INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+                ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime=excluded.mtime, state=excluded.state,
+                num_frames=COALESCE(excluded.num_frames, files.num_frames), updated=excluded.updated""",
+                row,
+            )
+
+    def set_state(self, path, state, num_frames=None):
+        self.record_file(path, state, num_frames)
+
+    def remove(self, path):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (str(path),))
+
+    def refresh(self, start_dir=None):
+        """
+        Brings the catalog up to date with the filesystem below start_dir, on every save location (default: all of
+        every save location).
+        """
+        if start_dir is None:
+            stack = [str(root) for root in self.locations()]
+        else:
+            stack = [str(p) for p in self._on_every_location(start_dir)]
+        now = time.time()
+
+        with self.lock:
+            known_dirs = {r["path"]: r["mtime_ns"] for r in self.conn.execute("SELECT path, mtime_ns FROM dirs")}
+
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except FileNotFoundError:
+                with self.lock, self.conn:
+                    self._forget_dir(dir_path)
+                continue
+
+            # Unchanged directory: no entries were added or removed, so only descend into known subdirectories
+            if known_dirs.get(dir_path) == mtime_ns:
+                with self.lock:
+                    stack += [r[0] for r in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (dir_path,))]
+                continue
+
+            try:
+                listing = self._list_dir(dir_path, now)
+            except FileNotFoundError:
+                continue  # Removed since the stat; forgotten by the next refresh
+            with self.lock, self.conn:
+                self._write_dir(dir_path, mtime_ns, now, listing)
+            stack += listing[1]
+
+        # Files still marked as recording are few, so re-stat them to catch ones that have since been closed
+        with self.lock:
+            recording = [r["path"] for r in self.conn.execute("SELECT path FROM files WHERE state = ?", (STATE_RECORDING,))]
+        removed = []
+        updates = []
+        for path in recording:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                removed.append((path,))
+                continue
+            state = STATE_CLOSED if now - stat.st_mtime > MIN_CLOSED_AGE else STATE_RECORDING
+            updates.append((stat.st_size, stat.st_mtime, state, now, path))
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", removed)
+            # Only rows still marked as recording, so a state set by the recorder meanwhile is kept
+            self.conn.executemany(
+                "UPDATE files SET size = ?, mtime = ?, state = ?, updated = ? WHERE path = ? AND state = 'recording'",
+                updates,
+            )
+
+    def _list_dir(self, dir_path, now):
+        """
+        Lists and stats a directory without touching the database. Returns (location, subdirs, file rows, number of
+        images).
+        """
+        location = self.location_of(dir_path)
+        subdirs = []
+        rows = []
+        num_images = 0
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.name.startswith(CATALOG_NAME) or entry.name == PRIMARY_MARKER_NAME:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if entry.name.endswith(IMAGE_SUFFIXES):
+                    num_images += 1
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                state = STATE_CLOSED if now - stat.st_mtime > MIN_CLOSED_AGE else STATE_RECORDING
+                if entry.name.endswith(".mp4") and "-orig" not in entry.name and Path(dir_path).parent.name == "cameras":
+                    state = STATE_COMPRESSED
+                date, trial, camera, kind = classify(location, entry.path)
+                rows.append(
+                    (entry.path, dir_path, date, trial, camera, kind, stat.st_size, stat.st_mtime, state, now, str(location))
+                )
+        return location, subdirs, rows, num_images
+
+    def _write_dir(self, dir_path, mtime_ns, now, listing):
+        """Writes one listed directory. Called inside a transaction."""
+        location, subdirs, rows, num_images = listing
+
+        # Subdirectories: forget removed ones, remember the rest
+        old_subdirs = {r[0] for r in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (dir_path,))}
+        for removed in old_subdirs - set(subdirs):
+            self._forget_dir(removed)
+        self.conn.executemany("INSERT OR IGNORE INTO dirs VALUES (?, ?, NULL)", [(subdir, dir_path) for subdir in subdirs])
+
+        # Files: forget removed ones, upsert the rest without overwriting states set by the recorder/tools
+        names = {row[0] for row in rows}
+        old_files = {r[0] for r in self.conn.execute("SELECT path FROM files WHERE parent = ?", (dir_path,))}
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(removed,) for removed in old_files - names])
+        self.conn.executemany(
+            """INSERT INTO files VALUES (?,?,?,?,?,?,?,?,NULL,?,?,?)
+            ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime=excluded.mtime, updated=excluded.updated,
+            state=CASE WHEN files.state = 'recording' THEN excluded.state ELSE files.state END""",
+            rows,
+        )
+
+        # Image directories are a single row whose num_frames is the number of images
+        if num_images > 0:
+            date, trial, camera, kind = classify(location, dir_path, is_dir=True)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                (dir_path, str(Path(dir_path).parent), date, trial, camera, kind, 0, mtime_ns / 1e9, num_images,
+                 STATE_CLOSED, now, str(location)),
+            )  # fmt: skip
+        else:
+            self.conn.execute("DELETE FROM files WHERE path = ? AND kind = 'image_dir'", (dir_path,))
+
+        self.conn.execute(
+            "INSERT INTO dirs VALUES (?, ?, ?) ON CONFLICT(path) DO UPDATE SET mtime_ns=excluded.mtime_ns",
+            (dir_path, str(Path(dir_path).parent), mtime_ns),
+        )
+
+    def _forget_dir(self, dir_path):
+        like = _prefix_pattern(dir_path)
+        self.conn.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (dir_path, like))
+        self.conn.execute("DELETE FROM files WHERE path = ? OR path LIKE ? ESCAPE '\\'", (dir_path, like))
+
+    ###############
+    ### Queries ###
+    ###############
+
+    def query(
+        self, date=None, trial=None, camera=None, kind=None, state=None, under=None, name_suffix=None, location=None
+    ):
+        """
+        Returns rows (sqlite3.Row, accessible by column name) matching all given filters. under matches the same
+        directory on every save location.
+        """
+        clauses = []
+        values = []
+        filters = [("date", date), ("trial", trial), ("camera", camera), ("kind", kind), ("state", state)]
+        for column, value in filters + [("location", str(location) if location is not None else None)]:
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        if under is not None:
+            unders = self._on_every_location(under)
+            clauses.append("(" + " OR ".join(["path LIKE ? ESCAPE '\\'"] * len(unders)) + ")")
+            values += [_prefix_pattern(p) for p in unders]
+        if name_suffix is not None:
+            clauses.append("substr(path, -?) = ?")
+            values += [len(name_suffix), name_suffix]
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self.lock:
+            return self.conn.execute(f"SELECT * FROM files {where} ORDER BY path", values).fetchall()
+
+    def paths(self, **filters):
+        return [Path(r["path"]) for r in self.query(**filters)]
+
+    def summary(self):
+        """Number of files and total size per (date, kind, state)."""
+        with self.lock:
+            return self.conn.execute(
+                """SELECT date, kind, state, COUNT(*) AS num_files, SUM(size) AS size, SUM(num_frames) AS num_frames
+                FROM files GROUP BY date, kind, state ORDER BY date, kind, state"""
+            ).fetchall()
+
+
+class CatalogWriter:
+    """
+    Writes to a TrialCatalog from a background thread, for callers that must never wait on the database (the
+    recorder's saving threads). A failed write is printed and dropped; the next refresh() restores the row from the
+    file itself.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record_file(self, path, state, num_frames=None):
+        self.queue.put((path, state, num_frames))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.catalog.record_file(*item)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Catalog write for {item[0]} failed: {e}")
+
+    def close(self):
+        """Finishes the queued writes, then closes the catalog."""
+        self.queue.put(None)
+        self.thread.join()
+        self.catalog.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Query the catalog of recorded trials.")
+    parser.add_argument("--root", default="/mnt/Data4TB", help="Save location that the catalog describes")
+    parser.add_argument("--refresh", action="store_true", help="Update the catalog from the filesystem first")
+    parser.add_argument("--date")
+    parser.add_argument("--trial")
+    parser.add_argument("--camera")
+    parser.add_argument("--kind", choices=["video", "image_dir", "state_log", "proxy", "other"])
+    parser.add_argument("--state", choices=[STATE_RECORDING, STATE_CLOSED, STATE_COMPRESSED, STATE_VERIFIED])
+    parser.add_argument("--summary", action="store_true", help="Print counts per date, kind and state")
+    args = parser.parse_args()
+
+    catalog = TrialCatalog(args.root)
+
+    if args.refresh:
+        start_time = time.time()
+        catalog.refresh()
+        print(f"Refreshed catalog in {round(time.time() - start_time, 3)} s")
+
+    if args.summary:
+        for r in catalog.summary():
+            size_GB = round((r["size"] or 0) / 1e9, 2)
+            print(f"{r['date']}  {r['kind']:<10} {r['state']:<10} {r['num_files']:>7} files  {size_GB:>9} GB")
+    else:
+        rows = catalog.query(date=args.date, trial=args.trial, camera=args.camera, kind=args.kind, state=args.state)
+        for r in rows:
+            modified = datetime.datetime.fromtimestamp(r["mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{r['state']:<10} {r['num_frames'] or '':>7} {r['size']:>12} {modified}  {r['path']}")
+        print(f"{len(rows)} files")
@@ -0,0 +1,116 @@
+# Video writer backends shared by the recorders and the offline conversion tools
+from pathlib import Path
+import subprocess
+import threading
+import cv2
+import numpy as np
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter (mp4v by default), which is what the recorders have always used."""
+
+    def __init__(self, filename, fps, width, height, is_color=False, codec="mp4v"):
+        self.filename = Path(filename)
+        self.is_color = is_color
+        self.frames_written = 0
+        fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.out = cv2.VideoWriter(str(filename), fourcc, fps, (width, height), isColor=is_color)
+
+    def write(self, frame):
+        self.out.write(frame)
+        self.frames_written += 1
+
+    def release(self):
+        self.out.release()
+        return True
+
+
+class FFmpegPipeWriter:
+    """
+    Pipes raw frames into an ffmpeg process (CPU encoder by default).
+
+    The encoder runs in its own process, so encoding does not hold the GIL. The number of frames ffmpeg reports
+    encoding (from -progress) is kept in frames_encoded, which can be compared with frames_written after release().
+    """
+
+    def __init__(
+        self,
+        filename,
+        fps,
+        width,
+        height,
+        is_color=False,
+        codec="libx264",
+        preset="veryfast",
+        crf=17,
+        threads=0,
+        output_args=None,
+    ):
+        self.filename = Path(filename)
+        self.is_color = is_color
+        self.frames_written = 0
+        self.frames_encoded = 0
+        self.frame_shape = (height, width, 3) if is_color else (height, width)
+
+        cmd_list = ["ffmpeg", "-y", "-loglevel", "error", "-nostats"]
+        cmd_list += ["-f", "rawvideo", "-pix_fmt", "bgr24" if is_color else "gray"]
+        cmd_list += ["-s", f"{width}x{height}", "-r", str(fps), "-i", "-"]
+        cmd_list += ["-c:v", codec, "-threads", str(threads)]
+        if codec == "libx264":
+            cmd_list += ["-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p"]
+        if output_args is not None:
+            cmd_list += [str(a) for a in output_args]
+        cmd_list += ["-progress", "pipe:1", str(filename)]
+
+        self.process = subprocess.Popen(
+            cmd_list,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+
+        # Read progress (and errors) on separate threads so that full pipes never block the encoder
+        self.stderr_lines = []
+        self.progress_thread = threading.Thread(target=self._read_progress, daemon=True)
+        self.stderr_thread = threading.Thread(
+            target=lambda: self.stderr_lines.extend(self.process.stderr), daemon=True
+        )
+        self.progress_thread.start()
+        self.stderr_thread.start()
+
+    def _read_progress(self):
+        for line in self.process.stdout:
+            key, _, value = line.decode().strip().partition("=")
+            if key == "frame":
+                self.frames_encoded = int(value)
+
+    def write(self, frame):
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match writer shape {self.frame_shape}")
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+        self.frames_written += 1
+
+    def release(self):
+        """Closes the pipe and waits for ffmpeg. Returns True if every written frame was encoded."""
+        self.process.stdin.close()
+        returncode = self.process.wait()
+        self.progress_thread.join()
+        self.stderr_thread.join()
+        if returncode != 0:
+            print(f"ffmpeg failed for {self.filename}: {b''.join(self.stderr_lines).decode()[-500:]}")
+            return False
+        return self.frames_encoded == self.frames_written
+
+
+WRITER_BACKENDS = {
+    "opencv": OpenCVWriter,
+    "ffmpeg": FFmpegPipeWriter,
+}
+
+
+def make_writer(backend, filename, fps, width, height, is_color=False, **kwargs):
+    """Creates a writer by backend name ("opencv" or "ffmpeg")."""
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"Unknown writer backend {backend}. Options: {list(WRITER_BACKENDS)}")
+    return WRITER_BACKENDS[backend](filename, fps, width, height, is_color=is_color, **kwargs)